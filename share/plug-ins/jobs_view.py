@@ -226,6 +226,8 @@ class Jobs_View(Module):
     """ A GPS module, providing the Jobs view """
 
     view_title = "Jobs"
+    lazy = True
+    setup_on_actions = ("open jobs", )
     mdi_position = GPS.MDI.POSITION_LEFT
     mdi_group = GPS.MDI.GROUP_VIEW
 
@@ -8,6 +8,7 @@ This file provides support for using the SPARK 2014 toolset.
 
 import GPS
 import os_utils
+from gs_utils import tool_probes
 import os.path
 import tool_output
 import json
@@ -629,8 +630,7 @@ class GNATprove_Parser(tool_output.OutputParser):
         self.analysis_tool.add_rule('errors', 'ERRORS')
 
         # create the SPARK rules from the '--list-categories' switch
-        process = GPS.Process("gnatprove --list-categories")
-        output = process.get_result()
+        output = tool_probes.output(["gnatprove", "--list-categories"]) or ""
         for line in output.split('\n'):
             splitted_line = line.split(' - ')
             if len(splitted_line) == 3:
@@ -1270,8 +1270,7 @@ class GNATProve_Plugin:
     # The GNATprove_Parser instance used to parse the tool's output
 
     def __init__(self):
-        process = GPS.Process("gnatprove -h")
-        help_msg = process.get_result()
+        help_msg = tool_probes.output(["gnatprove", "-h"]) or ""
         GPS.parse_xml(xml_gnatprove.format(help=help_msg,
                                            output_parsers=OUTPUT_PARSERS))
         GPS.parse_xml(xml_gnatprove_menus % {'prefix': prefix})
@@ -1498,6 +1497,9 @@ if gnatprove:
 
     gnatprove_plug = GNATProve_Plugin()
 
+    # Needed by GNATprove_Parser, on each proof
+    tool_probes.register(["gnatprove", "--list-categories"])
+
 
 def compute_gnatserver_path():
     """ Compute the position of the gnat_server tool from the one of gnatprove.
@@ -142,10 +142,14 @@ def range_align_on(top, bottom, sep, replace_with=None, sep_group=0):
     fin = False  # whether formal in are found
     fout = False  # whether formal out are found
 
-    line = top.beginning_of_line()
-
-    while line <= bottom:
-        chars = top.buffer().get_chars(line, line.end_of_line())
+    # Compute the new text in one go, and only modify the buffer once
+    buffer = top.buffer()
+    start = top.beginning_of_line()
+    end = bottom.end_of_line()
+    lines = buffer.get_chars(start, end).split('\n')
+    lines = [l + '\n' for l in lines[:-1]] + ([lines[-1]] if lines[-1] else [])
+
+    for chars in lines:
         matched = sep_re.search(chars)
         if matched:
             pos = max(pos, len(chars[:matched.start(sep_group)].rstrip()) + 1)
@@ -158,19 +162,14 @@ def range_align_on(top, bottom, sep, replace_with=None, sep_group=0):
             elif sub == " : in " or sub == " : in out ":
                 fin = True
             replace_len = max(replace_len, len(sub))
-        prev = line
-        line = line.forward_line()
-        if prev == line:
-            break
 
     # special case when in and out are used
     if fin and fout:
         replace_len = 10
 
     if pos != 0:
-        line = top.beginning_of_line()
-        while line <= bottom:
-            chars = top.buffer().get_chars(line, line.end_of_line())
+        new_lines = []
+        for chars in lines:
             matched = sep_re.search(chars)
             if matched:
                 width = pos - \
@@ -187,23 +186,18 @@ def range_align_on(top, bottom, sep, replace_with=None, sep_group=0):
                     sub = " :    out "
                     width2 = width2 - 3
 
-                top.buffer().delete(line, line.end_of_line())
                 # do not left-strip if a single char as this will remove the \n
                 if len(chars[matched.end(sep_group):]) == 1:
-                    top.buffer().insert(
-                        line,
-                        chars[:matched.start(sep_group)].rstrip() +
-                        (' ' * width) + sub + (' ' * width2) +
-                        chars[matched.end(sep_group):])
+                    chars = (chars[:matched.start(sep_group)].rstrip() +
+                             (' ' * width) + sub + (' ' * width2) +
+                             chars[matched.end(sep_group):])
                 else:
-                    top.buffer().insert(
-                        line, chars[:matched.start(sep_group)].rstrip() +
-                        (' ' * width) + sub + (' ' * width2) +
-                        chars[matched.end(sep_group):].lstrip())
-            prev = line
-            line = line.forward_line()
-            if prev == line:
-                break
+                    chars = (chars[:matched.start(sep_group)].rstrip() +
+                             (' ' * width) + sub + (' ' * width2) +
+                             chars[matched.end(sep_group):].lstrip())
+            new_lines.append(chars)
+
+        buffer.replace_region(start, end, ''.join(new_lines))
 
 
 @with_save_excursion
@@ -19,8 +19,6 @@ import copy
 import gs_utils.gnat_rules
 from xml.sax.saxutils import escape
 
-prev_xml = ""
-
 xml_codepeer = """<?xml version="1.0"?>
   <CODEPEER>
     <doc_path>{root}/share/doc/codepeer</doc_path>
@@ -771,13 +769,12 @@ xmlTrailer = """
 
 
 def get_supported_warnings():
-    global prev_xml
     default_on = ""
     # Then retrieve warnings checks from gnatmake
-    xml = """
+    xml = ["""
        <popup label="Warnings">
        <expansion switch="--gnat-warnings="/>
-    """
+    """]
     rules = gs_utils.gnat_rules.get_warnings_list("codepeer-gnatmake", "-h")
     for rule in rules:
         r = copy.deepcopy(rule)
@@ -789,16 +786,15 @@ def get_supported_warnings():
         r.before = False
         for dep in r.dependencies:
             dep[0] = re.sub("-gnatw", "--gnat-warnings=", dep[0])
-        xml += r.Xml(1, 1)
+        xml.append(r.Xml(1, 1))
 
-    xml += "<expansion switch='--gnat-warnings' alias='--gnat-warnings="
-    xml += default_on
-    xml += "'/>"
-    xml += "</popup>"
+    xml.append("<expansion switch='--gnat-warnings' alias='--gnat-warnings=")
+    xml.append(default_on)
+    xml.append("'/>")
+    xml.append("</popup>")
 
-    if prev_xml != xml:
-        GPS.parse_xml(xmlHead + xml + xmlTrailer)
-        prev_xml = xml
+    # Only parsed again when the target changes the list of warnings
+    gs_utils.parse_xml_if_changed(xmlHead + "".join(xml) + xmlTrailer)
 
 
 def on_project_view_changed(hook):
@@ -1,3 +1,4 @@
+import difflib
 import json
 import urllib
 import urlparse
@@ -125,6 +126,81 @@ class EditorView(object):
         return self.buffer().extend_existing_selection
 
 
+def _split_lines(text):
+    """
+    Split text into lines, keeping the newline characters.
+    """
+    lines = text.split('\n')
+    result = [line + '\n' for line in lines[:-1]]
+    if lines[-1]:
+        result.append(lines[-1])
+    return result
+
+
+def _text_edits(old, new):
+    """
+    Compute the changes needed to turn old into new.
+
+    :param unicode old: the current text
+    :param unicode new: the new text
+    :return: a list of (start, end, text), where start and end are offsets
+       in old.
+    """
+    old_lines = _split_lines(old)
+    new_lines = _split_lines(new)
+
+    # Each modified line is a separate change, so that only its modified
+    # characters are replaced, and the marks on the rest of the line stay.
+    if len(old_lines) == len(new_lines):
+        # The common case of line-oriented commands: no need to search for
+        # inserted or deleted lines
+        hunks = [(idx, idx + 1, idx, idx + 1)
+                 for idx, line in enumerate(old_lines)
+                 if line != new_lines[idx]]
+    else:
+        hunks = []
+        for tag, i1, i2, j1, j2 in difflib.SequenceMatcher(
+                None, old_lines, new_lines, autojunk=False).get_opcodes():
+            if tag == 'replace' and i2 - i1 == j2 - j1:
+                hunks.extend((i1 + k, i1 + k + 1, j1 + k, j1 + k + 1)
+                             for k in range(i2 - i1))
+            elif tag != 'equal':
+                hunks.append((i1, i2, j1, j2))
+
+    if not hunks:
+        return []
+
+    def offsets(lines):
+        result = [0]
+        for line in lines:
+            result.append(result[-1] + len(line))
+        return result
+
+    old_offsets = offsets(old_lines)
+    new_offsets = offsets(new_lines)
+    edits = []
+
+    for i1, i2, j1, j2 in hunks:
+        start, end = old_offsets[i1], old_offsets[i2]
+        text = new[new_offsets[j1]:new_offsets[j2]]
+        removed = old[start:end]
+
+        # Only replace the characters that actually change
+        prefix = 0
+        common = min(len(removed), len(text))
+        while prefix < common and removed[prefix] == text[prefix]:
+            prefix += 1
+        suffix = 0
+        while suffix < common - prefix and \
+                removed[-1 - suffix] == text[-1 - suffix]:
+            suffix += 1
+
+        edits.append((start + prefix, end - suffix,
+                      text[prefix:len(text) - suffix]))
+
+    return edits
+
+
 class _UndoRedoContext(object):
     """Helper class to implement an undo/redo context manager.
     """
@@ -233,6 +309,58 @@ class EditorBuffer(object):
         """
         return _UndoRedoContext(self)
 
+    def apply_edits(self, edits):
+        """
+        Replace several ranges of text at once, as a single undo group.
+
+        The ranges are modified from the end of the buffer, so that the
+        locations given for the other ranges remain valid.
+
+        :param edits: a list of (frm, to, text) tuples: the text from frm
+           up to, but not including, to is replaced with text. When frm
+           and to are the same, text is simply inserted. The ranges must
+           not overlap.
+        :type edits: list[(EditorLocation, EditorLocation, string)]
+
+        .. seealso:: :func:`GPS.EditorBuffer.replace_region`
+        """
+        edits = sorted(
+            ((frm.offset(), frm, to, text) for frm, to, text in edits),
+            key=lambda e: e[0], reverse=True)
+
+        with self.new_undo_group():
+            for offset, frm, to, text in edits:
+                if to.offset() > offset:
+                    self.delete(frm, to.forward_char(-1))
+                if text:
+                    self.insert(frm, text)
+
+    def replace_region(self, frm, to, text):
+        """
+        Replace the text between frm and to (included, as for
+        :func:`GPS.EditorBuffer.get_chars`) with text.
+
+        Only the characters that differ are modified, so that the marks,
+        the cursor and the highlighting of the unchanged lines are
+        preserved, and fewer changes need to be undone. This is the
+        efficient way for a command to rewrite many lines: compute the
+        new text in python, and call this function once. Each change is
+        still a separate edit of the buffer, but the highlighting of the
+        modified lines is only computed once all of them are applied.
+
+        :param EditorLocation frm: the start of the region
+        :param EditorLocation to: the end of the region
+        :param string text: the new text for the region
+        """
+        old = self.get_chars(frm, to).decode('utf-8')
+        if isinstance(text, str):
+            text = text.decode('utf-8')
+
+        self.apply_edits(
+            [(frm.forward_char(start), frm.forward_char(end),
+              new.encode('utf-8'))
+             for start, end, new in _text_edits(old, text)])
+
 
 @extend_gps
 class File(object):
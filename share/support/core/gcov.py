@@ -20,7 +20,7 @@ Note that GPS calls gcov so that the .gcov files are generated
 import GPS
 import os
 import re
-from gs_utils import interactive
+from gs_utils import interactive, tool_probes
 from GPS import MDI, Project, Process, CodeAnalysis
 
 # A class to display the output of gcov in a separate console.
@@ -77,6 +77,10 @@ def using_gcov(context):
     return GPS.Preference(pref_name).get() == 'Gcov'
 
 
+tool_probes.register(
+    lambda: ["gcov", "--version"] if using_gcov(None) else None)
+
+
 @interactive(name='gcov compute coverage files',
              filter=using_gcov)
 def run_gcov():
@@ -85,8 +89,7 @@ def run_gcov():
     # files and reading of .gc?? data in multiple directories.
 
     try:
-        p = Process("gcov --version")
-        out = p.get_result()
+        out = tool_probes.output(["gcov", "--version"])
         p = re.compile("[1-9][0-9][0-9][0-9][0-1][0-9][0-3][0-9]")
         found = p.findall(out)
         if not found:
@@ -63,6 +63,7 @@ class ExampleAction(GPS.Action):
 
 
 class GNATExamples(Module):
+    setup_priority = -10
 
     def _process_examples_dir(self, submenu_name, example_directory):
         """ Process a directory and place any valid examples found there.
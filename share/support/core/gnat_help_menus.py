@@ -81,17 +81,24 @@ class HTMLAction(GPS.Action):
 
 
 class GNATMenus(Module):
+    setup_priority = -10
 
     def _populate_menu(self):
         """ Populate the Help menu for the AdaCore tools """
 
         help_actions = []
 
+        executables = {}
         for exec_name in _DOC_ENTRIES.keys():
             executable = exec_name
             if exec_name == 'gnatls' and GPS.get_target():
                 executable = '{}-gnatls'.format(GPS.get_target())
-            ex = os_utils.locate_exec_on_path(executable)
+            executables[exec_name] = executable
+
+        found = os_utils.locate_execs_on_path(executables.values())
+
+        for exec_name, executable in executables.iteritems():
+            ex = found[executable]
             if ex:
                 for descr, tup in _DOC_ENTRIES[exec_name].iteritems():
                     html_files, menu_base = tup
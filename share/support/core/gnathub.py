@@ -137,8 +137,9 @@ logger = GPS.Logger("GPS.INTERNAL.MODULE_GNAThub")
 
 if logger.active:
     checkboxes = ""
+    found = os_utils.locate_execs_on_path(tools.values())
     for name, tool in tools.iteritems():
-        if os_utils.locate_exec_on_path(tool):
+        if found[tool]:
             checkboxes += template.format(name, name, name, "on")
         else:
             checkboxes += template.format(name, name, name, "off")
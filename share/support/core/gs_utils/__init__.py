@@ -3,9 +3,14 @@
 
 from GPS import pwd, cd, Action, EditorBuffer, MDI
 import UserDict
+import hashlib
+import sys
+import time
 import types
 import GPS
 import GPS.Browsers
+from gs_utils import startup_timeline
+from gs_utils import stall_profiler
 
 # The autodoc may not have visibility on gi.repository
 try:
@@ -136,7 +141,11 @@ class hook:
 
     def __call__(self, fn):
         def do_work(hook, *args, **kwargs):
-            return fn(*args, **kwargs)
+            start = time.time()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                stall_profiler.record('hook', fn, time.time() - start)
         do_work.__name__ = fn.__name__   # Reset name for interactive()
         do_work.__doc__ = fn.__doc__
         GPS.Hook(self.name).add(do_work, last=self.last)
@@ -373,8 +382,19 @@ def make_interactive(callback, category="General", filter="", menu="", key="",
                 return None
             return r
 
-    a = Action(name or callback.__name__)
-    a.create(do, filter=filter, category=category, description=doc,
+    action_name = name or callback.__name__
+
+    def timed_do():
+        # Actions block the main loop while they run
+        start = time.time()
+        try:
+            return do()
+        finally:
+            stall_profiler.record(
+                'action', callback, time.time() - start, action_name)
+
+    a = Action(action_name)
+    a.create(timed_do, filter=filter, category=category, description=doc,
              icon=icon, for_learning=for_learning)
 
     if menu:
@@ -456,6 +476,42 @@ def freeze_prefs():
     return Context()
 
 
+_parsed_xml = {}
+# For each key of parse_xml_if_changed, the hash of the last XML parsed
+
+
+def parse_xml_if_changed(xml, key=None):
+    """
+    Call GPS.parse_xml, unless xml is the same as the last XML parsed for
+    the same key. This is for plug-ins that compute their customization
+    again when the project changes, while it is most often unchanged::
+
+        def on_project_view_changed(hook):
+            gs_utils.parse_xml_if_changed(compute_targets_xml())
+
+    :param str xml: the XML to parse, as for GPS.parse_xml
+    :param key: what the XML defines, for instance the name of a tool. By
+       default, the location of the call.
+    :return: whether the XML was parsed
+    :rtype: bool
+    """
+    if key is None:
+        caller = sys._getframe(1)
+        key = (caller.f_code.co_filename, caller.f_lineno)
+
+    if isinstance(xml, unicode):
+        digest = hashlib.sha1(xml.encode('utf-8')).hexdigest()
+    else:
+        digest = hashlib.sha1(xml).hexdigest()
+
+    if _parsed_xml.get(key) == digest:
+        return False
+
+    GPS.parse_xml(xml)
+    _parsed_xml[key] = digest
+    return True
+
+
 ############################################################
 # Some predefined filters
 # These are filters that can be used when creating new menus, contextual
@@ -142,7 +142,7 @@ class gnatMakeProc:
                 GPS.Console("Messages").write(str(name) + "\n")
                 xmlCompiler = xmlCompilerHead + \
                     xmlCompilerDefault + xmlCompilerTrailer
-            GPS.parse_xml(
+            gs_utils.parse_xml_if_changed(
                 """<?xml version="1.0" ?><GNAT_Studio>""" +
                 xmlCompiler +
                 "</GNAT_Studio>")
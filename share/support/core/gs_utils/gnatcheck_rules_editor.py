@@ -3,6 +3,7 @@ import os
 import os.path
 import re
 import gs_utils.gnat_rules
+from gs_utils import tool_probes
 from gs_utils.switches import Check, Spin, Field, Combo, ComboEntry
 from gs_utils.gnatcheck_default import gnatcheck_default
 from xml.dom import minidom
@@ -175,6 +176,15 @@ def _convert_rules(gnatCmd, category, func, prev_name, new_name):
     return warningsCat
 
 
+def _gnatcheck_rules_cmd():
+    if GPS.is_server_local("Tools_Server"):
+        return [gs_utils.get_gnat_driver_cmd() + "check", "-hx"]
+    return None
+
+
+tool_probes.register(_gnatcheck_rules_cmd)
+
+
 def get_supported_rules(gnatCmd):
     ns = Namespace()
     ns.msg = ""
@@ -186,9 +196,15 @@ def get_supported_rules(gnatCmd):
 
     # Verify we have the correct gnatcheck executable
     # First get gnatcheck rules
-    process = GPS.Process(gnatCmd + "check -hx", remote_server="Tools_Server")
+    output = None
+    if GPS.is_server_local("Tools_Server"):
+        output = tool_probes.output([gnatCmd + "check", "-hx"])
+    if output is None:
+        process = GPS.Process(gnatCmd + "check -hx",
+                              remote_server="Tools_Server")
+        output = process.get_result()
     xmlstring = re.sub(
-        "gnatcheck: No existing file to process.*", "", process.get_result())
+        "gnatcheck: No existing file to process.*", "", output)
     try:
         dom = minidom.parseString(xmlstring)
     except Exception:
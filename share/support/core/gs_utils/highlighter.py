@@ -3,7 +3,9 @@ This file provides various classes to help highlight patterns in
 files.
 """
 
+from bisect import bisect_left, bisect_right
 import GPS
+import re
 import time
 import traceback
 
@@ -137,6 +139,44 @@ class OverlayStyle(object):
         else:
             buffer.apply_overlay(over, start, end)
 
+    def apply_all(self, buffer, ranges):
+        """
+        Apply the highlighting to several parts of the buffer. The style is
+        only looked up once, and the buffer and file once, but each part is
+        still highlighted separately.
+
+        :param GPS.EditorBuffer buffer: the buffer to highlight.
+        :param ranges: the start and end of each region to highlight, as
+           for apply.
+        :type ranges: list[(GPS.EditorLocation, GPS.EditorLocation)]
+        """
+        if not ranges:
+            return
+
+        over = self.__create_style(buffer)
+
+        if self.use_messages():
+            file = buffer.file()
+            for start, end in ranges:
+                msg = GPS.Message(
+                    category=self.name,
+                    file=file,
+                    line=start.line(),
+                    column=start.column(),
+                    text="",
+                    show_on_editor_side=True,
+                    show_in_locations=False)
+
+                if self.whole_line:
+                    msg.set_style(over)
+                else:
+                    msg.set_style(over, end.column() - start.column() + 1)
+                self._messages.append(msg)
+
+        else:
+            for start, end in ranges:
+                buffer.apply_overlay(over, start, end)
+
     def remove(self, start, end=None):
         """
         Remove the highlighting in whole or part of the buffer.
@@ -172,6 +212,193 @@ class OverlayStyle(object):
             buffer.remove_overlay(over, start, end)
 
 
+class Highlighter_Scheduler(object):
+
+    """
+    The background work of all the instances of Background_Highlighter is
+    done from a single idle callback, shared by all of them. At each idle
+    tick, the scheduler gives one batch to each registered highlighter in
+    turn, starting with those that are processing the focused editor, until
+    the time budget of the tick is exhausted.
+
+    The size of the batches of each highlighter is adapted to the time it
+    takes to process them, and the scheduler records, for each highlighter,
+    the number of batches and lines it processed and the time it spent::
+
+        for name, batches, lines, total, longest in \
+              Highlighter_Scheduler.get().statistics():
+            ...
+
+    """
+
+    # Time budget, in milliseconds, of each idle tick
+    budget_ms = 10
+
+    # Time, in milliseconds, that a single batch should ideally take
+    batch_ms = 3
+
+    # Bounds for the adaptive batch sizes
+    min_batch_size = 5
+    max_batch_size = 1000
+
+    # Interval in milliseconds between two ticks.
+    # This is only used when gobject is not available
+    timeout_ms = 40
+
+    _instance = None
+
+    @staticmethod
+    def get():
+        """
+        Return the scheduler shared by all the highlighters.
+
+        :rtype: Highlighter_Scheduler
+        """
+        if Highlighter_Scheduler._instance is None:
+            Highlighter_Scheduler._instance = Highlighter_Scheduler()
+        return Highlighter_Scheduler._instance
+
+    def __init__(self):
+        self.__source_id = None  # The gtk source_id, or GPS.Timeout
+        self.__highlighters = []  # List of (highlighter, callback)
+        self.__next = 0  # Index of the next highlighter to serve
+        self.__stats = {}  # [batches, lines, total time, longest] per name
+
+    def register(self, highlighter, callback):
+        """
+        Register a highlighter that has some work to do. The callback is
+        called to process one batch, and returns whether there remains work
+        to do, after which the highlighter is unregistered.
+
+        :param Background_Highlighter highlighter: the highlighter.
+        :param callback: a function with no argument that returns a boolean.
+        """
+        for h, _ in self.__highlighters:
+            if h is highlighter:
+                return
+
+        self.__highlighters.append((highlighter, callback))
+
+        if self.__source_id is None:
+            if gobject_available:
+                self.__source_id = GLib.idle_add(self.__on_idle)
+            else:
+                self.__source_id = GPS.Timeout(
+                    self.timeout_ms, self.__on_idle)
+
+    def unregister(self, highlighter):
+        """
+        Stop calling the highlighter.
+
+        :param Background_Highlighter highlighter: the highlighter.
+        """
+        self.__highlighters = [
+            (h, c) for h, c in self.__highlighters if h is not highlighter]
+
+        if not self.__highlighters and self.__source_id is not None:
+            if gobject_available:
+                GLib.source_remove(self.__source_id)
+            else:
+                self.__source_id.remove()
+            self.__source_id = None
+
+    def is_registered(self, highlighter):
+        """
+        :param Background_Highlighter highlighter: the highlighter.
+        :return: whether the highlighter has some pending work.
+        :rtype: boolean
+        """
+        return any(h is highlighter for h, _ in self.__highlighters)
+
+    def statistics(self):
+        """
+        Return the statistics of each highlighter, the most expensive first.
+
+        :return: a list of (name, number of batches, number of lines,
+           total time in seconds, longest batch in seconds).
+        :rtype: list[(str, int, int, float, float)]
+        """
+        return sorted(
+            ((name, ) + tuple(stats) for name, stats in
+             self.__stats.iteritems()),
+            key=lambda s: s[3], reverse=True)
+
+    def reset_statistics(self):
+        """
+        Reset the statistics of all highlighters.
+        """
+        self.__stats = {}
+
+    def __ordered_highlighters(self):
+        """
+        Return the list of (highlighter, callback) in round-robin order,
+        with the ones processing the focused editor first.
+        """
+        count = len(self.__highlighters)
+        start = self.__next % count if count else 0
+        ordered = self.__highlighters[start:] + self.__highlighters[:start]
+
+        try:
+            focused = GPS.EditorBuffer.get(open=False, force=False)
+        except Exception:
+            focused = None
+
+        if focused is None:
+            return ordered
+
+        return ([hc for hc in ordered if hc[0].current_buffer() == focused] +
+                [hc for hc in ordered if hc[0].current_buffer() != focused])
+
+    def __on_idle(self, *args):
+        """
+        Called at each idle tick to distribute the time budget.
+        """
+        deadline = time.time() + self.budget_ms / 1000.0
+        target = self.batch_ms / 1000.0
+
+        ordered = self.__ordered_highlighters()
+        while ordered:
+            remaining = []
+
+            for highlighter, callback in ordered:
+                if not self.__highlighters:
+                    break
+
+                batch_size = highlighter.batch_size
+                start = time.time()
+                more = callback()
+                elapsed = time.time() - start
+                self.__next += 1
+
+                name = highlighter.stats_name()
+                stats = self.__stats.setdefault(name, [0, 0, 0.0, 0.0])
+                stats[0] += 1
+                stats[1] += batch_size
+                stats[2] += elapsed
+                stats[3] = max(stats[3], elapsed)
+
+                # Adapt the batch size to the measured cost, moving halfway
+                # toward the ideal size to smooth the variations.
+                if elapsed > 0:
+                    ideal = batch_size * target / elapsed
+                    highlighter.batch_size = int(max(
+                        self.min_batch_size,
+                        min(self.max_batch_size,
+                            (batch_size + ideal) / 2)))
+
+                if more:
+                    remaining.append((highlighter, callback))
+                else:
+                    self.unregister(highlighter)
+
+                if time.time() >= deadline:
+                    return self.__source_id is not None
+
+            ordered = remaining
+
+        return self.__source_id is not None
+
+
 class Background_Highlighter(object):
 
     """
@@ -189,13 +416,13 @@ class Background_Highlighter(object):
         e.start_highlight(buffer1)   # start highlighting a first buffer
         e.start_highlight(buffer2)   # start highlighting a second buffer
 
+    The background work is done by the Highlighter_Scheduler, which shares
+    the idle time between all the highlighters.
+
     :param OverlayStyle style: style to use for highlighting.
     """
-    # Interval in milliseconds between two batches.
-    # This is only used when gobject is not available
-    timeout_ms = 40
-
-    # Number of lines to process at each iteration
+    # Initial number of lines to process at each iteration. This is adapted
+    # by the scheduler to the time taken by each batch.
     batch_size = 20
 
     # If True, highlighting is always done in the
@@ -203,8 +430,7 @@ class Background_Highlighter(object):
     synchronous = False
 
     def __init__(self, style, initial_timeout=None):
-        self.__source_id = None  # The gtk source_id used for background
-        # or the GPS.Timeout instance
+        self.__timeout_id = None  # The gtk source_id of the initial timeout
         self.__buffers = []      # The list of buffers to highlight
         self.terminated = False
         self.highlighted = 0
@@ -220,7 +446,7 @@ class Background_Highlighter(object):
             self.__on_lines_folded_or_unfolded)
 
     def __del__(self):
-        self.__source_id = None  # Don't try to kill the idle, GPS is quitting
+        self.__timeout_id = None  # Don't try to kill it, GPS is quitting
         self.stop_highlight()
         GPS.Hook("before_exit_action_hook").remove(self.__before_exit)
         GPS.Hook("file_closed").remove(self.__on_file_closed)
@@ -234,10 +460,26 @@ class Background_Highlighter(object):
         Called when GPS is about to exit
         """
         self.terminated = True
-        self.__source_id = None  # Don't try to kill the idle, GPS is quitting
+        self.__timeout_id = None  # Don't try to kill it, GPS is quitting
         self.stop_highlight()
         return True
 
+    def current_buffer(self):
+        """
+        :return: the buffer being processed, if any.
+        :rtype: GPS.EditorBuffer
+        """
+        return self.__buffers[0][0] if self.__buffers else None
+
+    def stats_name(self):
+        """
+        :return: the name under which the scheduler records the statistics
+           of this highlighter.
+        :rtype: str
+        """
+        return "%s(%s)" % (self.__class__.__name__,
+                           self.style.name if self.style else "")
+
     def set_style(self, style):
         """
         Change the current highlight style.
@@ -306,18 +548,15 @@ class Background_Highlighter(object):
                 while self.__do_highlight():
                     pass
 
-            elif self.__source_id is None:
-                if gobject_available:
-                    if self.initial_timeout:
-                        self.__source_id = GLib.timeout_add(
-                            self.initial_timeout,
-                            self.__initial_do_highlight)
-                    else:
-                        self.__source_id = GLib.idle_add(
-                            self.__do_highlight)
+            elif self.__timeout_id is None and \
+                    not Highlighter_Scheduler.get().is_registered(self):
+                if gobject_available and self.initial_timeout:
+                    self.__timeout_id = GLib.timeout_add(
+                        self.initial_timeout,
+                        self.__initial_do_highlight)
                 else:
-                    self.__source_id = GPS.Timeout(
-                        self.timeout_ms, self.__do_highlight)
+                    Highlighter_Scheduler.get().register(
+                        self, self.__do_highlight)
 
                 self.on_start_buffer(buffer)
 
@@ -359,13 +598,12 @@ class Background_Highlighter(object):
                     self.__buffers.remove(b)
                     return
 
-        elif self.__source_id:
-            if gobject_available:
-                GLib.source_remove(self.__source_id)
-            else:
-                self.__source_id.remove()
-            self.__source_id = None
+        else:
+            if self.__timeout_id:
+                GLib.source_remove(self.__timeout_id)
+                self.__timeout_id = None
 
+            Highlighter_Scheduler.get().unregister(self)
             self.__buffers = []
 
     def remove_highlight(self, buffer=None):
@@ -394,15 +632,14 @@ class Background_Highlighter(object):
         """
         We waited the initial timeout, thus start the highlighter
         """
-        if self.__source_id:
-            GLib.source_remove(self.__source_id)
-        self.__source_id = GLib.idle_add(self.__do_highlight)
+        self.__timeout_id = None
+        Highlighter_Scheduler.get().register(self, self.__do_highlight)
         return False
 
-    def __do_highlight(self, *args, **kwargs):
+    def __do_highlight(self):
         """
-        The function called at regular intervals, and that computes
-        the range of lines to highlight.
+        The function called by the scheduler, and that computes the range
+        of lines to highlight.
         """
         if self.terminated:
             return False
@@ -584,6 +821,8 @@ class Location_Highlighter(Background_Highlighter):
     def __init__(self, style, context=2, initial_timeout=None):
         Background_Highlighter.__init__(self, style, initial_timeout)
         self._refs = []  # list of (entity, ref) in the current buffer
+        self._refs_by_line = {}  # (lower-cased name, column) per line
+        self._ref_lines = []  # sorted list of lines with references
         self.context = context
 
     def recompute_refs(self, buffer):
@@ -600,58 +839,116 @@ class Location_Highlighter(Background_Highlighter):
         return []
 
     def on_start_buffer(self, buffer):  # overriding
-        # ??? Should use a more efficient data structure where we can
-        # easily find the references within a given range.
         self._refs = self.recompute_refs(buffer=buffer)
 
-    def process(self, start, end):  # overriding
-        ed = start.buffer()
+        # Index the references by line, so that each batch only looks at
+        # the references within its own range of lines.
+        self._refs_by_line = {}
+        for entity_name, ref in self._refs:
+            self._refs_by_line.setdefault(ref.line(), []).append(
+                (entity_name.decode("utf-8").lower(), ref.column()))
+        self._ref_lines = sorted(self._refs_by_line)
 
-        s = GPS.FileLocation(ed.file(), start.line(), start.column())
-        e = GPS.FileLocation(ed.file(), end.line(), end.column())
+    def __candidate_lines(self, line):
+        """
+        Return the lines where to look for a reference on line: the line
+        itself, then the lines after and before it, within self.context.
+        """
+        yield line
+        for c in range(1, self.context + 1):
+            # Search after original xref line (same column)
+            yield line + c
+            # Search before original xref line
+            yield line - c
 
-        for entity_name, ref in self._refs:
-            if s <= ref <= e:
-                u = entity_name.decode("utf-8").lower()
-                s2 = ed.at(ref.line(), ref.column())
+    def process(self, start, end):  # overriding
+        first = bisect_left(self._ref_lines, start.line())
+        last = bisect_right(self._ref_lines, end.line())
+        if first == last:
+            return
 
-                try:
-                    e2 = s2 + (len(u) - 1)
-                except Exception:
-                    # An invalid location ?
-                    continue
+        ed = start.buffer()
 
-                b = ed.get_chars(s2, e2).decode("utf-8").lower()
-                if b == u:
-                    self.highlighted += 1
-                    self.style.apply(s2, e2)
+        # Fetch the text of the whole batch, plus the context lines, at
+        # once, rather than the text of each reference.
+        from_line = max(1, self._ref_lines[first] - self.context)
+        to_line = min(ed.lines_count(),
+                      self._ref_lines[last - 1] + self.context)
+        try:
+            lines = ed.get_chars(
+                ed.at(from_line, 1),
+                ed.at(to_line, 1).end_of_line()).decode("utf-8").split("\n")
+        except Exception:
+            # An invalid location ?
+            return
 
-                elif self.context > 0:
-                    for c in range(1, self.context + 1):
-                        # Search after original xref line (same column)
+        for ref_line in self._ref_lines[first:last]:
+            for u, column in self._refs_by_line[ref_line]:
+                for line in self.__candidate_lines(ref_line):
+                    index = line - from_line
+                    if not 0 <= index < len(lines):
+                        continue
+
+                    if "\t" in lines[index]:
+                        # The column of the reference is a visible column,
+                        # where tabs are expanded: let the editor compute
+                        # the corresponding text.
                         try:
-                            s2 = GPS.EditorLocation(
-                                ed, ref.line() + c, ref.column())
+                            s2 = ed.at(line, column)
                             e2 = s2 + (len(u) - 1)
-                            b = ed.get_chars(s2, e2).decode("utf-8").lower()
-                            if b == u:
-                                self.highlighted += 1
-                                self.style.apply(s2, e2)
-                                break
-
-                            # Search before original xref line
-                            s2 = GPS.EditorLocation(
-                                ed, ref.line() - c, ref.column())
-                            e2 = s2 + (len(u) - 1)
-                            b = ed.get_chars(s2, e2).decode("utf-8").lower()
-                            if b == u:
-                                self.highlighted += 1
-                                self.style.apply(s2, e2)
-                                break
+                            found = ed.get_chars(
+                                s2, e2).decode("utf-8").lower() == u
                         except Exception:
                             # An invalid location ?
                             continue
 
+                    elif lines[index][
+                            column - 1:column - 1 + len(u)].lower() == u:
+                        try:
+                            s2 = ed.at(line, column)
+                            e2 = s2 + (len(u) - 1)
+                        except Exception:
+                            # An invalid location ?
+                            break
+                        found = True
+
+                    else:
+                        found = False
+
+                    if found:
+                        self.highlighted += 1
+                        self.style.apply(s2, e2)
+                        break
+
+
+def highlight_matches(style, start, end, regexp):
+    """
+    Highlight all the matches of regexp between start and end. The text is
+    fetched once, and searched line by line with the Python regexp, rather
+    than through successive calls to `GPS.EditorLocation.search`.
+
+    :param OverlayStyle style: the style to apply.
+    :param GPS.EditorLocation start: start of region to process.
+    :param GPS.EditorLocation end: end of region to process.
+    :param regexp: the compiled regular expression.
+    """
+    buffer = start.buffer()
+    offset = 0   # The offset of the current line from start
+    ranges = []
+
+    text = buffer.get_chars(start, end).decode("utf-8")
+    for line_text in text.split("\n"):
+        # The editor columns count tabs as several columns: compute the
+        # locations from the character offsets instead. Only the matches
+        # need to query the editor.
+        for m in regexp.finditer(line_text):
+            if m.end() > m.start():
+                s = start.forward_char(offset + m.start())
+                ranges.append((s, s.forward_char(m.end() - 1 - m.start())))
+        offset += len(line_text) + 1
+
+    style.apply_all(buffer, ranges)
+
 
 class Regexp_Highlighter(On_The_Fly_Highlighter):
 
@@ -666,7 +963,8 @@ class Regexp_Highlighter(On_The_Fly_Highlighter):
             style=OverlayStyle(
                name="tabs style",
                strikethrough=True,
-               background="#FF7979"))
+               background="#FF7979"),
+            local_search=True)
 
     Another example is to highlight TODO lines. Various conventions exist
     to mark these in the sources, but the following should catch some of
@@ -676,7 +974,8 @@ class Regexp_Highlighter(On_The_Fly_Highlighter):
             regexp="TODO.*|\?\?\?.*",
             style=OverlayStyle(
                name="todo",
-               background="#FF7979"))
+               background="#FF7979"),
+            local_search=True)
 
     Another example is a class to highlight Spark comments. This should
     only be applied when the language is spark::
@@ -696,14 +995,25 @@ class Regexp_Highlighter(On_The_Fly_Highlighter):
        not detect cases where the regular expression would match across
        sections.
     :param OverlayStyle style: the style to apply.
+    :param boolean local_search: whether to search the text of each batch
+       with Python's re module, one line at a time, rather than with the
+       editor's search. The regexp must then use the Python syntax, and
+       cannot match across lines.
     """
 
-    def __init__(self, regexp, style, context_lines=0):
+    def __init__(self, regexp, style, context_lines=0, local_search=False):
         self.regexp = regexp
+        self.local_search = local_search
+        if local_search:
+            self.compiled = re.compile(regexp, re.IGNORECASE)
         On_The_Fly_Highlighter.__init__(
             self, context_lines=context_lines, style=style)
 
     def process(self, start, end):
+        if self.local_search:
+            highlight_matches(self.style, start, end, self.compiled)
+            return
+
         while True:
             start = start.search(
                 self.regexp, regexp=True, dialog_on_failure=False)
@@ -726,15 +1036,28 @@ class Text_Highlighter(On_The_Fly_Highlighter):
        is done on small sections of the editor at a time, and it might
        not detect cases where the text would match across sections.
     :param OverlayStyle style: the style to apply.
+    :param boolean local_search: whether to search the text of each batch
+       in Python, rather than with the editor's search.
     """
 
-    def __init__(self, text, style, whole_word=False, context_lines=0):
+    def __init__(self, text, style, whole_word=False, context_lines=0,
+                 local_search=False):
         self.text = text
         self.whole_word = whole_word
+        self.local_search = local_search
+        if local_search:
+            pattern = re.escape(text)
+            if whole_word:
+                pattern = r"(?<!\w)%s(?!\w)" % pattern
+            self.compiled = re.compile(pattern, re.IGNORECASE | re.UNICODE)
         On_The_Fly_Highlighter.__init__(
             self, context_lines=context_lines, style=style)
 
     def process(self, start, end):
+        if self.local_search:
+            highlight_matches(self.style, start, end, self.compiled)
+            return
+
         while True:
             start = start.search(
                 self.text, regexp=False, dialog_on_failure=False,
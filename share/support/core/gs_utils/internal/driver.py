@@ -3,6 +3,7 @@
 
 import os
 import GPS
+import modules
 import sys
 from workflows import driver
 from editor import click_in_text
@@ -24,6 +25,18 @@ def do_exit(timeout):
     GPS.exit(force=1)
 
 
+_gps_started = [False]
+# Whether the gps_started hook has already run. This is the case when the
+# test is run by gs_utils.internal.warm_server.
+
+
+def _on_gps_started(hook):
+    _gps_started[0] = True
+
+
+GPS.Hook("gps_started").add(_on_gps_started)
+
+
 def run_test_driver(action_fn):
     """
     This function runs a test driver. A test driver is a workflow (see
@@ -53,7 +66,11 @@ def run_test_driver(action_fn):
     """
 
     def workflow():
-        _ = yield hook("gps_started")
+        if not _gps_started[0]:
+            _ = yield hook("gps_started")
+
+        # Do not let the test start before the modules are set up
+        modules.Module_Metaclass.setup_pending_modules()
         yield timeout(10)
 
         last_result = None
@@ -72,6 +89,8 @@ def run_test_driver(action_fn):
                    traceback.format_exc()))
 
         finally:
+            exit_timeout.remove()
+
             if "GPS_PREVENT_EXIT" not in os.environ:
                 if last_result in (SUCCESS, FAILURE, NOT_RUN, XFAIL):
                     status = last_result
@@ -92,7 +111,7 @@ def run_test_driver(action_fn):
     # Exit GPS 10 seconds before the rlimit expires. If the rlimit
     # is not set, default to waiting 130 seconds.
     timeout_seconds = int(os.environ.get('GPS_RLIMIT_SECONDS', '130')) - 10
-    GPS.Timeout(timeout_seconds * 1000, do_exit)
+    exit_timeout = GPS.Timeout(timeout_seconds * 1000, do_exit)
 
     # Run the workflow
 
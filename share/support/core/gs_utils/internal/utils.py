@@ -2,6 +2,7 @@
 # -*- coding: utf-8 -*-
 import GPS
 import inspect
+import json
 import os
 import imp
 import sys
@@ -14,7 +15,8 @@ from pygps.project import *
 import traceback
 import platform
 import workflows
-from workflows.promises import Promise, timeout, known_tasks
+from workflows.promises import Promise, timeout, known_tasks, \
+    wait_until, task_hooks
 
 
 system_is_cygwin = ('uname' in os.__dict__ and
@@ -180,28 +182,23 @@ def safe_exit(expected_commands=[], delay=0, force=1):
 def wait_for_mdi_child(name, step=500, n=10):
     """
     Wait for the MDI child designated by :param str name: to be added
-    to the MDI, waiting for the time specified in :param int step: n
-    times.
+    to the MDI, for at most :param int step: * :param int n:
+    milliseconds.
     """
 
-    k = 0
-    while GPS.MDI.get(name) is None and k < n:
-        yield timeout(step)
-        k += 1
+    yield wait_until(lambda: GPS.MDI.get(name) is not None,
+                     hooks=("mdi_child_selected", ),
+                     timeout=step * n)
 
 
 @workflows.run_as_workflow
 def wait_until_true(test_func, *args, **kwargs):
     """
     Wait for the the  :param func test_func: to return True, without
-    blocking the UI.
+    blocking the UI. The function is checked periodically, and the wait
+    ends after 15 seconds.
     """
-    k = 0
-    n = 30
-
-    while not test_func(*args, **kwargs) and k < n:
-        yield timeout(500)
-        k += 1
+    yield wait_until(lambda: test_func(*args, **kwargs), timeout=15000)
 
 
 @workflows.run_as_workflow
@@ -223,20 +220,20 @@ def wait_until_not_busy(debugger, t=100):
     Wait until the given GPS.Debugger is not busy
     """
 
-    while debugger.is_busy():
-        yield timeout(t)
+    yield wait_until(lambda: not debugger.is_busy(),
+                     hooks=("debugger_state_changed", ),
+                     poll=t)
 
 
 def wait_for_entities(cb, *args, **kwargs):
     """Execute cb when all entities have finished loading.
        This function is not blocking"""
 
-    def on_timeout(timeout):
-        if GPS.Command.list() == []:
-            timeout.remove()
-            cb(*args, **kwargs)
+    def internal_on_no_commands(value):
+        cb(*args, **kwargs)
 
-    GPS.Timeout(200, on_timeout)
+    wait_until(lambda: GPS.Command.list() == [],
+               hooks=task_hooks, delay=200).then(internal_on_no_commands)
 
 
 def wait_for_tasks(cb, *args, **kwargs):
@@ -245,17 +242,15 @@ def wait_for_tasks(cb, *args, **kwargs):
     def internal_on_idle():
         cb(*args, **kwargs)
 
-    def internal_wait_until_no_tasks(timeout):
-        if GPS.Task.list() == []:
-            timeout.remove()
+    def internal_on_no_tasks(value):
+        # Tasks can update locations view, so wait until locations view
+        # has completed its operations also.
 
-            # Tasks can update locations view, so wait until locations view
-            # has completed its operations also.
-
-            process_all_events()
-            GLib.idle_add(internal_on_idle)
+        process_all_events()
+        GLib.idle_add(internal_on_idle)
 
-    GPS.Timeout(400, internal_wait_until_no_tasks)
+    wait_until(lambda: GPS.Task.list() == [],
+               hooks=task_hooks, delay=400).then(internal_on_no_tasks)
 
 
 def wait_for_idle(cb, *args, **kwargs):
@@ -289,6 +284,32 @@ def record_time(t):
     f.close()
 
 
+perf_timings = {}
+# The timings recorded by record_perf
+
+
+def record_perf(name, t):
+    """ Record the duration of a step of a scenario of the performance
+        testsuite (see testsuite/perf) in the perf.json file, together with
+        the peak memory usage of GPS so far.
+        t should be a float representing the number of seconds that the
+        step took.
+    """
+
+    perf_timings[name] = t
+    data = {'timings': perf_timings}
+    try:
+        import resource
+        # In kilobytes on Linux
+        data['peak_rss_kb'] = resource.getrusage(
+            resource.RUSAGE_SELF).ru_maxrss
+    except ImportError:
+        pass
+
+    with open('perf.json', 'w') as f:
+        json.dump(data, f, indent=1, sort_keys=True)
+
+
 def recompute_xref():
     """ Force an Xref recomputation immediately. """
 
@@ -0,0 +1,256 @@
+"""
+Run the tests of the testsuite one after the other in the same GPS.
+
+The testsuite loads this module through --eval when it is run with
+--warm. The requests are read on the standard input, one JSON object per
+line:
+
+    {"id": 1, "dir": "/path/to/test", "script": "test.py",
+     "project": "/path/to/test/test.gpr"}
+
+The script is executed as if GPS had been started in the test directory
+with --load=python:test.py. GPS.exit is replaced so that it ends the test
+instead of exiting.
+
+The output of a test is what is written on the standard error between
+the lines "@@WARM_BEGIN <id>" and "@@WARM_END <id> <status>", where
+status is the one passed to GPS.exit. The line "@@WARM_READY" is written
+once GPS has started.
+
+Between two tests, the background tasks are interrupted, the editors
+are closed, the hook functions added by the test are removed, the
+preferences and scenario variables set by the test are restored and its
+project is unloaded. Other changes are not undone: only the tests marked
+with "warm: true" in their test.yaml are run here.
+"""
+
+import GPS
+import json
+import os
+import sys
+import traceback
+from gi.repository import GLib
+from gs_utils.internal import asserts, utils
+
+# Import the test driver before GPS starts, so that it knows when it runs
+# in a GPS that has already started
+import gs_utils.internal.driver
+
+_gps_exit = GPS.exit
+_Preference = GPS.Preference
+_Hook = GPS.Hook
+
+_current = None
+# The test being run, if any
+
+_requests = []
+# The requests received and not run yet
+
+_input = ['']
+# The last incomplete line read on the standard input
+
+
+class _Test(object):
+    """
+    A test being run in this GPS.
+    """
+
+    def __init__(self, request):
+        self.id = request['id']
+        self.dir = request['dir']
+        self.script = os.path.join(self.dir, request['script'])
+        self.project = request['project']
+        self.done = False
+        self.prefs = {}
+        # The preferences set by the test, and their initial value
+
+        self.hooks = []
+        # The functions added to hooks by the test, as (hook name, function)
+
+        self.scenario = {}
+        # The values of the scenario variables when the project was loaded
+
+
+class _RecordedPreference(_Preference):
+    """
+    A GPS.Preference that remembers the values that the current test
+    changes, so that they can be restored.
+    """
+
+    def __init__(self, name):
+        _Preference.__init__(self, name)
+        self.__name = name
+
+    def set(self, value, save=True):
+        if _current is not None and self.__name not in _current.prefs:
+            _current.prefs[self.__name] = _Preference(self.__name).get()
+        return _Preference.set(self, value, save)
+
+
+class _RecordedHook(_Hook):
+    """
+    A GPS.Hook that remembers the functions added by the current test, so
+    that they can be removed. Only the functions defined in the directory
+    of the test are recorded: the plug-ins might connect to hooks while
+    the test runs.
+    """
+
+    def __init__(self, name):
+        _Hook.__init__(self, name)
+        self.__name = name
+
+    def __record(self, function):
+        code = getattr(getattr(function, '__func__', function),
+                       '__code__', None)
+        if (_current is not None and code is not None and
+                code.co_filename.startswith(os.path.join(_current.dir, ''))):
+            _current.hooks.append((self.__name, function))
+
+    def add(self, function, last=True):
+        self.__record(function)
+        return _Hook.add(self, function, last)
+
+    def add_debounce(self, function, last=True):
+        self.__record(function)
+        return _Hook.add_debounce(self, function, last)
+
+
+def _empty_project():
+    """
+    The project loaded between two tests, so that nothing from the project
+    of the previous test remains.
+    """
+    d = os.path.join(GPS.get_home_dir(), 'warm_empty')
+    project = os.path.join(d, 'warm_empty.gpr')
+    if not os.path.exists(project):
+        if not os.path.isdir(d):
+            os.makedirs(d)
+        with open(project, 'w') as f:
+            f.write('project Warm_Empty is\n'
+                    '   for Source_Dirs use ();\n'
+                    'end Warm_Empty;\n')
+    return project
+
+
+def _write(text):
+    """
+    Write on the standard error, in the same stream as the traces.
+    """
+    os.write(2, text)
+
+
+def _exit(force=False, status=0):
+    """
+    Replaces GPS.exit while a test is running.
+    """
+    if _current is None:
+        _gps_exit(force=force, status=status)
+    elif not _current.done:
+        _current.done = True
+        GLib.idle_add(_end_test, _current, status)
+
+
+def _reset():
+    """
+    Reset the state of GPS to the one before the test.
+    """
+    for t in GPS.Task.list():
+        t.interrupt()
+    for b in GPS.EditorBuffer.list():
+        b.close(force=True)
+
+    for name, function in _current.hooks:
+        try:
+            _Hook(name).remove(function)
+        except GPS.Exception:
+            # Already removed by the test
+            pass
+
+    for name, value in _current.prefs.iteritems():
+        _Preference(name).set(value)
+
+    for name, value in GPS.Project.scenario_variables().iteritems():
+        initial = _current.scenario.get(name)
+        if initial is not None and initial != value:
+            GPS.Project.set_scenario_variable(name, initial)
+    GPS.Project.load(_empty_project(), force=True)
+
+    GPS.Console("Messages").clear()
+
+    if _current.dir in sys.path:
+        sys.path.remove(_current.dir)
+    prefix = os.path.join(_current.dir, '')
+    for name, module in sys.modules.items():
+        if (getattr(module, '__file__', None) or '').startswith(prefix):
+            del sys.modules[name]
+
+    asserts.exit_status = asserts.SUCCESS
+    utils.exit_status = asserts.SUCCESS
+    utils.before_exit_has_run = 0
+
+
+def _end_test(test, status):
+    global _current
+    try:
+        _reset()
+    except Exception:
+        GPS.Logger('TESTSUITE').log(
+            "Could not reset GPS after the test:\n%s" %
+            traceback.format_exc())
+    _current = None
+    _write("@@WARM_END %s %s\n" % (test.id, status or 0))
+    _run_next()
+    return False
+
+
+def _run_next():
+    """
+    Run the next test, if any and none is running.
+    """
+    global _current
+    if _current is not None or not _requests:
+        return
+
+    _current = _Test(_requests.pop(0))
+    _write("@@WARM_BEGIN %s\n" % _current.id)
+
+    os.chdir(_current.dir)
+    GPS.cd(_current.dir)
+    sys.path.insert(0, _current.dir)
+
+    try:
+        GPS.Project.load(_current.project, force=True)
+        _current.scenario = GPS.Project.scenario_variables()
+        execfile(_current.script,
+                 {'__name__': '__main__', '__file__': _current.script})
+    except Exception:
+        GPS.Logger('TESTSUITE').log(
+            "Exception while loading %s:\n%s" %
+            (_current.script, traceback.format_exc()))
+        _exit(force=True, status=asserts.FAILURE)
+
+
+def _on_input(fd, condition):
+    data = os.read(fd, 65536)
+    if not data:
+        # The testsuite is gone
+        _gps_exit(force=True)
+        return False
+
+    lines = (_input[0] + data).split('\n')
+    _input[0] = lines.pop()
+    _requests.extend(json.loads(line) for line in lines if line.strip())
+    _run_next()
+    return True
+
+
+def _on_gps_started(hook):
+    GPS.exit = _exit
+    GPS.Preference = _RecordedPreference
+    GPS.Hook = _RecordedHook
+    GLib.io_add_watch(0, GLib.PRIORITY_DEFAULT,
+                      GLib.IO_IN | GLib.IO_HUP, _on_input)
+    _write("@@WARM_READY\n")
+
+
+GPS.Hook("gps_started").add(_on_gps_started)
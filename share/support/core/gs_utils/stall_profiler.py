@@ -0,0 +1,200 @@
+"""
+Measure how long python code blocks the GPS main loop.
+
+The workflows driver, the hooks connected through `modules.Module` or the
+`gs_utils.hook` decorator, and the actions created by
+`gs_utils.make_interactive` report the duration of each of their calls
+to this module. For each function, a histogram of the most recent
+durations is kept, and calls longer than `threshold_ms` are logged in
+the PYTHON.STALLS trace, along with the location of the function and the
+python stack.
+
+Use the action "dump python stalls" to display these statistics, or
+`dump()` to save them as JSON.
+"""
+
+import GPS
+import collections
+import json
+import os
+import time
+import traceback
+
+threshold_ms = 100
+# Calls longer than this are logged
+
+window = 256
+# Number of durations kept for each function, to compute the histograms
+
+buckets_ms = (1, 5, 10, 50, 100, 500, 1000)
+# The upper bounds of the histogram buckets. Longer calls are counted in
+# an extra bucket.
+
+logger = GPS.Logger("PYTHON.STALLS")
+
+
+class _Stats(object):
+    """
+    The durations of the calls to one function.
+    """
+
+    def __init__(self, kind, name, location):
+        self.kind = kind
+        self.name = name
+        self.location = location
+        self.count = 0
+        self.total = 0.0
+        self.longest = 0.0
+        self.recent = collections.deque(maxlen=window)
+
+    def histogram(self):
+        """
+        :return: the number of recent calls in each bucket
+        :rtype: list[int]
+        """
+        result = [0] * (len(buckets_ms) + 1)
+        for d in self.recent:
+            ms = d * 1000.0
+            for idx, bound in enumerate(buckets_ms):
+                if ms <= bound:
+                    result[idx] += 1
+                    break
+            else:
+                result[-1] += 1
+        return result
+
+    def as_dict(self):
+        return {'kind': self.kind,
+                'name': self.name,
+                'location': self.location,
+                'count': self.count,
+                'total_ms': round(self.total * 1000.0, 3),
+                'longest_ms': round(self.longest * 1000.0, 3),
+                'histogram': self.histogram()}
+
+
+_stats = {}
+# (kind, code object or name) -> _Stats
+
+
+def location(func):
+    """
+    Return the name and location of a function, a bound method or a
+    generator.
+
+    :return: a tuple (name, "file:line")
+    """
+    code = getattr(func, 'gi_code', None)
+    if code is None:
+        func = getattr(func, 'im_func', func)
+        code = getattr(func, 'func_code', None)
+    if code is None:
+        return (getattr(func, '__name__', repr(func)), '')
+    return (code.co_name, '%s:%s' % (code.co_filename, code.co_firstlineno))
+
+
+def record(kind, func, elapsed, name=None):
+    """
+    Record the duration of a call.
+
+    :param str kind: the kind of call, for instance "workflow", "hook"
+       or "action"
+    :param func: the function, bound method or generator that was called
+    :param float elapsed: the duration of the call, in seconds
+    :param str name: the name to use in reports, instead of the name of
+       the function
+    """
+    key = (kind, getattr(func, 'gi_code', None) or
+           getattr(getattr(func, 'im_func', func), 'func_code', None) or
+           name)
+    s = _stats.get(key)
+    if s is None:
+        n, loc = location(func)
+        s = _stats[key] = _Stats(kind, name or n, loc)
+
+    s.count += 1
+    s.total += elapsed
+    s.longest = max(s.longest, elapsed)
+    s.recent.append(elapsed)
+
+    if elapsed * 1000.0 > threshold_ms and logger.active:
+        logger.log("%s %s (%s) blocked the main loop for %dms\n%s" % (
+            kind, s.name, s.location, elapsed * 1000.0,
+            "".join(traceback.format_stack()[:-2])))
+
+
+def timed(kind, func, name=None):
+    """
+    Return a function that calls func and records the duration of the call.
+
+    :param str kind: see `record`
+    :param func: the function to wrap
+    :param str name: see `record`
+    """
+    def _timed(*args, **kwargs):
+        start = time.time()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            record(kind, func, time.time() - start, name)
+
+    _timed.__name__ = getattr(func, '__name__', 'timed')
+    _timed.__doc__ = getattr(func, '__doc__', None)
+    return _timed
+
+
+def statistics():
+    """
+    Return the statistics for all functions, the ones that blocked the
+    main loop the longest first.
+
+    :rtype: list[dict]
+    """
+    return sorted((s.as_dict() for s in _stats.itervalues()),
+                  key=lambda d: -d['total_ms'])
+
+
+def reset():
+    """
+    Forget all statistics.
+    """
+    _stats.clear()
+
+
+def dump(filename=None):
+    """
+    Save the statistics as JSON.
+
+    :param str filename: the file to write. By default, this is
+       python_stalls.json in the GPS home directory.
+    :return: the name of the file
+    """
+    if filename is None:
+        filename = os.path.join(GPS.get_home_dir(), 'python_stalls.json')
+    with open(filename, 'w') as f:
+        json.dump({'threshold_ms': threshold_ms,
+                   'buckets_ms': list(buckets_ms),
+                   'functions': statistics()}, f, indent=1)
+    return filename
+
+
+def _show_stalls():
+    """
+    Display the python functions that blocked the main loop the longest,
+    and save the statistics as JSON in the GPS home directory.
+    """
+    console = GPS.Console()
+    console.write("Python code blocking the main loop (ms):\n")
+    console.write("%10s %10s %8s  %s\n" % ('total', 'longest', 'calls',
+                                          'function'))
+    for s in statistics()[:30]:
+        console.write("%10.1f %10.1f %8d  %s %s (%s)\n" % (
+            s['total_ms'], s['longest_ms'], s['count'],
+            s['kind'], s['name'], s['location']))
+    console.write("Full statistics saved in %s\n" % dump())
+
+
+GPS.Action("dump python stalls").create(
+    _show_stalls,
+    category="Debug",
+    description=_show_stalls.__doc__.strip())
@@ -0,0 +1,149 @@
+"""
+Measure where the startup of GPS goes.
+
+From the time this module is imported (as part of gs_utils, by one of the
+first plug-ins) until all the modules (see modules.Module) have been set
+up, this module records how long it takes to:
+
+   - import each plug-in, including the modules it imports itself
+   - set up each module
+   - parse each XML string passed to GPS.parse_xml
+
+The resulting timeline, the longest steps first, is written in the
+GPS.STARTUP_TIMELINE trace once the startup is complete. Each step is
+also available through `steps()`.
+"""
+
+import GPS
+import __builtin__
+import sys
+import time
+
+logger = GPS.Logger("GPS.STARTUP_TIMELINE")
+
+max_logged = 40
+# Number of steps logged in details
+
+_origin = time.time()
+# The steps are timed relative to this
+
+_steps = []
+# The steps recorded so far: tuples (kind, name, start, duration)
+
+_active = [True]
+# Whether the startup is still in progress
+
+_import_depth = [0]
+
+
+def record(kind, name, start, duration):
+    """
+    Record one step of the startup.
+
+    :param str kind: the kind of step, for instance "import", "setup" or
+       "parse_xml"
+    :param str name: what was imported, set up or parsed
+    :param float start: when the step started, as returned by time.time()
+    :param float duration: the duration of the step, in seconds
+    """
+    if _active[0]:
+        _steps.append((kind, name, start - _origin, duration))
+
+
+def steps():
+    """
+    :return: the steps recorded, as tuples (kind, name, start, duration),
+       the start being relative to the import of this module
+    :rtype: list[(str, str, float, float)]
+    """
+    return list(_steps)
+
+
+def _caller_module(depth):
+    """
+    The name of the module calling the function at depth, ignoring the
+    wrappers in gs_utils.
+    """
+    try:
+        frame = sys._getframe(depth + 1)
+    except ValueError:
+        return '?'
+    while frame.f_back and frame.f_globals.get('__name__') == 'gs_utils':
+        frame = frame.f_back
+    return frame.f_globals.get('__name__', '?')
+
+
+_builtin_import = __builtin__.__import__
+
+
+def _timed_import(name, *args, **kwargs):
+    """
+    Replaces __import__ during the startup. Only the outermost imports are
+    recorded, for modules that were not imported yet.
+    """
+    if _import_depth[0] > 0 or name in sys.modules:
+        _import_depth[0] += 1
+        try:
+            return _builtin_import(name, *args, **kwargs)
+        finally:
+            _import_depth[0] -= 1
+
+    _import_depth[0] += 1
+    start = time.time()
+    try:
+        return _builtin_import(name, *args, **kwargs)
+    finally:
+        _import_depth[0] -= 1
+        record('import', name, start, time.time() - start)
+
+
+_parse_xml = GPS.parse_xml
+
+
+def _timed_parse_xml(*args, **kwargs):
+    """
+    Replaces GPS.parse_xml, to know which plug-in parses what.
+    """
+    if not _active[0]:
+        return _parse_xml(*args, **kwargs)
+
+    start = time.time()
+    try:
+        return _parse_xml(*args, **kwargs)
+    finally:
+        record('parse_xml', _caller_module(1), start, time.time() - start)
+
+
+def finish():
+    """
+    Called when the startup is complete: stop recording and write the
+    timeline in the log.
+    """
+    if not _active[0]:
+        return
+    _active[0] = False
+    if __builtin__.__import__ is _timed_import:
+        __builtin__.__import__ = _builtin_import
+    if GPS.parse_xml is _timed_parse_xml:
+        GPS.parse_xml = _parse_xml
+
+    if not logger.active:
+        return
+
+    totals = {}
+    for kind, name, start, duration in _steps:
+        totals[kind] = totals.get(kind, 0.0) + duration
+
+    logger.log("startup complete after %dms: %s" % (
+        (time.time() - _origin) * 1000.0,
+        ", ".join("%s %dms" % (kind, d * 1000.0)
+                  for kind, d in sorted(totals.items()))))
+
+    for kind, name, start, duration in sorted(
+            _steps, key=lambda s: s[3], reverse=True)[:max_logged]:
+        logger.log("%6dms %-9s %s (at %dms)" % (
+            duration * 1000.0, kind, name, start * 1000.0))
+
+
+__builtin__.__import__ = _timed_import
+GPS.parse_xml = _timed_parse_xml
@@ -0,0 +1,203 @@
+"""
+A cache of the output of the commands that plug-ins run to know the
+capabilities of a tool, such as "gnatprove -h" or "gcov --version".
+
+The output of a command is cached on disk, and reused as long as the
+executable, found on the PATH, keeps the same size and modification time.
+Only the output of the commands that succeed is cached.
+
+Plug-ins register the commands they will need with `register`. These are
+run in the background and in parallel when GPS starts and when the
+project changes, so that `output` usually finds the result in the cache
+rather than running the tool synchronously:
+
+    tool_probes.register(["gcov", "--version"])
+    ...
+    out = tool_probes.output(["gcov", "--version"])
+"""
+
+import GPS
+import json
+import os
+import os_utils
+
+CACHE_VERSION = 1
+
+logger = GPS.Logger("GPS.TOOL_PROBES")
+
+_registered = []
+# The commands, or functions returning a list of commands, to run in the
+# background
+
+_cache = None
+# The cached outputs, indexed by _cache_key. Loaded on demand.
+
+_running = {}
+# The cache keys of the probes running in the background
+
+
+def _cache_file():
+    return os.path.join(GPS.get_home_dir(), 'tool_probes.json')
+
+
+def _load_cache():
+    global _cache
+    if _cache is None:
+        _cache = {}
+        try:
+            with open(_cache_file()) as f:
+                data = json.load(f)
+            if data.get('version') == CACHE_VERSION:
+                _cache = data['probes']
+        except (IOError, OSError, ValueError, KeyError):
+            pass
+    return _cache
+
+
+def _save_cache():
+    # Write a temporary file first, so that the cache is never left half
+    # written
+    filename = _cache_file()
+    try:
+        tmp = filename + '.tmp'
+        with open(tmp, 'w') as f:
+            json.dump({'version': CACHE_VERSION, 'probes': _cache}, f)
+        if os.path.exists(filename):
+            os.remove(filename)
+        os.rename(tmp, filename)
+    except (IOError, OSError) as e:
+        logger.log("could not save %s: %s" % (filename, e))
+
+
+def _executable(cmd):
+    """
+    Return a tuple (path, size, mtime) for the executable run by cmd, or
+    None if it is not found on the PATH.
+
+    :param list[str] cmd: the command line
+    """
+    path = os_utils.locate_exec_on_path(cmd[0])
+    if not path:
+        return None
+    for p in (path, path + '.exe'):
+        try:
+            st = os.stat(p)
+            return (p, st.st_size, st.st_mtime)
+        except OSError:
+            pass
+    return None
+
+
+def _cache_key(cmd, exe):
+    return json.dumps([exe[0]] + list(cmd[1:]))
+
+
+def _cached(cmd, exe):
+    """
+    Return the cached output of cmd, or None if it needs to be run again.
+    """
+    entry = _load_cache().get(_cache_key(cmd, exe))
+    if entry is not None and \
+            entry['size'] == exe[1] and entry['mtime'] == exe[2]:
+        return entry['output']
+    return None
+
+
+def _store(cmd, exe, output):
+    _load_cache()[_cache_key(cmd, exe)] = {
+        'size': exe[1], 'mtime': exe[2], 'output': output}
+    _save_cache()
+
+
+def output(cmd):
+    """
+    Return the output of cmd, from the cache if possible.
+    The command is run synchronously otherwise.
+
+    :param list[str] cmd: the command line. Its first element is looked up
+       on the PATH.
+    :return: the output of the command, or None if the executable was not
+       found or could not be run. The output of a command that fails is
+       returned, but not cached.
+    :rtype: str|None
+    """
+    exe = _executable(cmd)
+    if exe is None:
+        return None
+
+    out = _cached(cmd, exe)
+    if out is None:
+        logger.log("running %s" % (cmd, ))
+        try:
+            p = GPS.Process(cmd)
+            out = p.get_result()
+            status = p.wait()
+        except Exception:
+            return None
+        if status == 0:
+            _store(cmd, exe, out)
+        else:
+            logger.log("%s exited with status %s" % (cmd, status))
+    return out
+
+
+def register(cmd):
+    """
+    Register a command to run in the background, so that its output is
+    in the cache when `output` is called.
+
+    :param cmd: a command line as a list of strings, or a function with
+       no argument that returns such a command line or None, for commands
+       that depend on the project (its target for instance).
+    """
+    _registered.append(cmd)
+
+
+def _probe(cmd):
+    # Not imported at the top: this module is used by plug-ins loaded before
+    # the directory containing workflows is in sys.path
+    from workflows.promises import ProcessWrapper
+
+    exe = _executable(cmd)
+    if exe is None or _cached(cmd, exe) is not None:
+        return
+
+    key = _cache_key(cmd, exe)
+    if key in _running:
+        return
+
+    def on_terminate(result):
+        _running.pop(key, None)
+        if result is not None and result[0] == 0:
+            _store(cmd, exe, result[1])
+
+    logger.log("probing %s" % (cmd, ))
+    try:
+        p = ProcessWrapper(cmd, block_exit=False)
+    except Exception:
+        return
+    _running[key] = p
+    p.wait_until_terminate().then(on_terminate)
+
+
+def probe_all():
+    """
+    Run, in parallel and in the background, the registered commands whose
+    output is not in the cache.
+    """
+    for cmd in _registered:
+        if callable(cmd):
+            try:
+                cmd = cmd()
+            except Exception:
+                cmd = None
+        if cmd:
+            _probe(cmd)
+
+
+def _on_probe_hook(hook):
+    probe_all()
+
+
+GPS.Hook("gps_started").add(_on_probe_hook)
+GPS.Hook("project_view_changed").add(_on_probe_hook)
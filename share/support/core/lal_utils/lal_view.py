@@ -314,6 +314,8 @@ class LAL_View(Module):
     """ A GPS module, providing the libadalang view """
 
     view_title = "Libadalang"
+    lazy = True
+    setup_on_actions = ("open Libadalang", )
     mdi_position = GPS.MDI.POSITION_RIGHT
     mdi_group = GPS.MDI.GROUP_DEBUGGER_STACK
 
@@ -39,6 +39,22 @@ Here is an example of use for this package::
     def on_view_destroy(self):
         self.stored_something = None
 
+Modules are set up after GPS has started, in idle callbacks, the ones with
+the highest :attr:`Module.setup_priority` first. A module that is only
+needed once the user opens its view can be made lazy instead, so that it
+is only set up on demand::
+
+  class My_View(Module):
+    lazy = True
+    setup_on_actions = ("open my view", )
+
+    def setup(self):
+        make_interactive(self.get_view, name="open my view")
+
+The time taken to import the plug-ins, set up the modules and parse their
+XML at startup is written in the GPS.STARTUP_TIMELINE trace, see
+:mod:`gs_utils.startup_timeline`.
+
 Sometimes, the module is wrapping an GPS.GUI object that has been created
 by GPS itself (for instance a :class:`GPS.Browsers.View`). Since
 :func:`GPS.Browsers.View.create` is putting the view directly in the MDI,
@@ -50,8 +66,10 @@ underscore) as a parameter to :func:`GPS.Browsers.View.create`.
 
 
 import GPS
+import time
 import traceback
 import sys
+from gs_utils import stall_profiler, startup_timeline, make_interactive
 
 try:
     # While building the doc, we might not have access to this module
@@ -74,6 +92,15 @@ class Module_Metaclass(type):
     modules = []
     modules_instances = []
 
+    pending = []
+    # The modules waiting to be set up, the highest priority first
+
+    setup_scheduled = False
+    # Whether an idle callback is setting up the pending modules
+
+    slice_duration = 0.02
+    # Maximum time spent setting up modules in one idle callback, in seconds
+
     def __new__(cls, name, bases, attrs):
         new_class = type.__new__(cls, name, bases, attrs)
 
@@ -85,7 +112,7 @@ class Module_Metaclass(type):
             if Module_Metaclass.gps_started:
                 inst = new_class()
                 Module_Metaclass.modules_instances.append(inst)
-                GLib.idle_add(lambda: inst._setup())
+                inst._schedule_setup()
 
                 # Simulate running the gps_started hook
                 pref = getattr(inst, "gps_started", None)
@@ -101,7 +128,37 @@ class Module_Metaclass(type):
             for ModuleClass in Module_Metaclass.modules:
                 inst = ModuleClass()
                 Module_Metaclass.modules_instances.append(inst)
-                inst._setup()
+                inst._schedule_setup()
+
+            if not Module_Metaclass.setup_scheduled:
+                # Only lazy modules: the startup is complete
+                startup_timeline.finish()
+
+    @staticmethod
+    def _setup_slice():
+        """
+        Set up the pending modules until slice_duration has elapsed.
+        """
+        end = time.time() + Module_Metaclass.slice_duration
+        while Module_Metaclass.pending and time.time() < end:
+            Module_Metaclass.pending.pop(0)._setup()
+
+        if Module_Metaclass.pending:
+            return True
+
+        Module_Metaclass.setup_scheduled = False
+        startup_timeline.finish()
+        return False
+
+    @staticmethod
+    def setup_pending_modules():
+        """
+        Set up all the modules still waiting for an idle callback, now.
+        Lazy modules are not set up.
+        """
+        while Module_Metaclass.pending:
+            Module_Metaclass.pending.pop(0)._setup()
+        startup_timeline.finish()
 
     @staticmethod
     def load_desktop(name, data):
@@ -155,6 +212,33 @@ class Module(object):
     mdi_position = GPS.MDI.POSITION_BOTTOM
     # the initial position of the window in the MDI (see GPS.MDI.add)
 
+    setup_priority = 0
+    # Modules with a higher priority are set up first. Modules that affect
+    # what the user sees first, like the highlighting of the editors, should
+    # have a positive priority, and modules that only add menus a negative
+    # one.
+
+    lazy = False
+    # If True, the module is not set up after GPS has started, but the
+    # first time one of its views is created or restored from the desktop,
+    # one of the hooks in setup_on_hooks runs, or one of the actions in
+    # setup_on_actions is executed.
+
+    setup_on_hooks = ()
+    # For lazy modules, the hooks that trigger the setup. The method of
+    # the module for this hook, if any, is not called for the run that
+    # triggered the setup, so setup() should take the current state into
+    # account.
+
+    setup_on_actions = ()
+    # For lazy modules, the actions that trigger the setup. setup() must
+    # create these actions: until then, GPS has placeholders for them that
+    # set up the module and execute its action.
+
+    setup_actions_category = "Views"
+    # The category of the placeholders for setup_on_actions, as displayed
+    # in the key shortcuts editor
+
     mdi_group = GPS.MDI.GROUP_CONSOLES
     # the group for this window. This is used in case the user has already
     # created windows in this group, and in this case the new view will be
@@ -259,16 +343,23 @@ class Module(object):
         """
         pref = getattr(self, hook_name, None)  # a bound method
         if pref:
+            name = "%s.%s" % (type(self).__name__, hook_name)
+
             def internal(*args, **kwargs):
-                if args:
-                    hook = args[0]
-                    args = args[1:]
-                    if hook == hook_name:
-                        return pref(*args, **kwargs)
+                start = time.time()
+                try:
+                    if args:
+                        hook = args[0]
+                        args = args[1:]
+                        if hook == hook_name:
+                            return pref(*args, **kwargs)
+                        else:
+                            return pref(hook, *args, **kwargs)
                     else:
-                        return pref(hook, *args, **kwargs)
-                else:
-                    return pref(*args, **kwargs)
+                        return pref(*args, **kwargs)
+                finally:
+                    stall_profiler.record(
+                        'hook', pref, time.time() - start, name)
             setattr(self, "__%s" % hook_name, internal)
             p = getattr(self, "__%s" % hook_name)
             if hook_name == "context_changed":
@@ -305,14 +396,91 @@ class Module(object):
             GPS.Hook(hook_name).remove(p)
 
     #########################################
-    # Views
+    # Setup
     #########################################
 
+    def _schedule_setup(self):
+        """
+        Set up the module in an idle callback, or prepare its lazy setup.
+        """
+        if self.lazy:
+            self.__prepare_lazy_setup()
+            return
+
+        pending = Module_Metaclass.pending
+        pending.append(self)
+        pending.sort(key=lambda m: -m.setup_priority)
+        if not Module_Metaclass.setup_scheduled:
+            Module_Metaclass.setup_scheduled = True
+            GLib.idle_add(Module_Metaclass._setup_slice)
+
+    def __prepare_lazy_setup(self):
+        """
+        Connect the hooks and create the actions that trigger the setup of
+        a lazy module.
+        """
+        def on_hook(hook, *args, **kwargs):
+            self._ensure_setup()
+
+        def on_action(name):
+            # The placeholder is replaced during the setup, so do not do it
+            # while it is executing
+            def setup_and_execute():
+                self._ensure_setup()
+                GPS.execute_action(name)
+                return False
+            GLib.idle_add(setup_and_execute)
+
+        self.__lazy_hook = on_hook
+        for h in self.setup_on_hooks:
+            GPS.Hook(h).add(on_hook)
+
+        # Only the placeholders are removed during the setup: the actions
+        # that already exist are kept
+        self.__placeholders = [
+            name for name in self.setup_on_actions
+            if not GPS.Action(name).exists()]
+        for name in self.__placeholders:
+            make_interactive(lambda name=name: on_action(name),
+                             category=self.setup_actions_category,
+                             name=name)
+
+    def _ensure_setup(self):
+        """
+        Set up the module now if it has not been set up yet.
+        """
+        if getattr(self, '_is_setup', False):
+            return
+        if not Module_Metaclass.gps_started:
+            # Restoring a view from the desktop: too early for setup(), but
+            # the module is now needed at startup
+            self.lazy = False
+            return
+        if self in Module_Metaclass.pending:
+            Module_Metaclass.pending.remove(self)
+        self._setup()
+
+    def __remove_lazy_triggers(self):
+        on_hook = getattr(self, '_Module__lazy_hook', None)
+        if on_hook is None:
+            return
+        self.__lazy_hook = None
+        for h in self.setup_on_hooks:
+            GPS.Hook(h).remove(on_hook)
+        for name in self.__placeholders:
+            GPS.Action(name).unregister()
+        self.__placeholders = []
+
     def _setup(self):
         """
         Internal version of setup
         """
+        if getattr(self, '_is_setup', False):
+            return
+        self._is_setup = True
+        self.__remove_lazy_triggers()
 
+        start = time.time()
         self.__connect_hooks()
         if not self.view_title:
             self.view_title = self.__class__.__name__.replace("_", " ")
@@ -338,7 +506,15 @@ class Module(object):
                 " you should override 'setup'\n." % (
                     self.__module__, self.__class__.__name__))
 
+        startup_timeline.record('setup', self.name(), start,
+                                time.time() - start)
+
+    #########################################
+    # Views
+    #########################################
+
     def _teardown(self):
+        self._is_setup = False
         for h in self.auto_connect_hooks:
             self.__disconnect_hook(h)
         self.teardown()
@@ -354,6 +530,7 @@ class Module(object):
 
     def _load_desktop(self, name, data):
         if name == self.name():
+            self._ensure_setup()
             try:
                 c = self.load_desktop(data)
                 if not c:
@@ -380,6 +557,7 @@ class Module(object):
                 child.raise_window()
                 return child
             elif allow_create:
+                self._ensure_setup()
                 view = self.create_view()
                 if view:
                     # The following has no effect if create_view has already
@@ -6,21 +6,125 @@
 import os
 import os.path
 import string
+import time
 
 
-def locate_exec_on_path(prog):
-    """Utility function to locate an executable on path."""
+def _exec_extensions():
+    """The extensions of the executables on this system."""
 
     if os.name == 'nt':
         pathext = os.getenv('PATHEXT')
         if pathext:
-            extensions = string.split(pathext, os.pathsep)
+            return string.split(pathext, os.pathsep)
         else:
-            extensions = [".exe", ".cmd", ".bat"]
+            return [".exe", ".cmd", ".bat"]
     else:
-        extensions = [""]
+        return [""]
+
+
+def _mtime(dir):
+    try:
+        return os.stat(dir).st_mtime
+    except OSError:
+        return None
+
+
+class _Exec_Index(object):
+    """
+    An index of the files in the directories of the PATH, so that
+    looking up an executable does not stat every directory.
+
+    The index is rebuilt when PATH or PATHEXT change, or when one of the
+    directories is modified. The directories are checked at most once
+    every REFRESH_DELAY seconds.
+    """
+
+    REFRESH_DELAY = 1.0
+
+    def __init__(self):
+        self.env = None
+        # The values of PATH and PATHEXT the index was built for
+
+        self.dirs = []
+        # The directories of the PATH, with their modification time
+
+        self.files = {}
+        # For each name without extension, the directories that contain
+        # it, in the order of the PATH
+
+        self.checked = 0
+
+    def _key(self, name):
+        return name.lower() if os.name == 'nt' else name
+
+    def _is_stale(self):
+        if (os.getenv('PATH'), os.getenv('PATHEXT')) != self.env:
+            return True
+        now = time.time()
+        if now - self.checked < self.REFRESH_DELAY:
+            return False
+        self.checked = now
+        for dir, mtime in self.dirs:
+            if _mtime(dir) != mtime:
+                return True
+        return False
+
+    def _build(self):
+        self.env = (os.getenv('PATH'), os.getenv('PATHEXT'))
+        self.checked = time.time()
+        self.dirs = []
+        self.files = {}
+
+        exts = [e.lower() for e in _exec_extensions() if e]
+        for dir in string.split(os.getenv('PATH') or '', os.pathsep):
+            mtime = _mtime(dir)
+            self.dirs.append((dir, mtime))
+            try:
+                names = os.listdir(dir) if mtime is not None else []
+            except OSError:
+                names = []
+            for name in names:
+                base, ext = os.path.splitext(name)
+                if ext.lower() in exts:
+                    name = base
+                dirs = self.files.setdefault(self._key(name), [])
+                if not dirs or dirs[-1] != dir:
+                    dirs.append(dir)
 
-    alldirs = string.split(os.getenv('PATH'), os.pathsep)
+    def lookup(self, progs):
+        """
+        Return the full path of each executable in progs, or "" if it is
+        not on the PATH.
+
+        :param list[str] progs: the names of the executables
+        :rtype: list[str]
+        """
+        if self._is_stale():
+            self._build()
+
+        extensions = _exec_extensions()
+        result = []
+        for prog in progs:
+            found = ""
+            if os.sep in prog or (os.altsep and os.altsep in prog):
+                found = _locate_exec_in_dirs(prog, extensions)
+            else:
+                # The index may be out of date for at most REFRESH_DELAY,
+                # so check that the file still exists
+                for dir in self.files.get(self._key(prog), []):
+                    file = os.path.join(dir, prog)
+                    if any(os.path.isfile(file + ext) for ext in extensions):
+                        found = file
+                        break
+            result.append(found)
+        return result
+
+
+_exec_index = _Exec_Index()
+
+
+def _locate_exec_in_dirs(prog, extensions):
+    alldirs = string.split(os.getenv('PATH') or '', os.pathsep)
     for file in [os.path.join(dir, prog) for dir in alldirs]:
         for ext in extensions:
             if os.path.isfile(file + ext):
@@ -28,6 +132,25 @@ def locate_exec_on_path(prog):
     return ""
 
 
+def locate_exec_on_path(prog):
+    """Utility function to locate an executable on path."""
+
+    return _exec_index.lookup([prog])[0]
+
+
+def locate_execs_on_path(progs):
+    """
+    Locate several executables on path at once.
+
+    :param list[str] progs: the names of the executables
+    :return: a dict giving the path of each executable, or "" for the ones
+       that are not found
+    :rtype: dict[str, str]
+    """
+
+    return dict(zip(progs, _exec_index.lookup(progs)))
+
+
 def display_name(filename):
     if os.name == 'nt' and os.getenv("GNAT_CODE_PAGE") == "CP_ACP":
         return unicode(filename, "ISO-8859-1").encode("UTF-8")
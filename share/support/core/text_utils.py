@@ -198,19 +198,10 @@ def strip_trailing_blanks():
     """Suppress all trailing spaces in the current editor."""
     buf = GPS.EditorBuffer.get()
     r = re.compile("( |\t)+$", re.MULTILINE)
-    # We iterate line by line. This is slow, but the most efficient way
-    # of leaving the cursor where it is - more user-friendly.
-    s = buf.get_chars()
-    current_line = 1
-    for line in s.splitlines():
-        new_line = r.sub('', line)
-        if new_line != line:
-            # We have found a difference: perform a replacement
-            beg = buf.at(current_line, 1)
-            end = beg.end_of_line()
-            buf.delete(beg, end)
-            buf.insert(beg, new_line + "\n")
-        current_line += 1
+    # Only the modified characters are replaced, which leaves the cursor
+    # where it is.
+    buf.replace_region(buf.beginning_of_buffer(), buf.end_of_buffer(),
+                       r.sub('', buf.get_chars()))
 
 
 @interactive("Editor", "Source editor", name="select line")
@@ -482,13 +473,22 @@ def untabify():
 
     buffer, start, end = get_selection_or_buffer()
     tab_width = buffer.get_lang().tab_width
-    while start < end:
-        start = start.search("\t", dialog_on_failure=False)
-        if not start:
-            break
-        size = tab_width - ((start[0].column() - 1) % tab_width)
-        replace(start[0], start[1] - 1, " " * size)
-        start = start[1]
+    text = buffer.get_chars(start, end).decode('utf-8')
+    if '\t' not in text:
+        return
+
+    result = []
+    column = start.column() - 1
+    for c in text:
+        if c == '\t':
+            size = tab_width - (column % tab_width)
+            result.append(' ' * size)
+            column += size
+        else:
+            result.append(c)
+            column = 0 if c == '\n' else column + 1
+
+    buffer.replace_region(start, end, ''.join(result))
 
 
 def lines_with_digit(buffer, loc, max=None):
@@ -1750,9 +1750,8 @@ def toggle_comment(force_comment=False, force_uncomment=False):
         new_text.append(new_line)
 
     # Do the line replacement here, in an atomic undo/redo block.
-    with buf.new_undo_group():
-        buf.delete(start_pos, loc_end.end_of_line())
-        buf.insert(start_pos, "\n".join(new_text) + "\n")
+    buf.replace_region(start_pos, loc_end.end_of_line(),
+                       "\n".join(new_text) + "\n")
 
     # Replace the cursor after the operation.
     v = buf.current_view()
@@ -4,14 +4,22 @@ from modules import Module
 try:
     # While building the doc, we might not have gi.repository
     from gi.repository import Gtk, GLib, Gdk, Pango
-    from pygps import get_gtk_buffer, is_editor_visible
+    from pygps import get_gtk_buffer, is_editor_visible, \
+        get_widgets_by_type
 except ImportError:
     pass
 
+from array import array
+from itertools import repeat
 import re
+import time
+from highlighter.tokenizer import tokenize
 
 
 class HighlighterModule(Module):
+    setup_priority = 100
+    # The editors opened from the desktop are highlighted in setup()
+
     highlighters = {}
 
     # Map of (preference, value) indexed by style id: $(lang)__$(name)
@@ -25,7 +33,7 @@ class HighlighterModule(Module):
                 gtk_ed = get_gtk_buffer(ed)
                 if gtk_ed and not gtk_ed.highlighting_initialized:
                     highlighter.init_highlighting(ed)
-                    highlighter.gtk_highlight(gtk_ed)
+                    highlighter.gtk_highlight(gtk_ed, visible_lines(ed))
 
     def setup(self):
         for ed in GPS.EditorBuffer.list():
@@ -57,9 +65,6 @@ class HighlighterModule(Module):
 # Utilities #
 #############
 
-null_span = (-1, -1)
-
-
 def to_tuple(gtk_iter):
     """
     Transform the gtk_iter passed as parameter into a tuple representation
@@ -101,6 +106,32 @@ def iter_eq(iter_1, iter_2):
     return iter_1.to_tuple() == iter_2.to_tuple()
 
 
+def visible_lines(ed):
+    """
+    Return the range of lines (0-based, inclusive) that are visible in the
+    current view of the editor. If the view is not realized yet, return a
+    range around the cursor instead.
+
+    :type ed: GPS.EditorBuffer
+    :rtype: (int, int)|None
+    """
+    view = ed.current_view()
+    if view is None:
+        return None
+
+    widgets = get_widgets_by_type(Gtk.TextView, view.pywidget())
+    if widgets:
+        text_view = widgets[-1]
+        rect = text_view.get_visible_rect()
+        if rect.height > 1:
+            first = text_view.get_line_at_y(rect.y)[0].get_line()
+            last = text_view.get_line_at_y(rect.y + rect.height)[0].get_line()
+            return first, last
+
+    line = view.cursor().line() - 1
+    return max(0, line - 50), line + 50
+
+
 def tag_to_str(gtk_tag):
     return "<TextTag {0}>".format(gtk_tag.props.name)
 
@@ -212,18 +243,6 @@ class Matcher(BaseMatcher):
         """
         self.name = name
         self.tag = tag
-        self.gtk_tag = None
-
-    def init_tag(self, gtk_ed):
-        self.gtk_tag = gtk_ed.get_tag_table().lookup(self.tag.style_id)
-        if not self.gtk_tag:
-            self.gtk_tag = gtk_ed.create_tag(self.tag.style_id)
-            if self.tag.prio != -1:
-                self.gtk_tag.set_priority(self.tag.prio)
-            self.tag.pref.tag = self.gtk_tag
-            propagate_change(self.tag.pref)
-
-        return self.gtk_tag
 
 
 class SimpleMatcher(Matcher):
@@ -273,11 +292,6 @@ class RegionMatcher(Matcher):
     def pattern(self):
         return self.start_pattern
 
-    def init_tag(self, gtk_ed):
-        Matcher.init_tag(self, gtk_ed)
-        self.subhighlighter.gtk_tag = self.gtk_tag
-        return self.gtk_tag
-
 
 class RegionRef(BaseMatcher):
 
@@ -293,12 +307,66 @@ class RegionRef(BaseMatcher):
 ########################
 
 
+UNKNOWN_STACK = -1
+# The id of the stack of lines that were not highlighted yet
+
+
+class StacksRange(object):
+    """
+    A read-only snapshot of the stacks of a range of lines, as returned by
+    HighlighterStacks.get_range. It behaves as a list of stacks, None
+    standing for unknown stacks, without building that list.
+    """
+
+    def __init__(self, ids, stacks):
+        """
+        :type ids: array.array
+        :type stacks: list[tuple[Struct]]
+        """
+        self.ids = ids
+        self.stacks = stacks
+
+    def __len__(self):
+        return len(self.ids)
+
+    def __getitem__(self, index):
+        stack_id = self.ids[index]
+        return self.stacks[stack_id] if stack_id != UNKNOWN_STACK else None
+
+
 class HighlighterStacks(object):
+    """
+    The stack of highlighters at the beginning of each line of a buffer.
+
+    Each distinct stack is interned once in self.stacks, and lines only
+    store the id of their stack in a compact array, so that inserting or
+    deleting lines is a single move of memory.
+    """
+
+    def __init__(self, nb_lines=1):
+        # The interned stacks, indexed by their id, and the reverse map
+        self.stacks = []
+        self.stack_ids = {}
 
-    def __init__(self):
         # The stack of highlighter at (0, 0) is necessarily the empty stack,
-        # so the stack list comes prepopulated with one empty stack
-        self.stacks_list = [()]
+        # so the lines come prepopulated with one empty stack. Stacks of
+        # the other lines are unknown until they are computed.
+        self.lines = array('i', [self.intern(())])
+        self.lines.extend(repeat(UNKNOWN_STACK, nb_lines - 1))
+
+    def intern(self, stack):
+        """
+        Return the id of stack, registering it if needed.
+
+        :type stack: tuple[Struct]
+        @rtype:      int
+        """
+        stack_id = self.stack_ids.get(stack, None)
+        if stack_id is None:
+            stack_id = len(self.stacks)
+            self.stacks.append(stack)
+            self.stack_ids[stack] = stack_id
+        return stack_id
 
     def set(self, index, stack):
         """
@@ -309,46 +377,97 @@ class HighlighterStacks(object):
         :type stack: tuple[Struct]
         @rtype:      bool
         """
-        assert 0 <= index <= len(self.stacks_list)
+        assert 0 <= index <= len(self.lines)
 
-        tpstack = tuple(stack)
-        if index == len(self.stacks_list):
-            self.stacks_list.append(tpstack)
+        stack_id = self.intern(tuple(stack))
+        if index == len(self.lines):
+            self.lines.append(stack_id)
             return False
         else:
-            current_stack = self.stacks_list[index]
-            self.stacks_list[index] = tpstack
-            return tpstack == current_stack
+            current_id = self.lines[index]
+            self.lines[index] = stack_id
+            return stack_id == current_id
 
     def get(self, start_line):
         """
         :type start_line: int
         @rtype:           tuple[Struct]|None
         """
-        if start_line < len(self.stacks_list):
-            return self.stacks_list[start_line][:]
-        else:
+        if start_line < len(self.lines):
+            stack_id = self.lines[start_line]
+            if stack_id != UNKNOWN_STACK:
+                return self.stacks[stack_id]
+        return None
+
+    def resume_line(self, from_line, nb_lines):
+        """
+        Return the line from which highlighting must resume, after it was
+        found to be synchronized at from_line: this is the last line before
+        the first line after from_line whose stack is unknown. Return None
+        if the stacks of all the lines of the buffer are known.
+
+        :type from_line: int
+        :type nb_lines:  int
+        @rtype:          int|None
+        """
+        try:
+            index = from_line + self.lines[from_line:].index(UNKNOWN_STACK)
+        except ValueError:
+            index = len(self.lines)
+
+        if index >= nb_lines:
             return None
+        return max(from_line, index - 1)
 
     def insert_newlines(self, nb_lines, after_line):
         """
         :type after_line: int
         :type nb_lines:   int
         """
-        for _ in range(nb_lines):
-            self.stacks_list.insert(after_line + 1, ())
+        self.lines[after_line + 1:after_line + 1] = array(
+            'i', repeat(UNKNOWN_STACK, nb_lines))
+
+    def get_range(self, start_line, end_line):
+        """
+        Return the stacks of lines start_line to end_line (excluded), None
+        standing for unknown stacks.
+
+        :type start_line: int
+        :type end_line: int
+        @rtype:           StacksRange
+        """
+        return StacksRange(self.lines[start_line:end_line], self.stacks)
+
+    def set_range(self, start_line, stacks):
+        """
+        Set the stacks of the lines starting at start_line.
+
+        :type start_line: int
+        :type stacks: list[tuple[Struct]]
+        """
+        assert 0 <= start_line <= len(self.lines)
+
+        ids = array('i')
+        last_stack, last_id = None, UNKNOWN_STACK
+        for stack in stacks:
+            # Consecutive lines very often share the same stack object
+            if stack is not last_stack:
+                last_stack, last_id = stack, self.intern(stack)
+            ids.append(last_id)
+
+        self.lines[start_line:start_line + len(ids)] = ids
 
     def delete_lines(self, nb_deleted_lines, at_line):
         """
         :param nb_deleted_lines: int
         :param at_line: int
         """
-        del self.stacks_list[at_line + 1:at_line + nb_deleted_lines + 1]
+        del self.lines[at_line + 1:at_line + nb_deleted_lines + 1]
 
     def __str__(self):
         return "{0}".format(
-            "\n".join(["{0}\t{1}".format(num, [c for c in stack])
-                       for num, stack in enumerate(self.stacks_list)])
+            "\n".join(["{0}\t{1}".format(num, list(self.get(num) or ()))
+                       for num in range(len(self.lines))])
         )
 
 
@@ -367,21 +486,21 @@ class SubHighlighter(object):
             patterns.append(stop_pattern)
             self.matchers.append(None)
 
+        flags = re.M + (re.S if matchall else 0) + (re.I if igncase else 0)
         self.pattern = re.compile(
-            "|".join("({0})".format(pat) for pat in patterns),
-            flags=re.M + (re.S if matchall else 0) +
-            (re.I if igncase else 0)
-        )
-        self.gtk_tag = None
+            "|".join("({0})".format(pat) for pat in patterns), flags=flags)
+
+        # The index in self.matchers of the pattern around which each
+        # group was added. The patterns may contain groups of their own,
+        # which shift the numbers of the groups that follow.
+        self.group_matchers = {}
+        group = 1
+        for index, pat in enumerate(patterns):
+            self.group_matchers[group] = index
+            group += 1 + re.compile(pat, flags).groups
         self.region_start = None
         self.parent_cat = None
 
-    def get_tags_list(self, gtk_ed):
-        """
-        :type gtk_ed: Gtk.TextBuffer
-        """
-        return [m.init_tag(gtk_ed) if m else None for m in self.matchers]
-
     def __str__(self):
         return "<{0}>".format((self.parent_cat.name if self.parent_cat.name
                                else "") if self.parent_cat else "Root")
@@ -392,20 +511,81 @@ class SubHighlighter(object):
 
 class Highlighter(object):
 
-    def __init__(self, spec=(), igncase=False, nb_lines=100):
+    def __init__(self, spec=(), igncase=False, nb_lines=100, slice_ms=10):
         """
         :type spec: Iterable[BaseMatcher]
         :return:
         """
         self.root_highlighter = SubHighlighter(spec, igncase=igncase)
+        # Map of Style indexed by style id, for all the styles used by spec
+        self.styles = {}
+        self.collect_styles(self.root_highlighter, set())
         self.sync_stop = False
+        # Line at which the last highlighting found the buffer synchronized
+        self.sync_line = -1
         # Nb lines we will rehighlight after a modification
         self.nb_lines = nb_lines
+        # Time budget, in milliseconds, of each idle slice used to highlight
+        # the rest of the buffer in the background. If 0, the whole buffer is
+        # highlighted synchronously when opened, and only nb_lines lines are
+        # rehighlighted after a modification.
+        self.slice_ms = slice_ms
+
+    def collect_styles(self, hl, visited):
+        """
+        Register the styles used by hl and its sub highlighters in
+        self.styles.
+
+        :type hl: SubHighlighter
+        :type visited: set[SubHighlighter]
+        """
+        visited.add(hl)
+        for m in hl.matchers:
+            if m and m.tag:
+                self.styles[m.tag.style_id] = m.tag
+            region_hl = getattr(m, "subhighlighter", None)
+            if region_hl and region_hl not in visited:
+                self.collect_styles(region_hl, visited)
+
+    def tokenize(self, text, stack=None, previous_stacks=None):
+        """
+        Tokenize text with this highlighter. This doesn't access any editor,
+        and can be called outside of the main loop.
+
+        :param unicode text: The text to tokenize.
+        :param stack: The stack of sub highlighters at the start of text,
+           defaults to the top level one.
+        :type stack: list[SubHighlighter]|None
+        :type previous_stacks: list[tuple[SubHighlighter]|None]|None
+        :rtype: highlighter.tokenizer.Tokens
+        """
+        return tokenize(text, stack or [self.root_highlighter],
+                        previous_stacks)
+
+    def get_gtk_tag(self, gtk_ed, style_id):
+        """
+        Return the tag to use for style_id in gtk_ed, creating it if needed.
+
+        :type gtk_ed: Gtk.TextBuffer
+        :type style_id: str
+        :rtype: Gtk.TextTag
+        """
+        gtk_tag = gtk_ed.get_tag_table().lookup(style_id)
+        if not gtk_tag:
+            style = self.styles[style_id]
+            gtk_tag = gtk_ed.create_tag(style_id)
+            if style.prio != -1:
+                gtk_tag.set_priority(style.prio)
+            style.pref.tag = gtk_tag
+            propagate_change(style.pref)
+
+        return gtk_tag
 
     def highlight_info_gen(self, gtk_ed, start_line, end_line=0):
         """
-        Returns a generator that will highlight the buffer, one token at a
-        time, every time the generator is consumed.
+        Tokenize the buffer from start_line to end_line, and return the list
+        of tags to apply, as (tag, start offset, end offset) tuples. The
+        last tuple indicates where the highlighting stopped.
 
         :type gtk_ed: Gtk.TextBuffer
         :type start_line: int
@@ -428,121 +608,68 @@ class Highlighter(object):
             # Nothing to do, return empty array
             return []
 
-        current_line = start_line
-
         if start_line == 0:
             subhl_stack = [self.root_highlighter]
-            gtk_ed.stacks.set(0, subhl_stack)
         else:
             try:
                 subhl_stack = list(gtk_ed.stacks.get(start_line))
             except TypeError:
                 subhl_stack = [self.root_highlighter]
 
-        match_offset = 0
-        last_start_offset = 0
-        results = []
-        hl_tags = {}
-        rstarts = []
+        tokens = tokenize(
+            strn, subhl_stack,
+            gtk_ed.stacks.get_range(start_line, end.get_line() + 1))
+        gtk_ed.stacks.set_range(start_line, tokens.line_stacks)
+
+        if tokens.sync_line != -1:
+            self.sync_stop = True
+            self.sync_line = start_line + tokens.sync_line
+
         start_offset = start.get_offset()
-        end_offset = end.get_offset()
-
-        while subhl_stack:
-            hl = subhl_stack[-1]
-            matches = hl.pattern.finditer(strn, match_offset)
-
-            # Cache tags
-            tags = hl_tags.get(hl, None)
-            if not tags:
-                tags = hl.get_tags_list(gtk_ed)
-                hl_tags[hl] = tags
-
-            pop_stack = True
-            met_stop_pattern = False
-
-            for m in matches:
-
-                # Get the index of the first matching category
-                i = [j for j in range(1, len(hl.matchers) + 1)
-                     if m.span(j) != null_span][0]
-
-                matcher, tag = hl.matchers[i - 1], tags[i - 1]
-                start_line += strn.count("\n",
-                                         last_start_offset, m.start(i))
-                last_start_offset = m.start(i)
-                tk_start_offset = start_offset + m.start(i)
-                tk_end_offset = start_offset + m.end(i)
-
-                if start_line > current_line:
-                    for l in range(current_line + 1, start_line):
-                        gtk_ed.stacks.set(l, subhl_stack)
-                    current_line = start_line
-
-                    # We exit because the stack we're setting is == to the
-                    # existing one, so the buffer is synced
-                    if gtk_ed.stacks.set(current_line, subhl_stack):
-                        endi = gtk_ed.get_iter_at_line(current_line)
-                        endi.backward_char()
-                        endo = endi.get_offset()
-                        rstart = rstarts.pop() if rstarts else start_offset
-                        results.append((subhl_stack[-1].gtk_tag, rstart,
-                                        endo))
-                        self.sync_stop = True
-                        return results
-
-                # Stop pattern, this is the end of the region, we want to
-                # return to the parent highlighter after having yielded the
-                # location of the region stop-pattern.
-                if not matcher:
-                    assert isinstance(hl.gtk_tag, Gtk.TextTag)
-                    # If the region has no region start, we are
-                    # rehighlighting a region that was previously created,
-                    # and has no stored region start.
-                    rstart = rstarts.pop() if rstarts else start_offset
-                    results.append((hl.gtk_tag, rstart, tk_end_offset))
-                    match_offset = m.end(i)
-                    met_stop_pattern = True
-                    break
-
-                if isinstance(matcher, RegionMatcher):
-                    subhl_stack.append(matcher.subhighlighter)
-                    rstarts.append(tk_start_offset)
-
-                    match_offset = m.end(i)
-                    pop_stack = False
-                    break
+        results = [(self.get_gtk_tag(gtk_ed, style_id),
+                    start_offset + tk_start,
+                    start_offset + tk_end)
+                   for style_id, tk_start, tk_end in tokens.spans]
+        results.append((None,
+                        start_offset + tokens.end,
+                        start_offset + tokens.end))
+        return results
 
-                if tag:
-                    results.append((tag, tk_start_offset, tk_end_offset))
-                else:
-                    assert False
-
-            # If a region highlighter is stacked, we haven't met it's stop
-            # pattern, but yet exhausted the matcher, and we didn't just put
-            # it on the stack, then it means this is an unfinished region,
-            # so we can highlight to the end of the buffer with this region's
-            # tag
-            if len(subhl_stack) > 1 and not met_stop_pattern and pop_stack:
-                rstart = rstarts.pop() if rstarts else start_offset
-                results.append((hl.gtk_tag, rstart, end_offset))
-                # We break out of the while loop to keep the stack intact
-                break
+    def apply_actions(self, gtk_ed, start_line, actions_list):
+        """
+        Remove the highlighting from start_line to the end of the last
+        action, and apply the tags in actions_list.
 
-            if len(subhl_stack) == 1:
-                break
+        :type gtk_ed: Gtk.TextBuffer
+        :type start_line: int
+        :type actions_list: list[(Gtk.TextTag, int, int)]
+        """
+        if actions_list:
+            start_it = gtk_ed.get_iter_at_line(start_line)
+            end_it = gtk_ed.get_start_iter()
+            end_it.set_offset(actions_list[-1][2])
+            gtk_ed.remove_all_tags(start_it, end_it)
 
-            if pop_stack:
-                subhl_stack.pop()
+            for tag, start, end in actions_list:
+                if tag:
+                    start_it.set_offset(start)
+                    end_it.set_offset(end)
+                    gtk_ed.apply_tag(tag, start_it, end_it)
 
-        # If we are here, it means this highlighter went on through the end
-        # of the buffer (didn't meet a stop pattern, or is the top level hl).
-        #  In this case, we want to set the stack correctly for the remaining
-        #  lines
-        for l in range(current_line + 1, end.get_line() + 1):
-            gtk_ed.stacks.set(l, subhl_stack)
+    def highlight_lines(self, gtk_ed, start_line, end_line):
+        """
+        Rehighlight the lines from start_line to end_line (excluded), or to
+        the end of the buffer if end_line is 0. The highlighting stops
+        earlier if the buffer is found to be synchronized, in which case
+        self.sync_stop is set.
 
-        results.append((None, end_offset, end_offset))
-        return results
+        :type gtk_ed: Gtk.TextBuffer
+        :type start_line: int
+        :type end_line: int
+        """
+        self.apply_actions(
+            gtk_ed, start_line,
+            self.highlight_info_gen(gtk_ed, start_line, end_line))
 
     def highlight_gen(self, gtk_ed, start_line, nb_lines):
         """
@@ -560,48 +687,144 @@ class Highlighter(object):
                     end_it.set_offset(end)
                     gtk_ed.apply_tag(tag, start_it, end_it)
         else:
-            st_iter = gtk_ed.get_iter_at_line(start_line)
-            actions_list = self.highlight_info_gen(gtk_ed, start_line,
-                                                   start_line +
-                                                   max(nb_lines, self.nb_lines)
-                                                   )
+            self.highlight_lines(
+                gtk_ed, start_line,
+                start_line + max(nb_lines, self.nb_lines))
 
-            # if not self.sync_stop:
-            #     actions_list = self.highlight_info_gen(gtk_ed, start_line)
+        # print time() - t
 
-            if actions_list:
-                end_it.set_offset(actions_list[-1][2])
-                gtk_ed.remove_all_tags(st_iter, end_it)
+    def schedule_highlight(self, gtk_ed, from_line):
+        """
+        Highlight the buffer from from_line in the background, in idle
+        slices of at most self.slice_ms milliseconds. The highlighting goes
+        on until the end of the buffer, skipping the ranges where the
+        saved stacks are found to be synchronized.
 
-                for tag, start, end in actions_list:
-                    start_it.set_offset(start)
-                    end_it.set_offset(end)
-                    if tag:
-                        gtk_ed.apply_tag(tag, start_it, end_it)
+        :type gtk_ed: Gtk.TextBuffer
+        :type from_line: int
+        """
+        if gtk_ed.highlight_from is None or from_line < gtk_ed.highlight_from:
+            gtk_ed.highlight_from = from_line
 
-        # print time() - t
+        if not gtk_ed.idle_highlight_id:
+            gtk_ed.idle_highlight_id = GLib.idle_add(
+                self.idle_highlight, gtk_ed, priority=GLib.PRIORITY_LOW)
+
+    def idle_highlight(self, gtk_ed):
+        """
+        Highlight one slice of the buffer, starting at gtk_ed.highlight_from.
+        Return whether there remains work to do.
+
+        :type gtk_ed: Gtk.TextBuffer
+        :rtype: bool
+        """
+        deadline = time.time() + self.slice_ms / 1000.0
+        line_count = gtk_ed.get_line_count()
+        line = gtk_ed.highlight_from
+
+        while line is not None:
+            end_line = line + self.nb_lines
+            self.highlight_lines(
+                gtk_ed, line, end_line if end_line < line_count else 0)
+
+            if self.sync_stop:
+                line = gtk_ed.stacks.resume_line(self.sync_line, line_count)
+            elif end_line < line_count:
+                line = end_line
+            else:
+                line = None
+
+            if time.time() >= deadline:
+                break
+
+        gtk_ed.highlight_from = line
+        if line is None:
+            gtk_ed.idle_highlight_id = None
+            return False
+        return True
+
+    def gtk_highlight(self, gtk_ed, visible=None):
+        """
+        Highlight the whole buffer. If background highlighting is enabled,
+        only the visible range of lines is highlighted immediately.
 
-    def gtk_highlight(self, gtk_ed):
-        self.highlight_gen(gtk_ed, -1, -1)
+        :type gtk_ed: Gtk.TextBuffer
+        :param (int, int)|None visible: The range of visible lines
+        """
+        if not self.slice_ms:
+            self.highlight_gen(gtk_ed, -1, -1)
+            return
+
+        if visible:
+            # The stack at the start of the visible range is not known yet:
+            # assume the top level one, the background highlighting will
+            # fix it when it reaches these lines, if needed.
+            first, last = visible
+            self.highlight_lines(gtk_ed, first, last + 1)
+
+        self.schedule_highlight(gtk_ed, 0)
 
     def gtk_highlight_region(self, gtk_ed, start_line, nb_lines):
         self.highlight_gen(gtk_ed, start_line, nb_lines)
 
+        if self.slice_ms and not self.sync_stop:
+            end_line = start_line + max(nb_lines, self.nb_lines)
+            if end_line < gtk_ed.get_line_count():
+                self.schedule_highlight(gtk_ed, end_line)
+
     def init_highlighting(self, ed):
         gtk_ed = get_gtk_buffer(ed)
         gtk_ed.highlighting_initialized = True
-        gtk_ed.stacks = HighlighterStacks()
+        gtk_ed.stacks = HighlighterStacks(gtk_ed.get_line_count())
 
         if not hasattr(gtk_ed, "idle_highlight_id"):
             gtk_ed.idle_highlight_id = None
+        # First line to highlight in the background, if any
+        gtk_ed.highlight_from = None
+
+        # The range of lines modified since the last highlighting, as a
+        # list [first, end], or None
+        gtk_ed.modified_lines = None
+
+        def highlight_modified_lines():
+            first, end = gtk_ed.modified_lines
+            gtk_ed.modified_lines = None
+            first = min(first, gtk_ed.get_line_count() - 1)
+            # Highlight the modified lines, the rest of the buffer is
+            # highlighted in the background until the stacks are synced
+            self.gtk_highlight_region(gtk_ed, first, end - first)
+            return False
 
         def action_handler(loc, nb_lines):
             """:type loc: Gtk.TextIter"""
-            if gtk_ed.idle_highlight_id:
-                GLib.source_remove(gtk_ed.idle_highlight_id)
-
-            # Highlight all the rest of the buffer
-            self.gtk_highlight_region(gtk_ed, loc.get_line(), nb_lines)
+            # Commands that modify many lines at once do so through
+            # several edits in a row: the modified lines are highlighted
+            # once they are all done, before the editor is redrawn.
+            first = loc.get_line()
+            modified = gtk_ed.modified_lines
+            if modified is None:
+                gtk_ed.modified_lines = [first, first + nb_lines]
+                GLib.idle_add(highlight_modified_lines,
+                              priority=GLib.PRIORITY_HIGH_IDLE)
+            else:
+                modified[0] = min(modified[0], first)
+                modified[1] = max(modified[1], first + nb_lines)
+
+        def shift_highlight_from(line, delta):
+            """
+            Keep the pending background highlighting at the same place in
+            the text when lines are inserted or deleted after line.
+            """
+            if gtk_ed.highlight_from is not None and \
+                    gtk_ed.highlight_from > line:
+                gtk_ed.highlight_from = max(
+                    line, gtk_ed.highlight_from + delta)
+
+            modified = gtk_ed.modified_lines
+            if modified is not None:
+                for idx in (0, 1):
+                    if modified[idx] > line:
+                        modified[idx] = max(line, modified[idx] + delta)
 
         # noinspection PyUnusedLocal
         def highlighting_insert_text_before(buf, loc, text, length):
@@ -609,20 +832,20 @@ class Highlighter(object):
 
         # noinspection PyUnusedLocal
         def highlighting_insert_text(buf, loc, text, length):
-            nb_new_lines = len(text.split("\n")) - 1
+            nb_new_lines = text.count("\n")
             itr = buf.iter_from_tuple(buf.insert_loc)
             buf.stacks.insert_newlines(nb_new_lines, itr.get_line())
+            shift_highlight_from(itr.get_line(), nb_new_lines)
             action_handler(itr, nb_new_lines + 1)
 
         def highlighting_delete_range_before(buf, loc, end):
-            buf.nb_deleted_lines = len(
-                buf.get_text(loc, end, True).split("\n")
-            ) - 1
+            buf.nb_deleted_lines = end.get_line() - loc.get_line()
 
         # noinspection PyUnusedLocal
         def highlighting_delete_range(buf, loc, end):
             buf.stacks.delete_lines(buf.nb_deleted_lines, loc.get_line())
-            # Recompute the highlighting of the 100 next lines
+            shift_highlight_from(loc.get_line(), -buf.nb_deleted_lines)
+            # Recompute the highlighting of the next lines
             action_handler(loc, self.nb_lines)
 
         gtk_ed.connect_after("insert-text", highlighting_insert_text)
@@ -0,0 +1,196 @@
+"""
+The tokenizer of the highlighting engine.
+
+This module only depends on the standard library: it works on a text and
+on a stack of sub highlighters, and returns the spans of text to highlight
+together with the stack of highlighters at the beginning of each line. It
+doesn't access the editor, so it can be used outside of the GPS main loop,
+for instance in a worker thread or in a benchmark. Applying the result to
+an editor is the job of :py:mod:`highlighter.engine`.
+"""
+
+
+class Tokens(object):
+
+    def __init__(self):
+        self.spans = []
+        """
+        The spans of text to highlight, as (style_id, start, end) tuples,
+        where start and end are offsets in the tokenized text.
+
+        :type: list[(str, int, int)]
+        """
+
+        self.line_stacks = []
+        """
+        The stack of sub highlighters at the beginning of each line of the
+        tokenized text, the first one being the initial stack.
+
+        :type: list[tuple[SubHighlighter]]
+        """
+
+        self.end = 0
+        """
+        The offset at which the tokenization stopped: the end of the text,
+        or the end of the line before sync_line.
+        """
+
+        self.sync_line = -1
+        """
+        The line, relative to the start of the text, at which the computed
+        stack was found to be the same as the previous one, or -1.
+        """
+
+    def __repr__(self):
+        return "<Tokens {0} spans, {1} lines>".format(
+            len(self.spans), len(self.line_stacks))
+
+
+def style_ids(hl):
+    """
+    Return the list of style ids of the matchers of hl, None standing for
+    its stop pattern.
+
+    :type hl: SubHighlighter
+    :rtype: list[str|None]
+    """
+    return [m.tag.style_id if m and m.tag else None for m in hl.matchers]
+
+
+def region_style_id(hl):
+    """
+    Return the style id to apply to the whole region handled by hl, if any.
+
+    :type hl: SubHighlighter
+    :rtype: str|None
+    """
+    region = hl.parent_cat
+    return region.tag.style_id if region and region.tag else None
+
+
+def tokenize(text, stack, previous_stacks=None):
+    """
+    Tokenize text, starting with the given stack of sub highlighters.
+
+    :param unicode text: The text to tokenize. It should start at the
+       beginning of a line.
+    :param list[SubHighlighter] stack: The stack of sub highlighters at
+       the beginning of text.
+    :param previous_stacks: The stacks previously computed for the lines
+       of text, or None for lines whose stack is unknown. When the stack at
+       the beginning of a line is the same as the previous one, the rest of
+       the text doesn't need to be tokenized again, and the tokenization
+       stops there.
+    :type previous_stacks: list[tuple[SubHighlighter]|None]|None
+    :rtype: Tokens
+    """
+    tokens = Tokens()
+    spans = tokens.spans
+    line_stacks = tokens.line_stacks
+
+    subhl_stack = list(stack)
+    line_stacks.append(tuple(subhl_stack))
+    nb_previous = len(previous_stacks) if previous_stacks else 0
+
+    line = 0
+    current_line = 0
+    match_offset = 0
+    last_start_offset = 0
+    ids_cache = {}
+    rstarts = []
+
+    while subhl_stack:
+        hl = subhl_stack[-1]
+
+        ids = ids_cache.get(hl, None)
+        if ids is None:
+            ids = style_ids(hl)
+            ids_cache[hl] = ids
+
+        pop_stack = True
+        met_stop_pattern = False
+
+        for m in hl.pattern.finditer(text, match_offset):
+
+            # The group added around the matching pattern closes last, so
+            # it is the last group matched, even if the pattern contains
+            # groups of its own.
+            group = m.lastindex
+            i = hl.group_matchers[group]
+            matcher = hl.matchers[i]
+            tk_start = m.start(group)
+            tk_end = m.end(group)
+
+            line += text.count("\n", last_start_offset, tk_start)
+            last_start_offset = tk_start
+
+            if line > current_line:
+                current_stack = tuple(subhl_stack)
+                line_stacks.extend(
+                    [current_stack] * (line - current_line))
+                current_line = line
+
+                # We exit because the stack we're computing is == to the
+                # previous one, so the rest of the text is synced
+                if line < nb_previous and \
+                        previous_stacks[line] == current_stack:
+                    tokens.end = text.rfind("\n", 0, tk_start)
+                    style_id = region_style_id(hl)
+                    if style_id:
+                        rstart = rstarts.pop() if rstarts else 0
+                        spans.append((style_id, rstart, tokens.end))
+                    tokens.sync_line = line
+                    return tokens
+
+            # Stop pattern, this is the end of the region, we want to
+            # return to the parent highlighter after having yielded the
+            # location of the region stop-pattern.
+            if not matcher:
+                # If the region has no region start, we are
+                # rehighlighting a region that was previously created,
+                # and has no stored region start.
+                rstart = rstarts.pop() if rstarts else 0
+                style_id = region_style_id(hl)
+                if style_id:
+                    spans.append((style_id, rstart, tk_end))
+                match_offset = tk_end
+                met_stop_pattern = True
+                break
+
+            region_hl = getattr(matcher, "subhighlighter", None)
+            if region_hl:
+                subhl_stack.append(region_hl)
+                rstarts.append(tk_start)
+                match_offset = tk_end
+                pop_stack = False
+                break
+
+            spans.append((ids[i], tk_start, tk_end))
+
+        # If a region highlighter is stacked, we haven't met its stop
+        # pattern, but yet exhausted the matcher, and we didn't just put
+        # it on the stack, then it means this is an unfinished region,
+        # so we can highlight to the end of the text with this region's
+        # style
+        if len(subhl_stack) > 1 and not met_stop_pattern and pop_stack:
+            rstart = rstarts.pop() if rstarts else 0
+            style_id = region_style_id(hl)
+            if style_id:
+                spans.append((style_id, rstart, len(text)))
+            # We break out of the while loop to keep the stack intact
+            break
+
+        if len(subhl_stack) == 1:
+            break
+
+        if pop_stack:
+            subhl_stack.pop()
+
+    # If we are here, it means this highlighter went on through the end
+    # of the text (didn't meet a stop pattern, or is the top level hl).
+    # In this case, we want to set the stack correctly for the remaining
+    # lines
+    nb_lines = text.count("\n", last_start_offset) + line
+    line_stacks.extend([tuple(subhl_stack)] * (nb_lines - current_line))
+    tokens.end = len(text)
+    return tokens
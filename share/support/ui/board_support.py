@@ -53,10 +53,24 @@ import GPS
 from modules import Module
 from target_connector import TargetConnector
 from gs_utils.internal.dialogs import Project_Properties_Editor
+from gs_utils import tool_probes
 import workflows
 import workflows.promises as promises
 
 
+def _st_util_help_cmd():
+    """
+    The command used to know whether st-util supports semihosting, when
+    the project uses it.
+    """
+    tool = GPS.Project.root().get_attribute_as_string(
+        package="IDE", attribute="Connection_Tool").lower()
+    return ["st-util", "--help"] if tool == "st-util" else None
+
+
+tool_probes.register(_st_util_help_cmd)
+
+
 class BoardLoader(Module):
 
     # The list of debug build targets created by this plugin
@@ -325,12 +339,9 @@ class BoardLoader(Module):
             args = ["-p", gdb_port]
 
             # Add semihosting support if it's supported by the used st-util
-            try:
-                process = GPS.Process(["st-util", '--help'])
-                output = process.get_result()
-                has_semihosting = semihosting_switch in output
-            except Exception:
-                has_semihosting = False
+            output = tool_probes.output(["st-util", '--help'])
+            has_semihosting = (output is not None and
+                               semihosting_switch in output)
 
             if has_semihosting:
                 args += [semihosting_switch]
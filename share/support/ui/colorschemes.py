@@ -76,15 +76,15 @@ iplastic = Theme("iPlastic", True, {
 })
 
 themes = []
+basic_themes = []
 
 
-def get_themes():
-    """ Load and return the list of themes.
-        Each theme is a dictionary of values.
+def get_basic_themes():
+    """ Return the themes defined in this file.
     """
-    global themes
+    global basic_themes
 
-    if not themes:
+    if not basic_themes:
 
         # Recompute the gutter's foreground color directly from
         # the editors colors for the basic themes.
@@ -97,7 +97,17 @@ def get_themes():
             bg_color = theme.d['editor_bg']
             theme.d['gutter_fg'] = fg_color.mix(bg_color, 0.6)
 
-        themes = basic_themes + textmate.textmate_themes()
+    return basic_themes
+
+
+def get_themes():
+    """ Load and return the list of themes.
+        Each theme is a dictionary of values.
+    """
+    global themes
+
+    if not themes:
+        themes = get_basic_themes() + textmate.textmate_themes()
 
     return themes
 
@@ -105,14 +115,15 @@ def get_themes():
 def get_current_theme():
     """
     Return the current theme from the preferences.
+    Only this theme is loaded if it is a TextMate theme.
     """
     pref_theme_name = color_theme_pref.get()
 
-    for theme in get_themes():
+    for theme in get_basic_themes():
         if theme.name == pref_theme_name:
             return theme
 
-    return None
+    return textmate.find_theme(pref_theme_name)
 
 
 def validate_color(s):
@@ -440,3 +451,6 @@ GPS.PreferencesPage.create(
 def on_started():
     picker.no_theme_fallback()
     GPS.Hook("preferences_changed").add_debounce(picker.on_pref_changed)
+
+    # Convert the other themes before the preferences page needs them
+    textmate.load_themes_in_background()
@@ -86,6 +86,7 @@ from extensions.private.xml import X
 from modules import Module
 import os_utils
 import re
+from gs_utils import tool_probes
 import tempfile
 import workflows.promises as promises
 import workflows
@@ -107,6 +108,10 @@ gnatcov_install_dir = (
     None
 )
 
+# Needed by GNATcovPlugin.is_instrumentation_supported
+tool_probes.register(["gnatcov", "--version"])
+tool_probes.register(["gprbuild", "--version"])
+
 
 class GNATcovPlugin(Module):
 
@@ -560,8 +565,8 @@ class GNATcovPlugin(Module):
         for exe in 'gnatcov', 'gprbuild':
 
             try:
-                version_out = GPS.Process(
-                    exe + " --version").get_result().splitlines()[0]
+                version_out = tool_probes.output(
+                    [exe, "--version"]).splitlines()[0]
 
                 matches = TOOL_VERSION_REGEXP.findall(version_out)
                 version_major, version_minor = matches[0]
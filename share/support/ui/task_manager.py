@@ -359,6 +359,8 @@ class Tasks_View(Module):
     """ A GPS module, providing a view that wraps around a task manager """
 
     view_title = "Tasks"
+    setup_priority = 10
+    # The HUD is part of the toolbar
 
     def __init__(self):
         self.widget = None  # The tasks view, if any
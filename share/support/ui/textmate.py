@@ -1,8 +1,13 @@
 """ This is a utility package for importing TextMate .tmTheme definition
     files.
+
+    The themes are converted on demand, and the result of the conversion is
+    cached in GNATSTUDIO_HOME/.gnatstudio/textmate_themes.json, so that the
+    .tmTheme files are only parsed again when they are modified.
 """
 
 import glob
+import json
 import os
 import plistlib
 import sys
@@ -11,6 +16,18 @@ import traceback
 import GPS
 from theme_handling import Theme, Color, transparent
 
+try:
+    # While building the doc, we might not have access to this module
+    from gi.repository import GLib
+except ImportError:
+    pass
+
+CACHE_VERSION = 2
+# Change this when the conversion of the themes changes. The cache is also
+# discarded when the version of GPS changes.
+
+logger = GPS.Logger("GPS.TEXTMATE_THEMES")
+
 text_variant_prefs = {
     "comment":                "comments",
     "constant.numeric":       "numbers",
@@ -97,7 +114,15 @@ class TextmateTheme(object):
         self.general = self.o['settings'][0]['settings']
 
     def theme(self):
-        """ Return a dictionary of preferences
+        """ Return the Theme for this file
+        """
+        is_light, d = self.settings()
+        return Theme(self.name, is_light, d)
+
+    def settings(self):
+        """ Return a tuple (is_light, d), d being the dictionary of
+            preferences read from the file, before they are merged with
+            the defaults of the Theme.
         """
         d = {}  # The result dict
 
@@ -200,16 +225,95 @@ class TextmateTheme(object):
             "DEFAULT", transparent,
             e_smart_color)
 
-        return Theme(self.name, is_light, d)
+        return is_light, d
 
 
-def textmate_themes():
-    """ Find all themes installed in the color_themes directory
-        and return them as a list of dictionary objects.
+_cache = None
+# The converted themes, indexed by file name, as saved on disk
+
+_cache_modified = False
+# Whether _cache needs to be saved
+
+_themes = {}
+# The Theme objects already created, indexed by file name
+
+
+def _cache_file():
+    return os.path.join(GPS.get_home_dir(), 'textmate_themes.json')
+
+
+def _load_cache():
+    global _cache
+    if _cache is None:
+        _cache = {}
+        try:
+            with open(_cache_file()) as f:
+                data = json.load(f)
+            if (data.get('version') == CACHE_VERSION and
+                    data.get('gps_version') == GPS.version()):
+                _cache = data['themes']
+        except (IOError, OSError, ValueError, KeyError):
+            pass
+    return _cache
+
+
+def _save_cache():
+    global _cache_modified
+    if not _cache_modified:
+        return
+    _cache_modified = False
+
+    # Write a temporary file first, so that a GPS killed while saving does
+    # not leave a truncated cache behind.
+    filename = _cache_file()
+    try:
+        tmp = filename + '.tmp'
+        with open(tmp, 'w') as f:
+            json.dump({'version': CACHE_VERSION,
+                       'gps_version': GPS.version(),
+                       'themes': _cache}, f)
+        if os.path.exists(filename):
+            os.remove(filename)
+        os.rename(tmp, filename)
+    except (IOError, OSError) as e:
+        logger.log("could not save %s: %s" % (filename, e))
+
+
+def _encode(value):
+    """ Convert a value of a Theme dictionary to JSON.
     """
+    if isinstance(value, Color):
+        return {'rgba': [value.r, value.g, value.b, value.a]}
+    elif isinstance(value, tuple):
+        return [_encode(v) for v in value]
+    else:
+        return value
 
-    results = []
 
+def _decode(value):
+    """ The reverse of _encode.
+    """
+    if isinstance(value, dict):
+        c = Color(from_rgba=(0, 0, 0))
+        c.r, c.g, c.b, c.a = value['rgba']
+        return c
+    elif isinstance(value, list):
+        return tuple(_decode(v) for v in value)
+    elif isinstance(value, unicode):
+        return value.encode('utf-8')
+    else:
+        return value
+
+
+def _stamp(filename):
+    st = os.stat(filename)
+    return [st.st_mtime, st.st_size]
+
+
+def theme_files():
+    """ Return the .tmTheme files installed in the color_themes directory
+        and in the user's themes directory.
+    """
     default_themes = glob.glob(os.path.join(
         GPS.get_system_dir(),
         'share', 'gnatstudio', 'color_themes', 'themes', '*', '*.tmTheme'))
@@ -217,15 +321,104 @@ def textmate_themes():
     user_themes = glob.glob(os.path.join(
         GPS.get_home_dir(), 'themes', '*.tmTheme'))
 
-    for file in default_themes + user_themes:
-        try:
-            results.append(TextmateTheme(file).theme())
-        except Exception:
-            msg, _, tb = sys.exc_info()
-            tb = "\n".join(traceback.format_list(traceback.extract_tb(tb)))
+    return default_themes + user_themes
 
-            GPS.Console("Messages").write(
-                "Exception when parsing theme file '%s':\n%s\n%s\n"
-                % (file, msg, str(tb)))
 
-    return results
+def _cached_name(filename):
+    """ Return the name of the theme in filename if it is in the cache and
+        up to date, None otherwise.
+    """
+    entry = _load_cache().get(filename)
+    try:
+        if entry is not None and entry['stamp'] == _stamp(filename):
+            return entry['name']
+    except OSError:
+        pass
+    return None
+
+
+def load_theme(filename):
+    """ Return the Theme for filename, or None if it could not be loaded.
+        The file is only parsed if it is not in the cache or was modified.
+    """
+    global _cache_modified
+
+    if filename in _themes:
+        return _themes[filename]
+
+    theme = None
+    try:
+        stamp = _stamp(filename)
+        entry = _load_cache().get(filename)
+        if entry is not None and entry['stamp'] == stamp:
+            theme = Theme(_decode(entry['name']), entry['light'],
+                          dict((k.encode('utf-8'), _decode(v))
+                               for k, v in entry['extra'].iteritems()))
+        else:
+            logger.log("parsing %s" % filename)
+            tm = TextmateTheme(filename)
+            is_light, extra = tm.settings()
+            theme = Theme(tm.name, is_light, extra)
+
+            # Only the settings read from the file are cached: the defaults
+            # of the Theme come from this version of GPS
+            _load_cache()[filename] = {
+                'stamp': stamp,
+                'name': tm.name,
+                'light': is_light,
+                'extra': dict((k, _encode(v)) for k, v in extra.iteritems())}
+            _cache_modified = True
+
+    except Exception:
+        msg, _, tb = sys.exc_info()
+        tb = "\n".join(traceback.format_list(traceback.extract_tb(tb)))
+
+        GPS.Console("Messages").write(
+            "Exception when parsing theme file '%s':\n%s\n%s\n"
+            % (filename, msg, str(tb)))
+
+    _themes[filename] = theme
+    return theme
+
+
+def find_theme(name):
+    """ Return the theme called name, or None. Only the themes that are not
+        in the cache are parsed, until this one is found.
+    """
+    for filename in theme_files():
+        cached = _cached_name(filename)
+        if cached is None or cached == name:
+            theme = load_theme(filename)
+            if theme and theme.name == name:
+                _save_cache()
+                return theme
+
+    _save_cache()
+    return None
+
+
+def textmate_themes():
+    """ Find all themes installed in the color_themes directory
+        and return them as a list of Theme objects.
+    """
+
+    results = [load_theme(f) for f in theme_files()]
+    _save_cache()
+    return [t for t in results if t]
+
+
+def load_themes_in_background():
+    """ Convert the themes that are not in the cache yet in idle callbacks,
+        one at a time, so that the preferences page opens quickly.
+    """
+
+    files = [f for f in theme_files() if f not in _themes]
+
+    def load_next():
+        if files:
+            load_theme(files.pop(0))
+            return True
+        _save_cache()
+        return False
+
+    GLib.idle_add(load_next, priority=GLib.PRIORITY_LOW)
@@ -2,9 +2,12 @@ import GPS
 import gs_utils
 import os
 import os_utils
+import re
+import weakref
+import workflows
 from . import core
 from . import core_staging
-from workflows.promises import ProcessWrapper
+from workflows.promises import ProcessWrapper, Promise
 from enum import Enum
 
 LOG_ID = "CLEARCASE"
@@ -16,6 +19,8 @@ ID_HEADER = "Event "
 # The actions must only be registered once
 ALREADY_LOADED = False
 VOBS = None
+# The engines that monitor the saved files
+ENGINES = weakref.WeakSet()
 
 CC_PATH = "Clearcase/"
 UNCHECKOUT_PREF = "Uncheckout behavior"
@@ -61,6 +66,96 @@ class Activity(Enum):
     LOCKED = 2
 
 
+def _quote(arg):
+    """
+    Quote an argument for the interactive mode of cleartool.
+
+    :return: the quoted argument, or None if it cannot be quoted
+    """
+    if '\n' in arg:
+        return None
+    elif arg and not any(c in arg for c in ' \t"\''):
+        return arg
+    elif '"' not in arg:
+        return '"%s"' % arg
+    elif "'" not in arg:
+        return "'%s'" % arg
+    return None
+
+
+class _Session(object):
+    """
+    A persistent "cleartool -status" process, to which commands are sent
+    one after the other. This avoids paying for the startup of cleartool
+    for each command.
+    """
+
+    __prompt = 'cleartool> '
+    __re_status = re.compile(
+        r'.*?^(?:%s)*Command \d+ returned status (\d+)[ \t\r]*\n' %
+        __prompt, re.M | re.S)
+
+    def __init__(self, directory):
+        """
+        :param str directory: the directory in which to run cleartool.
+           Relative paths given to `run` are relative to it.
+        """
+        self.directory = directory
+        self.__process = None
+        self.__last = None   # the promise for the last queued command
+
+    def run(self, args):
+        """
+        Run cleartool with the given arguments, once the previous commands
+        have completed.
+
+        :param List(str) args: the arguments
+        :returntype: a promise resolved with (status, output), as for
+           `ProcessWrapper.wait_until_terminate`
+        """
+        result = Promise()
+        previous = self.__last
+        self.__last = result
+        workflows.driver(self.__run(args, previous, result))
+        return result
+
+    def __run(self, args, previous, result):
+        if previous is not None:
+            yield previous
+
+        quoted = [_quote(a) for a in args]
+        out = None
+        if None not in quoted:
+            p = self.__process
+            if p is None or p.finished:
+                p = self.__process = ProcessWrapper(
+                    ['cleartool', '-status'],
+                    block_exit=False,
+                    directory=self.directory)
+            p.send(' '.join(quoted))
+            out = yield p.wait_until_match(self.__re_status)
+
+        if out is None:
+            # The session could not be used, or died: run the command in
+            # its own process
+            GPS.Logger(LOG_ID).log(
+                "cleartool %s run outside of the session" % (args, ))
+            status, output = yield ProcessWrapper(
+                ['cleartool'] + args,
+                block_exit=False,
+                directory=self.directory).wait_until_terminate()
+        else:
+            m = self.__re_status.match(out)
+            status = int(m.group(1))
+            output = out[:max(0, out.rfind('\n', 0, m.start(1)))]
+            output = '\n'.join(
+                line[len(self.__prompt):]
+                if line.startswith(self.__prompt) else line
+                for line in output.split('\n'))
+
+        result.resolve((status, output))
+
+
 @core.register_vcs(name='ClearCase Native',
                    default_status=GPS.VCS2.Status.UNMODIFIED)
 class Clearcase(core_staging.Emulate_Staging,
@@ -101,6 +196,14 @@ class Clearcase(core_staging.Emulate_Staging,
             directory=self.working_dir.path)
         return p
 
+    def _run(self, args):
+        """
+        Run a cleartool command in the persistent session.
+
+        :returntype: a promise resolved with (status, output)
+        """
+        return self._session.run(args)
+
     def _file_or_dir_filter(self, context):
         if context.file() or context.directory():
             return True
@@ -112,7 +215,15 @@ class Clearcase(core_staging.Emulate_Staging,
         super(Clearcase, self).__init__(*args, **kwargs)
 
         self.details = {}
-        self._checkedout_files = []
+        self._checkedout_files = set()
+        self._session = _Session(self.working_dir.path)
+
+        # The status of files, per directory. This is None until the status
+        # of all files has been computed.
+        self.__dir_status = None
+
+        # The directories whose status needs to be computed again
+        self.__dirty_dirs = set()
 
         if not ALREADY_LOADED:
             def _register_clearcase_action(name, action):
@@ -134,33 +245,71 @@ class Clearcase(core_staging.Emulate_Staging,
             _register_clearcase_action("remove", self._remove_current)
             GPS.Logger(LOG_ID).log("Finishing registering the actions")
 
-    def _set_clearcase_status(self, cmd_line):
+    def setup(self):
+        super(Clearcase, self).setup()
+        # The hook is shared by all the engines, and does not keep them
+        # alive once GPS no longer uses them
+        ENGINES.add(self)
+
+    def _on_file_saved(self, file):
+        if file.path.startswith(self.working_dir.path):
+            self.__dirty_dirs.add(os.path.dirname(file.path))
+
+    def __parse_ls(self, output):
+        """
+        Parse the output of "cleartool ls -short".
+
+        :returntype: a dict GPS.File -> GPS.VCS2.Status
+        """
+        result = {}
+        for line in output.splitlines():
+            if not line or line.startswith('cleartool: '):
+                continue
+            splitted = line.split('@@')
+            file = GPS.File(os.path.join(self.working_dir.path, splitted[0]))
+            if len(splitted) == 1:
+                result[file] = GPS.VCS2.Status.UNTRACKED
+            elif line.endswith('CHECKEDOUT'):
+                result[file] = GPS.VCS2.Status.MODIFIED
+            else:
+                result[file] = GPS.VCS2.Status.UNMODIFIED
+        return result
 
-        def __set_buffer_writable(buf, writable):
-            if buf:
-                buf.set_read_only(not writable)
+    def __set_statuses(self, statuses):
+        """
+        Set the status of files, and update the open editors accordingly.
 
-        self._checkedout_files = []
+        :param dict statuses: GPS.File -> GPS.VCS2.Status
+        """
         with self.set_status_for_all_files() as s:
-            p = self._cleartool(cmd_line)
-            while True:
-                line = yield p.wait_line()
-                if not line:
-                    break
-                splitted = line.split('@@')
-                file = GPS.File(splitted[0])
-
-                buf = GPS.EditorBuffer.get(file, open=False)
-                if len(splitted) == 1:
-                    status = GPS.VCS2.Status.UNTRACKED
-                elif line.endswith('CHECKEDOUT'):
-                    status = GPS.VCS2.Status.MODIFIED
-                    self._checkedout_files.append(file.path)
-                    __set_buffer_writable(buf, True)
-                else:
-                    status = GPS.VCS2.Status.UNMODIFIED
-                    __set_buffer_writable(buf, False)
+            for file, status in statuses.iteritems():
                 s.set_status(file, status, '', '')
+                if status == GPS.VCS2.Status.MODIFIED:
+                    self._checkedout_files.add(file.path)
+                else:
+                    self._checkedout_files.discard(file.path)
+
+        # Checked out files are writable, the others are read-only. Only
+        # the open editors need to be changed.
+        for buf in GPS.EditorBuffer.list():
+            status = statuses.get(buf.file())
+            if status == GPS.VCS2.Status.MODIFIED:
+                read_only = False
+            elif status == GPS.VCS2.Status.UNMODIFIED:
+                read_only = True
+            else:
+                continue
+            if buf.is_read_only() != read_only:
+                buf.set_read_only(read_only)
+
+    def __cache_statuses(self, statuses):
+        """
+        Store statuses in the per-directory cache, if it exists.
+        """
+        if self.__dir_status is not None:
+            for file, status in statuses.iteritems():
+                self.__dir_status.setdefault(
+                    os.path.dirname(file.path), {})[file] = status
 
     def make_file_writable(self, file, writable):
         """
@@ -187,15 +336,60 @@ class Clearcase(core_staging.Emulate_Staging,
                        False)
             return False
 
+    def __cached_statuses(self, files):
+        """
+        Look up the status of files in the per-directory cache.
+
+        :returntype: a tuple (dict GPS.File -> GPS.VCS2.Status,
+           list of GPS.File whose status is not known)
+        """
+        statuses = {}
+        unknown = []
+        for file in files:
+            d = os.path.dirname(file.path)
+            if (self.__dir_status is None or d in self.__dirty_dirs or
+                    file not in self.__dir_status.get(d, {})):
+                unknown.append(file)
+            else:
+                statuses[file] = self.__dir_status[d][file]
+        return statuses, unknown
+
     @core.run_in_background
     def async_fetch_status_for_files(self, files):
-        cmd_line = ['ls', '-short'] + [file.path for file in files]
-        yield self._set_clearcase_status(cmd_line)
+        statuses, unknown = self.__cached_statuses(files)
+        if unknown:
+            cmd_line = ['ls', '-short'] + [file.path for file in unknown]
+            status, output = yield self._run(cmd_line)
+            listed = self.__parse_ls(output)
+            self.__cache_statuses(listed)
+            statuses.update(listed)
+        self.__set_statuses(statuses)
 
     @core.run_in_background
     def async_fetch_status_for_all_files(self, from_user, extra_files=[]):
-        cmd_line = ['ls', '-recurse', '-short', '.']
-        yield self._set_clearcase_status(cmd_line)
+        # Directories saved while the command runs are marked dirty again
+        dirs = self.__dirty_dirs
+        self.__dirty_dirs = set()
+
+        if from_user or self.__dir_status is None:
+            self._checkedout_files = set()
+            status, output = yield self._run(['ls', '-recurse', '-short', '.'])
+            statuses = self.__parse_ls(output)
+            self.__dir_status = {}
+
+        elif dirs:
+            # Only list the directories in which files were saved
+            status, output = yield self._run(['ls', '-short'] + sorted(dirs))
+            statuses = self.__parse_ls(output)
+            for d in dirs:
+                self.__dir_status.pop(d, None)
+
+        else:
+            self.__log("Status cache is up to date", False)
+            return
+
+        self.__cache_statuses(statuses)
+        self.__set_statuses(statuses)
 
     def _has_defined_activity(self, path, verbose):
         """
@@ -204,9 +398,23 @@ class Clearcase(core_staging.Emulate_Staging,
 
         :returntype: an integer to indicate whether there is a defined activity
         """
+        # This is called from make_file_writable, which must be synchronous
         p = GPS.Process(['cleartool', 'lslock', path])
         output = p.get_result()
         status = p.wait()
+        return self.__activity(path, status, output, verbose)
+
+    def _async_has_defined_activity(self, path, verbose):
+        """
+        Same as `_has_defined_activity`, but run in the background.
+        """
+        status, output = yield self._run(['lslock', path])
+        yield self.__activity(path, status, output, verbose)
+
+    def __activity(self, path, status, output, verbose):
+        """
+        Convert the result of "cleartool lslock" to an activity.
+        """
         if status:
             self.__log(path + " has no activity", verbose)
             return Activity.NO  # No Clearcase activity on the file
@@ -235,7 +443,9 @@ class Clearcase(core_staging.Emulate_Staging,
             path = GPS.current_context().directory()
         return file, path
 
-    def __invalidate_clearcase_cache(self, file):
+    def __invalidate_clearcase_cache(self, file, path):
+        if path:
+            self.__dirty_dirs.add(os.path.dirname(path) if file else path)
         self.invalidate_status_cache()
         if file:
             self.ensure_status_for_files([file])
@@ -295,7 +505,7 @@ class Clearcase(core_staging.Emulate_Staging,
             output = p.get_result()
             status = p.wait()
         self.__log_result("checkout", status, output, True)
-        self.__invalidate_clearcase_cache(file)
+        self.__invalidate_clearcase_cache(file, path)
 
     def _checkin_current(self):
         """
@@ -313,26 +523,24 @@ class Clearcase(core_staging.Emulate_Staging,
                            "please save before checkin.")
             return
 
-        if not (self._has_defined_activity(path, True) == Activity.YES):
+        activity = yield self._async_has_defined_activity(path, True)
+        if activity != Activity.YES:
             return
 
         # Retrieve the checkout message
-        p = GPS.Process(['cleartool', 'lsco', '-fmt', '%c', path])
-        output = p.get_result()
-        status = p.wait()
+        status, output = yield self._run(['lsco', '-fmt', '%c', path])
 
-        cmd_line = ['cleartool', 'ci']
+        cmd_line = ['ci']
         comment_option = self.__user_input("Checkin", output)
         if not comment_option:
             return
         cmd_line += comment_option
         cmd_line.append(path)
 
-        p = GPS.Process(cmd_line)
-        output = p.get_result()
-        status = p.wait()
+        status, output = yield self._cleartool(
+            cmd_line, block_exit=True).wait_until_terminate()
         self.__log_result("checkin", status, output, True)
-        self.__invalidate_clearcase_cache(file)
+        self.__invalidate_clearcase_cache(file, path)
 
     def _uncheckout_current(self):
         """
@@ -365,7 +573,7 @@ class Clearcase(core_staging.Emulate_Staging,
         output = p.get_result()
         status = p.wait()
         self.__log_result("uncheckout", status, output, True)
-        self.__invalidate_clearcase_cache(file)
+        self.__invalidate_clearcase_cache(file, path)
 
     def _create_current(self):
         """
@@ -384,7 +592,7 @@ class Clearcase(core_staging.Emulate_Staging,
         output = p.get_result()
         status = p.wait()
         self.__log_result("mkelem", status, output, True)
-        self.__invalidate_clearcase_cache(file)
+        self.__invalidate_clearcase_cache(file, path)
 
     def _remove_current(self):
         """
@@ -406,7 +614,7 @@ class Clearcase(core_staging.Emulate_Staging,
             # Close the file if present in the editor
             GPS.EditorBuffer.get(file, open=False).close(force=True)
         self.__log_result("rmelem", status, output, True)
-        self.__invalidate_clearcase_cache(file)
+        self.__invalidate_clearcase_cache(file, path)
 
     @core.run_in_background
     def async_commit_staged_files(self, visitor, message):
@@ -565,8 +773,7 @@ class Clearcase(core_staging.Emulate_Staging,
 
         def _execute_diff(path, verbose):
             cmd_line = ['diff', '-serial_format', '-pred', path]
-            p = self._cleartool(cmd_line)
-            status, output = yield p.wait_until_terminate()
+            status, output = yield self._run(cmd_line)
             if status == 1:
                 yield self._to_git_format(output)
             else:
@@ -583,8 +790,7 @@ class Clearcase(core_staging.Emulate_Staging,
             # Retrieve the list of checkout files/directories
             # and then run diff on each of them
             cmd_line = ['lsco', '-recurse', '-cview', '-fmt', '%n\n']
-            p = self._cleartool(cmd_line)
-            status, output = yield p.wait_until_terminate()
+            status, output = yield self._run(cmd_line)
             if status == 0 and output:
                 diff = []
                 for line in output.splitlines():
@@ -615,8 +821,7 @@ class Clearcase(core_staging.Emulate_Staging,
             cmd_line = ['diff', '-serial_format', '-pred']
             entity = _get_entity(header[0])
             cmd_line.append(entity)
-            p = self._cleartool(cmd_line)
-            status, output = yield p.wait_until_terminate()
+            status, output = yield self._run(cmd_line)
             if status == 1:
                 header.append(self._to_git_format(output))
         visitor.set_details(id, '', '\n\n'.join(header))
@@ -675,3 +880,11 @@ class Clearcase(core_staging.Emulate_Staging,
         cmd_line += [file.path for file in files]
         status, output = yield self._cleartool(cmd_line).wait_until_terminate()
         self.__log_result("uncheckout", status, output, True)
+
+
+def _on_file_saved(hook, file):
+    for engine in list(ENGINES):
+        engine._on_file_saved(file)
+
+
+GPS.Hook('file_saved').add(_on_file_saved)
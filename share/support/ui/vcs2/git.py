@@ -1,9 +1,15 @@
 import GPS
 from . import core
+import collections
+import glob
+import hashlib
+import json
 import os
 import re
+import time
 import workflows
-from workflows.promises import ProcessWrapper, join, Promise
+from workflows.promises import ProcessWrapper, join, Promise, split_lines, \
+    run_in_executor
 import datetime
 
 
@@ -22,6 +28,265 @@ LOCAL_CHANGES_ID = 'Local change'
 _version = None
 # Git version
 
+STATUS_MAX_AGE = 60
+# Number of seconds after which "git status" is run again, even if none of
+# the files it depends on seem to have changed. Files modified in place
+# outside of GPS do not change the timestamp of their directory.
+
+_CONFLICT_CODES = ('DD', 'AU', 'UD', 'UA', 'DU', 'AA', 'UU')
+
+_INDEX_STATUS = {
+    'M': GPS.VCS2.Status.STAGED_MODIFIED,
+    'A': GPS.VCS2.Status.STAGED_ADDED,
+    'D': GPS.VCS2.Status.STAGED_DELETED,
+    'R': GPS.VCS2.Status.STAGED_RENAMED,
+    'C': GPS.VCS2.Status.STAGED_COPIED,
+    '?': GPS.VCS2.Status.UNTRACKED,
+    '!': GPS.VCS2.Status.IGNORED}
+
+_WORKTREE_STATUS = {
+    'M': GPS.VCS2.Status.MODIFIED,
+    'D': GPS.VCS2.Status.DELETED}
+
+_V2_FIELDS = {'1': 8, '2': 9, 'u': 10}
+# Number of space-separated fields before the path, in the output of
+# "git status --porcelain=v2"
+
+
+def _status_from_xy(xy):
+    """
+    Convert the two letters status of "git status --porcelain" to a status.
+    :param str xy: the status of the file in the index and in the working
+       tree. Unmodified is either " " (v1 format) or "." (v2 format)
+    :returntype: GPS.VCS2.Status
+    """
+    if xy in _CONFLICT_CODES:
+        return GPS.VCS2.Status.CONFLICT
+    return (_INDEX_STATUS.get(xy[0], 0) |
+            _WORKTREE_STATUS.get(xy[1], 0))
+
+
+HISTORY_FORMAT = '--pretty=tformat:%H@@%P@@%an@@%cD@@%s'
+# The format used for "git log" when filling the history cache. Decorations
+# are not part of it, since they change without new commits being created.
+
+HISTORY_CACHE_VERSION = 1
+# Version of the on-disk format of the history cache
+
+BLAME_CACHE_VERSION = 1
+# Version of the on-disk format of the annotations cache
+
+BLAME_CACHE_MEMORY = 20
+# Maximal number of files whose annotations are kept in memory
+
+BLAME_CACHE_FILES = 200
+# Maximal number of files whose annotations are saved on disk. The least
+# recently used ones are removed first.
+
+BLAME_CHUNK_DELAY = 0.2
+# Minimal number of seconds between two deliveries of annotations to the
+# editor while "git blame" is running
+
+
+class _History_Cache(object):
+    """
+    The commits already parsed from "git log", in topological order, as
+    lists [id, parents, author, date, subject].
+    The commits are read one page at a time, from `base_tips`, as the user
+    asks for more of the history. Commits that were created since the cache
+    was created are fetched separately, and stored before the others.
+    The cache is saved on disk, so that the next session doesn't need to
+    run "git log" again.
+    """
+
+    def __init__(self, filename):
+        self.filename = filename
+        self.reset([])
+        self.modified = False
+        self.saving = False
+
+    def reset(self, tips):
+        """
+        Discard all cached commits.
+        :param list(str) tips: the commits the history starts from
+        """
+        self.tips = tips
+        # The commits from which all cached commits are reachable
+
+        self.base_tips = tips
+        self.base_count = 0
+        # The commits from which the history is paged, and the number of
+        # commits already read from them
+
+        self.complete = False
+        # Whether all commits reachable from base_tips were read
+
+        self.commits = []
+        self.modified = True
+
+    def prepend(self, commits, tips):
+        """
+        Add commits created since the cache was filled.
+        :param list commits: the commits reachable from tips, but not from
+           self.tips. None of them can be a parent of a cached commit, so
+           the topological order is preserved.
+        :param list(str) tips: the new tips of the history
+        """
+        self.commits[0:0] = commits
+        self.tips = tips
+        self.modified = True
+
+    def append(self, commits, complete):
+        """
+        Add a page of commits read from self.base_tips.
+        :param list commits: the commits
+        :param bool complete: whether this was the last page
+        """
+        self.commits.extend(commits)
+        self.base_count += len(commits)
+        self.complete = complete
+        self.modified = True
+
+    @staticmethod
+    def read(filename):
+        """
+        Read the cache saved in filename. This does not call GPS, so can
+        run in a worker thread.
+        :returntype: a dict, or None if there is no compatible cache
+        """
+        try:
+            with open(filename) as f:
+                data = json.load(f)
+            if data['version'] == HISTORY_CACHE_VERSION:
+                return data
+        except Exception:
+            pass
+        return None
+
+    def load(self, data):
+        """
+        Restore the cache from the result of `read`.
+        """
+        try:
+            self.tips = data['tips']
+            self.base_tips = data['base_tips']
+            self.base_count = data['base_count']
+            self.complete = data['complete']
+            self.commits = data['commits']
+        except Exception:
+            # No cache yet, or from an incompatible version
+            self.reset([])
+        self.modified = False
+
+    def save(self):
+        """
+        Save the cache in a worker thread, so that a large history does not
+        block GPS. The lists are copied first, since they keep changing on
+        the main thread in the meantime.
+        """
+        if not self.modified or self.saving:
+            # If a save is running, the cache is saved again once it is done
+            return
+        self.modified = False
+        self.saving = True
+        data = {'version': HISTORY_CACHE_VERSION,
+                'tips': list(self.tips),
+                'base_tips': list(self.base_tips),
+                'base_count': self.base_count,
+                'complete': self.complete,
+                'commits': list(self.commits)}
+
+        def _done(error):
+            self.saving = False
+            if error:
+                GPS.Logger("GIT").log("Could not save history cache: %s" %
+                                      (error, ))
+            elif self.modified:
+                self.save()
+
+        run_in_executor(_History_Cache.write, self.filename, data).then(
+            _done, _done)
+
+    @staticmethod
+    def write(filename, data):
+        """
+        Write data in filename. This does not call GPS, so can run in a
+        worker thread.
+        :returntype: None, or the error message if the file could not be
+           written
+        """
+        try:
+            d = os.path.dirname(filename)
+            if not os.path.isdir(d):
+                os.makedirs(d)
+            tmp = filename + '.tmp'
+            with open(tmp, 'w') as f:
+                json.dump(data, f)
+            if os.path.exists(filename):
+                os.remove(filename)
+            os.rename(tmp, filename)
+        except (IOError, OSError) as e:
+            return str(e)
+        return None
+
+
+def _evict_blame_files(directory):
+    """
+    Remove the least recently used annotations files from directory, so
+    that at most BLAME_CACHE_FILES remain.
+    """
+    files = []
+    for f in glob.glob(os.path.join(directory, 'git_blame_*.json')):
+        try:
+            files.append((os.path.getmtime(f), f))
+        except OSError:
+            pass
+    files.sort()
+    for _, f in files[:-BLAME_CACHE_FILES]:
+        try:
+            os.remove(f)
+        except OSError:
+            pass
+
+
+def _decorations(refs, head, head_ref):
+    """
+    Compute the names to display for each commit, as "git log --decorate"
+    would.
+    :param list((str, str)) refs: the refs, as (name, commit id) pairs
+    :param str head: the commit id of HEAD
+    :param str head_ref: the full name of the branch HEAD points to, or
+       'HEAD' when detached.
+    :returntype: dict(str, list((str, GPS.VCS2.Commit.Kind)))
+    """
+    Kind = GPS.VCS2.Commit.Kind
+    if head_ref.startswith('refs/heads/'):
+        result = {head: [('HEAD -> %s' % head_ref[11:], Kind.HEAD)]}
+    else:
+        result = {head: [('HEAD', Kind.HEAD)]}
+
+    for name, id in refs:
+        if name == head_ref:
+            continue
+        elif name.startswith('refs/heads/'):
+            f = (name[11:], Kind.LOCAL)
+        elif name.startswith('refs/remotes/'):
+            f = (name[13:], Kind.REMOTE)
+        elif name.startswith('refs/tags/'):
+            f = (name[10:], Kind.TAG)
+        else:
+            continue
+        result.setdefault(id, []).append(f)
+    return result
+
+
+def _is_object_file(path):
+    """
+    Whether path is an obvious build artifact, for which we do not need
+    a status.
+    """
+    return path[-2:] == '.o' or path[-4:] == '.ali'
+
 
 @core.register_vcs(default_status=GPS.VCS2.Status.NO_VCS)
 class Git(core.VCS):
@@ -43,6 +308,24 @@ class Git(core.VCS):
 
         self._non_default_files = None
         # Files with a non-default status
+
+        self.__admin_dir = None
+        # The administrative directory, computed lazily
+
+        self.__status_signature = None
+        self.__status_time = 0
+        # The signature of the files that impact "git status", as computed
+        # for the last successful run, and the time of that run.
+
+        self.__history_caches = {}
+        # The promises resolved with the history caches, indexed on whether
+        # they are for the current branch only
+
+        self.__blame_cache = collections.OrderedDict()
+        # The last annotations computed for each file, as (key, ids,
+        # annotations), where key is the blob id of the file and HEAD.
+        # The most recently used files are last.
+
         self.__set_git_version()
 
     def _git(self, args, block_exit=False, **kwargs):
@@ -80,35 +363,16 @@ class Git(core.VCS):
         Run and parse "git status"
         :param s: the result of calling self.set_status_for_all_files
         """
+        if _version >= [2, 11]:
+            yield self.__git_status_v2(s)
+            return
+
         def on_line(line):
             if len(line) > 3:
-                if line[0:2] in ('DD', 'AU', 'UD', 'UA', 'DU', 'AA', 'UU'):
-                    status = GPS.VCS2.Status.CONFLICT
-                else:
-                    status = 0
-
-                    if line[0] == 'M':
-                        status = GPS.VCS2.Status.STAGED_MODIFIED
-                    elif line[0] == 'A':
-                        status = GPS.VCS2.Status.STAGED_ADDED
-                    elif line[0] == 'D':
-                        status = GPS.VCS2.Status.STAGED_DELETED
-                    elif line[0] == 'R':
-                        status = GPS.VCS2.Status.STAGED_RENAMED
-                    elif line[0] == 'C':
-                        status = GPS.VCS2.Status.STAGED_COPIED
-                    elif line[0] == '?':
-                        status = GPS.VCS2.Status.UNTRACKED
-                    elif line[0] == '!':
-                        status = GPS.VCS2.Status.IGNORED
-
-                    if line[1] == 'M':
-                        status = status | GPS.VCS2.Status.MODIFIED
-                    elif line[1] == 'D':
-                        status = status | GPS.VCS2.Status.DELETED
+                status = _status_from_xy(line[0:2])
 
                 # Filter some obvious files to speed things up
-                if line[-3:] != '.o' and line[-5:] != '.ali':
+                if not _is_object_file(line):
                     # If the path contains whitespaces then the output can be
                     # surrounded by '"' => remove them
                     if line[3] == '"' and line[-1] == '"':
@@ -128,6 +392,159 @@ class Git(core.VCS):
         p = self._git(['status', '--porcelain'] + ignored)
         yield p.lines.subscribe(on_line)   # wait until p terminates
 
+    def __git_status_v2(self, s):
+        """
+        Run and parse "git status --porcelain=v2 -z", which doesn't quote
+        file names, and where the object directories of the project are
+        excluded from git's own scan of the working tree.
+        :param s: the result of calling self.set_status_for_all_files
+        """
+        skip_next = [False]
+        top = self.working_dir.path
+
+        def on_records(records):
+            for rec in records:
+                if skip_next[0]:
+                    # Original name of a renamed or copied file
+                    skip_next[0] = False
+                    continue
+
+                kind = rec[0:1]
+                if kind in _V2_FIELDS:
+                    fields = rec.split(' ', _V2_FIELDS[kind])
+                    if kind == 'u':
+                        status = GPS.VCS2.Status.CONFLICT
+                    else:
+                        status = _status_from_xy(fields[1])
+                    skip_next[0] = kind == '2'
+                    path = fields[-1]
+                elif kind in ('?', '!'):
+                    status = _INDEX_STATUS[kind]
+                    path = rec[2:]
+                else:
+                    continue
+
+                if not _is_object_file(path):
+                    s.set_status(GPS.File(os.path.join(top, path)), status)
+
+        # Do not let "git status" refresh the index: that would change the
+        # signature we use to detect changes.
+        args = (['--no-optional-locks'] if _version >= [2, 15] else []) + \
+            ['status', '--porcelain=v2', '-z', '--ignored']
+
+        excluded = self.__excluded_object_dirs()
+        if excluded:
+            args += ['--', '.'] + [':(exclude)%s' % d for d in excluded]
+
+        p = self._git(args)
+        yield split_lines(p.stream, batch=True, separator='\0').subscribe(
+            on_records)   # wait until p terminates
+
+    def __git_dir(self):
+        """
+        The administrative directory of the working dir. This is ".git",
+        unless it is a file (for worktrees and submodules), in which case it
+        contains the path to the actual directory.
+        :returntype: str
+        """
+        if self.__admin_dir is None:
+            d = os.path.join(self.working_dir.path, '.git')
+            if os.path.isfile(d):
+                try:
+                    with open(d) as f:
+                        content = f.read().strip()
+                    if content.startswith('gitdir:'):
+                        d = os.path.join(
+                            self.working_dir.path, content[7:].strip())
+                except (IOError, OSError):
+                    pass
+            self.__admin_dir = os.path.normpath(d)
+        return self.__admin_dir
+
+    def __git_common_dir(self):
+        """
+        The directory that contains the refs. For worktrees, this is not
+        the same as the administrative directory.
+        :returntype: str
+        """
+        d = self.__git_dir()
+        try:
+            with open(os.path.join(d, 'commondir')) as f:
+                return os.path.normpath(os.path.join(d, f.read().strip()))
+        except (IOError, OSError):
+            return d
+
+    def __project_dirs(self):
+        """
+        Return the source and object directories of the loaded project.
+        :returntype: (list(str), list(str))
+        """
+        try:
+            root = GPS.Project.root()
+            return ([os.path.normpath(d)
+                     for d in root.source_dirs(recursive=True)],
+                    [os.path.normpath(d)
+                     for d in root.object_dirs(recursive=True)])
+        except Exception:
+            # No project loaded yet
+            return ([], [])
+
+    def __excluded_object_dirs(self):
+        """
+        The object directories of the project that are inside the working
+        dir and contain no sources, relative to the working dir. They only
+        contain generated files, so git doesn't need to look at them.
+        :returntype: list(str)
+        """
+        src_dirs, obj_dirs = self.__project_dirs()
+        top = os.path.normpath(self.working_dir.path)
+        result = set()
+        for d in obj_dirs:
+            if not d.startswith(top + os.sep):
+                continue
+            prefix = d + os.sep
+            if any(s == d or s.startswith(prefix) for s in src_dirs):
+                continue
+            result.add(os.path.relpath(d, top).replace('\\', '/'))
+        return sorted(result)
+
+    def __compute_status_signature(self, extra_files):
+        """
+        Compute a cheap signature of what impacts the output of
+        "git status": the index, HEAD and the branch it points to, the
+        source directories (whose timestamp changes when files are added
+        or removed) and the files we were explicitly asked about.
+        :param List(GPS.File) extra_files:
+        :returntype: tuple
+        """
+        git_dir = self.__git_dir()
+        head_file = os.path.join(git_dir, 'HEAD')
+        try:
+            with open(head_file) as f:
+                head = f.read().strip()
+        except (IOError, OSError):
+            head = ''
+
+        paths = [os.path.join(git_dir, 'index'), head_file]
+        if head.startswith('ref: '):
+            common = self.__git_common_dir()
+            paths.append(os.path.join(common, head[5:]))
+            paths.append(os.path.join(common, 'packed-refs'))
+
+        paths.append(self.working_dir.path)
+        paths.extend(self.__project_dirs()[0])
+        paths.extend(f.path for f in extra_files)
+
+        stamps = []
+        for p in paths:
+            try:
+                st = os.stat(p)
+                stamps.append((st.st_mtime, st.st_size))
+            except OSError:
+                stamps.append(None)
+
+        return (head, tuple(paths), tuple(stamps))
+
     @workflows.run_as_workflow
     def __set_git_version(self):
         """Find GIT version."""
@@ -157,6 +574,16 @@ class Git(core.VCS):
            set the status eventually
         """
 
+        # Nothing to do if none of the files that "git status" depends on
+        # have changed since the last run.
+        signature = self.__compute_status_signature(extra_files)
+        if (not from_user and
+                self._non_default_files is not None and
+                signature == self.__status_signature and
+                time.time() - self.__status_time < STATUS_MAX_AGE):
+            GPS.Logger("GIT").log("git status skipped, no change detected")
+            return
+
         s = self.set_status_for_all_files()
 
         # Do we need to reset the "ls-tree" cache ? After the initial
@@ -186,6 +613,8 @@ class Git(core.VCS):
             s.set_status(f, GPS.VCS2.Status.UNMODIFIED)
 
         s.set_status_for_remaining_files()
+        self.__status_signature = signature
+        self.__status_time = time.time()
 
     @core.run_in_background
     def stage_or_unstage_files(self, files, stage):
@@ -282,6 +711,185 @@ class Git(core.VCS):
         status, _ = yield p.wait_until_terminate()
         yield status != 0
 
+    def __git_refs(self):
+        """
+        A generator that returns the current branches, remote branches and
+        tags, as well as HEAD.
+
+        :returntype: a tuple (refs, head, head_ref), where refs is a list
+           of (full name, commit id), head is the commit id of HEAD (or None
+           if there is no commit yet), and head_ref is the full name of the
+           current branch, or 'HEAD' when detached.
+        """
+        refs = []
+
+        def on_line(line):
+            # Annotated tags are peeled to the commit they point to
+            fields = line.split(' ', 2)
+            if len(fields) == 3:
+                refs.append((fields[2], fields[1] or fields[0]))
+
+        p = self._git(['for-each-ref',
+                       '--format=%(objectname) %(*objectname) %(refname)',
+                       'refs/heads', 'refs/remotes', 'refs/tags'])
+        yield p.lines.subscribe(on_line)
+
+        p = self._git(['rev-parse', 'HEAD', '--symbolic-full-name', 'HEAD'])
+        status, output = yield p.wait_until_terminate()
+        output = output.split()
+        if status != 0 or len(output) != 2:
+            yield (refs, None, 'HEAD')
+        else:
+            yield (refs, output[0], output[1])
+
+    def __git_log(self, args, commits):
+        """
+        A generator that runs "git log" and appends the parsed commits to
+        `commits`. Returns the exit status of git.
+        :param List(str) args: extra arguments for "git log"
+        :param list commits: the list to modify
+        """
+        def on_lines(lines):
+            for line in lines:
+                fields = line.split('@@', 4)
+                if len(fields) == 5:
+                    fields[1] = fields[1].split()
+                    commits.append(fields)
+
+        p = self._git(['log', HISTORY_FORMAT, '--topo-order'] + args)
+        status = yield split_lines(p.stream, batch=True).subscribe(on_lines)
+        yield status
+
+    def __history_cache(self, current_branch_only):
+        """
+        Return the history cache for either the current branch or all
+        branches. It is read from disk in a worker thread the first time,
+        so that a large history does not block GPS.
+        :returntype: a promise resolved with a _History_Cache
+        """
+        promise = self.__history_caches.get(current_branch_only)
+        if promise is None:
+            filename = 'git_history_%s_%s.json' % (
+                hashlib.sha1(self.working_dir.path).hexdigest(),
+                'head' if current_branch_only else 'all')
+            cache = _History_Cache(
+                os.path.join(GPS.get_home_dir(), 'vcs_cache', filename))
+
+            def _load(data):
+                cache.load(data)
+                return cache
+
+            promise = run_in_executor(
+                _History_Cache.read, cache.filename).then(_load)
+            self.__history_caches[current_branch_only] = promise
+
+        # A separate promise for each caller, since cancelling the workflow
+        # that waits for it must not cancel the loading
+        result = Promise()
+        promise.then(result.resolve)
+        return result
+
+    def __update_history_cache(self, cache, tips, needed):
+        """
+        A generator that fetches the commits created since `cache` was
+        last updated, and then reads enough older commits to have `needed`
+        of them. Returns False in case of error.
+        :param _History_Cache cache: the cache to update
+        :param List(str) tips: the current tips of the history
+        :param int|None needed: the number of commits needed, or None to
+           read the whole history.
+        """
+        if cache.tips != tips:
+            count = ''
+            if cache.commits:
+                # Were some of the cached commits rewritten or deleted ?
+                p = self._git(
+                    ['rev-list', '--count'] + cache.tips + ['--not'] + tips)
+                status, count = yield p.wait_until_terminate()
+                if status != 0:
+                    count = ''
+
+            if count.strip() == '0':
+                commits = []
+                status = yield self.__git_log(
+                    tips + ['--not'] + cache.tips, commits)
+                if status != 0:
+                    yield False
+                    return
+                GPS.Logger("GIT").log(
+                    "history cache: %s new commits" % (len(commits), ))
+                cache.prepend(commits, tips)
+            else:
+                cache.reset(tips)
+
+        if not cache.complete and (
+                needed is None or len(cache.commits) < needed):
+            commits = []
+            args = ['--skip=%d' % cache.base_count]
+            if needed is not None:
+                args.append('--max-count=%d' % (needed - len(cache.commits)))
+            status = yield self.__git_log(args + cache.base_tips, commits)
+            if status != 0:
+                yield False
+                return
+            cache.append(
+                commits,
+                complete=(needed is None or
+                          len(cache.commits) + len(commits) < needed))
+
+        yield True
+
+    def __cached_history(self, visitor, unpushed, has_local, max_lines,
+                         current_branch_only, branch_commits_only):
+        """
+        A generator that reports the history from the cache, only running
+        git for the commits that are not known yet.
+        Returns False if the cache could not be used.
+        """
+        refs, head, head_ref = yield self.__git_refs()
+        if head is None:
+            yield False
+            return
+
+        if current_branch_only:
+            tips = [head]
+        else:
+            tips = sorted(set(id for _, id in refs))
+
+        # The branch view needs the whole history to find branching points
+        needed = None if branch_commits_only else max_lines
+        cache = yield self.__history_cache(current_branch_only)
+        ok = yield self.__update_history_cache(cache, tips, needed)
+        if not ok:
+            cache.reset([])
+            yield False
+            return
+        cache.save()
+
+        decorations = _decorations(refs, head, head_ref)
+        commits = cache.commits if needed is None else cache.commits[:needed]
+
+        for id, parents, author, date, subject in commits:
+            # Append a dummy entry if we have local changes, and we have
+            # the HEAD
+            if id == head and has_local:
+                visitor.history_line(GPS.VCS2.Commit(
+                    LOCAL_CHANGES_ID,
+                    '',
+                    '',
+                    '<uncommitted changes>',
+                    parents=[id],
+                    flags=GPS.VCS2.Commit.Flags.UNCOMMITTED |
+                    GPS.VCS2.Commit.Flags.UNPUSHED))
+
+            visitor.history_line(GPS.VCS2.Commit(
+                id, author, date, subject, parents, decorations.get(id),
+                flags=GPS.VCS2.Commit.Flags.UNPUSHED if id in unpushed else 0))
+
+        GPS.Logger("GIT").log(
+            "done reporting cached history (%s lines)" % (len(commits), ))
+        yield True
+
     @core.run_in_background
     def async_fetch_history(self, visitor, filter):
         # Compute, in parallel, needed pieces of information
@@ -297,6 +905,15 @@ class Git(core.VCS):
         current_branch_only = filter[3]
         branch_commits_only = filter[4]
 
+        # The unfiltered history is cached, and only new commits, or
+        # older commits not seen yet, are read from git.
+        if not pattern and not for_file:
+            ok = yield self.__cached_history(
+                visitor, unpushed, has_local, max_lines,
+                current_branch_only, branch_commits_only)
+            if ok:
+                return
+
         filter_switch = ''
         if pattern:
             if pattern.startswith('author:'):
@@ -473,39 +1090,189 @@ class Git(core.VCS):
         else:
             GPS.Logger("GIT").log("Error computing diff: %s" % output)
 
+    def __blame_cache_file(self, path):
+        return os.path.join(
+            GPS.get_home_dir(), 'vcs_cache',
+            'git_blame_%s.json' % hashlib.sha1(path).hexdigest())
+
+    def __cached_blame(self, path, key):
+        """
+        Return the annotations computed for the file when it had the same
+        contents and HEAD was the same, or None.
+        :returntype: a tuple (ids, annotations)
+        """
+        cached = self.__blame_cache.pop(path, None)
+        if cached is None:
+            filename = self.__blame_cache_file(path)
+            try:
+                with open(filename) as f:
+                    data = json.load(f)
+                if data['version'] == BLAME_CACHE_VERSION:
+                    cached = (data['key'], data['ids'], data['annotations'])
+                    # Mark the file as recently used
+                    os.utime(filename, None)
+            except Exception:
+                # No cache yet, or from an incompatible version
+                return None
+
+        if cached is not None:
+            self.__remember_blame(path, cached)
+
+        if cached is not None and cached[0] == key:
+            return cached[1], cached[2]
+        return None
+
+    def __remember_blame(self, path, cached):
+        self.__blame_cache.pop(path, None)
+        self.__blame_cache[path] = cached
+        while len(self.__blame_cache) > BLAME_CACHE_MEMORY:
+            self.__blame_cache.popitem(last=False)
+
+    def __save_blame(self, path, key, ids, annotations):
+        self.__remember_blame(path, (key, ids, annotations))
+        filename = self.__blame_cache_file(path)
+        try:
+            d = os.path.dirname(filename)
+            if not os.path.isdir(d):
+                os.makedirs(d)
+            tmp = filename + '.tmp'
+            with open(tmp, 'w') as f:
+                json.dump({'version': BLAME_CACHE_VERSION,
+                           'key': key,
+                           'ids': ids,
+                           'annotations': annotations}, f)
+            if os.path.exists(filename):
+                os.remove(filename)
+            os.rename(tmp, filename)
+            _evict_blame_files(d)
+        except (IOError, OSError) as e:
+            GPS.Logger("GIT").log("Could not save annotations cache: %s" % e)
+
+    def __blame_ranges(self, file, nb_lines):
+        """
+        Return the "-L" arguments for the successive runs of "git blame":
+        the lines visible in the editor first, then the others.
+        :returntype: list(list(str))
+        """
+        buffer = GPS.EditorBuffer.get(file, open=False)
+        visible = None
+        if buffer is not None:
+            try:
+                from highlighter.engine import visible_lines
+                visible = visible_lines(buffer)
+            except Exception:
+                pass
+
+        if visible is None:
+            return [[]]
+
+        first = min(nb_lines, visible[0] + 1)
+        last = min(nb_lines, visible[1] + 1)
+        rest = []
+        if first > 1:
+            rest.extend(['-L', '1,%d' % (first - 1)])
+        if last < nb_lines:
+            rest.extend(['-L', '%d,%d' % (last + 1, nb_lines)])
+        return [['-L', '%d,%d' % (first, last)]] + ([rest] if rest else [])
+
     @core.run_in_background
     def async_annotations(self, visitor, file):
-        info = {}   # for each commit id, the annotation
-        current_id = None
-        first_line = 1
-        lines = []
-        ids = []
-
-        p = self._git(['blame', '--porcelain', file.path])
-        while True:
-            line = yield p.wait_line()
-            if line is None:
-                break
+        try:
+            with open(file.path, 'rb') as f:
+                contents = f.read()
+        except IOError:
+            return
 
-            if current_id is None:
-                current_id = line.split(' ', 1)[0]
+        nb_lines = contents.count('\n')
+        if contents and not contents.endswith('\n'):
+            nb_lines += 1
+        if nb_lines == 0:
+            return
 
-            elif line[0] == '\t':
-                # The line of code, which we ignore
-                lines.append(info[current_id])
-                ids.append(current_id)
-                current_id = None
+        # The annotations only depend on the contents of the file and HEAD
+        p = self._git(['rev-parse', '--verify', '-q', 'HEAD'])
+        status, head = yield p.wait_until_terminate()
+        key = [hashlib.sha1('blob %d\0%s' % (len(contents), contents))
+               .hexdigest(),
+               head.strip()]
 
-            elif line.startswith('author '):
-                info[current_id] = line[7:17]  # at most 10 chars
+        cached = self.__cached_blame(file.path, key)
+        if cached is not None:
+            visitor.annotations(file, 1, cached[0], cached[1])
+            return
 
-            elif line.startswith('committer-time '):
-                d = datetime.datetime.fromtimestamp(
-                    int(line[15:])).strftime('%Y%m%d')
-                info[current_id] = '%s %10s %s' % (
-                    d, info[current_id], current_id[0:7])
+        info = {}      # for each commit id, the annotation
+        authors = {}   # for each commit id, the author
+        ids = [None] * nb_lines
+        lines = [None] * nb_lines
+        state = {'current': None,   # (id, first line, count) being parsed
+                 'pending': [],     # (first line, count) not delivered yet
+                 'flushed': time.time()}
+
+        def flush():
+            # Deliver the contiguous ranges of lines annotated since the
+            # last call
+            pending = sorted(state['pending'])
+            state['pending'] = []
+            state['flushed'] = time.time()
+            start = None
+            end = None
+            for first, count in pending + [(None, 0)]:
+                if start is not None and first != end:
+                    visitor.annotations(
+                        file, start, ids[start - 1:end - 1],
+                        lines[start - 1:end - 1])
+                    start = None
+                if first is not None:
+                    if start is None:
+                        start = first
+                    end = first + count
+
+        def on_lines(output):
+            for line in output:
+                current = state['current']
+                if current is None:
+                    # "<id> <original line> <final line> <count>"
+                    fields = line.split(' ')
+                    state['current'] = (
+                        fields[0], int(fields[2]), int(fields[3]))
+
+                elif line.startswith('author '):
+                    authors[current[0]] = line[7:17]  # at most 10 chars
+
+                elif line.startswith('committer-time '):
+                    d = datetime.datetime.fromtimestamp(
+                        int(line[15:])).strftime('%Y%m%d')
+                    info[current[0]] = '%s %10s %s' % (
+                        d, authors.get(current[0], ''), current[0][0:7])
+
+                elif line.startswith('filename '):
+                    # The last line for this range of lines
+                    id, first, count = current
+                    text = info.get(id, id[0:7])
+                    for idx in range(first - 1, first - 1 + count):
+                        ids[idx] = id
+                        lines[idx] = text
+                    state['pending'].append((first, count))
+                    state['current'] = None
+
+            if time.time() - state['flushed'] > BLAME_CHUNK_DELAY:
+                flush()
+
+        for ranges in self.__blame_ranges(file, nb_lines):
+            p = self._git(['blame', '--incremental'] + ranges +
+                          ['--', file.path])
+            status = yield split_lines(p.stream, batch=True).subscribe(
+                on_lines)
+            flush()
+            if status != 0:
+                return
 
-        visitor.annotations(file, first_line, ids, lines)
+        if None not in ids:
+            # Deliver all lines at once, so that consecutive lines from the
+            # same commit are displayed as such
+            visitor.annotations(file, 1, ids, lines)
+            self.__save_blame(file.path, key, ids, lines)
 
     def _branches(self, visitor):
         """
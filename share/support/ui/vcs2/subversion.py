@@ -2,6 +2,8 @@ from . import core, core_staging
 import GPS
 import re
 import os
+import time
+import workflows
 from workflows.promises import ProcessWrapper, join
 
 
@@ -10,15 +12,35 @@ CAT_TAGS = 'TAGS'
 
 CAN_RENAME = True
 
+REMOTE_STATUS_MAX_AGE = 300
+# Minimal number of seconds between two runs of "svn status -u", which
+# contacts the server, unless the user explicitly asks for a refresh
+
 
 @core.register_vcs(name='subversion',
-                   default_status=GPS.VCS2.Status.UNTRACKED)
+                   default_status=GPS.VCS2.Status.UNMODIFIED)
 class SVN(core_staging.Emulate_Staging,
           core.File_Based_VCS):
 
-    __re_status = re.compile(
-        '^(?P<status>....... .)\s+(?P<rev>\S+)\s+' +
-        '(?P<lastcommit>\S+)\s+(?P<author>\S+)\s+(?P<file>.+)$')
+    __status_columns = '[ ACDIMRX?!~][ CM][ L][ +][ SX][ KOTB][ C]'
+    # The first seven columns of "svn status"
+
+    __re_local_status = re.compile(
+        '^' + __status_columns + ' (?P<file>.+)$')
+
+    __re_remote_status = re.compile(
+        '^' + __status_columns + ' (?P<ood>[ *])\s+(?P<rev>\S+)\s+' +
+        '(?P<file>.+)$')
+
+    __re_against = re.compile('^Status against revision:\s+(\d+)')
+
+    def __init__(self, *args, **kwargs):
+        super(SVN, self).__init__(*args, **kwargs)
+        self.__non_default_files = set()
+        self.__needs_update = {}     # GPS.File -> repository revision
+        self.__remote_time = 0
+        self.__remote_promise = None
+        self.__working_rev = None    # Revision of the working copy
 
     @staticmethod
     def discover_working_dir(file):
@@ -41,70 +63,203 @@ class SVN(core_staging.Emulate_Staging,
     def _update(self):
         p = self._svn(['update'], spawn_console='')
         yield p.wait_until_terminate()
+        self.__working_rev = None
+
+    def __status_from_line(self, line):
+        """
+        Convert the status columns of "svn status" to a status.
+
+        :param str line: a line of the output of "svn status"
+        :returntype: GPS.VCS2.Status
+        """
+        if line[0] == ' ':
+            status = GPS.VCS2.Status.UNMODIFIED
+        elif line[0] == 'A':
+            status = GPS.VCS2.Status.STAGED_ADDED
+        elif line[0] == 'D':
+            status = GPS.VCS2.Status.STAGED_DELETED
+        elif line[0] == 'M':
+            status = GPS.VCS2.Status.MODIFIED
+        elif line[0] == 'C':
+            status = GPS.VCS2.Status.CONFLICT
+        elif line[0] == 'X':
+            status = GPS.VCS2.Status.UNTRACKED
+        elif line[0] == 'I':
+            status = GPS.VCS2.Status.IGNORED
+        elif line[0] == '?':
+            status = GPS.VCS2.Status.UNTRACKED
+        elif line[0] == '!':
+            status = GPS.VCS2.Status.DELETED
+        elif line[0] == '-':
+            status = GPS.VCS2.Status.CONFLICT
+        else:
+            status = 0
+
+        # Properties
+        if line[1] == 'M':
+            status = status | GPS.VCS2.Status.MODIFIED
+        elif line[1] == 'C':
+            status = status | GPS.VCS2.Status.CONFLICT
+
+        if line[2] == 'L':
+            status = status | GPS.VCS2.Status.LOCAL_LOCKED
+
+        if line[5] == 'K':
+            status = status | GPS.VCS2.Status.LOCAL_LOCKED
+        elif line[5] in ('O', 'T'):
+            status = status | GPS.VCS2.Status.LOCKED_BY_OTHER
+
+        if line[6] == 'C':
+            status = status | GPS.VCS2.Status.CONFLICT
+
+        return status
+
+    def async_fetch_status_for_all_files(self, from_user):
+        return self._compute_status([], from_user=from_user)
 
     @core.run_in_background
-    def _compute_status(self, all_files, args=[]):
+    def _compute_status(self, all_files, args=[], from_user=False):
+        """
+        Run a local "svn status", which only lists the modified files, and
+        merge the result of the last `async_fetch_remote_status`.
+        The working revision is only queried when it might have changed.
+        """
+        if self.__working_rev is None:
+            p = self._svn(['info', '--show-item', 'revision'])
+            status, output = yield p.wait_until_terminate()
+            self.__working_rev = output.strip() if status == 0 else ''
+        rev = self.__working_rev
+
+        found = {}         # GPS.File -> status
+        unversioned = []   # (directory, status) for unversioned directories
+
+        p = self._svn(['status'] + [self._relpath(arg) for arg in args])
+        while True:
+            line = yield p.wait_line()
+            if line is None:
+                break
+
+            m = self.__re_local_status.search(line)
+            if m:
+                f = os.path.join(self.working_dir.path, m.group('file'))
+                status = self.__status_from_line(line)
+                if line[0] in ('?', 'I') and os.path.isdir(f):
+                    # svn does not list the contents of these directories
+                    unversioned.append((os.path.join(f, ''), status))
+                else:
+                    found[GPS.File(f)] = status
+
+        if unversioned:
+            for f in (all_files or
+                      GPS.Project.root().sources(recursive=True)):
+                for d, status in unversioned:
+                    if f.path.startswith(d):
+                        found[f] = status
+                        break
+
+        # Read this only now, since the remote status might have been
+        # updated while "svn status" was running
+        needs_update = self.__needs_update
+        scope = set(all_files) if all_files else None
+
         with self.set_status_for_all_files(all_files) as s:
-            list = [self._relpath(arg) for arg in args]
-            p = self._svn(
-                # -u: Compare with server (slower but more helpful)
-                ['status', '-v', '-u'] + list)
-
-            while True:
-                line = yield p.wait_line()
-                if line is None:
-                    break
+            for f, status in found.iteritems():
+                version = '' if status & (GPS.VCS2.Status.UNTRACKED |
+                                          GPS.VCS2.Status.IGNORED) else rev
+                if f in needs_update:
+                    s.set_status(f, status | GPS.VCS2.Status.NEEDS_UPDATE,
+                                 version, needs_update[f])
+                else:
+                    s.set_status(f, status, version)
+
+            for f, repo_rev in needs_update.iteritems():
+                if f not in found and (scope is None or f in scope):
+                    s.set_status(
+                        f,
+                        GPS.VCS2.Status.UNMODIFIED |
+                        GPS.VCS2.Status.NEEDS_UPDATE,
+                        rev, repo_rev)
+
+            # Files that were listed by a previous run but no longer are
+            # (after a commit or a revert for instance) are back to the
+            # default status. Files in scope are handled on exit.
+            if scope is None:
+                for f in self.__non_default_files:
+                    if f not in found and f not in needs_update:
+                        s.set_status(f, GPS.VCS2.Status.UNMODIFIED)
+                self.__non_default_files = set(found)
+            else:
+                self.__non_default_files.difference_update(scope)
+                self.__non_default_files.update(found)
+
+        if (from_user or
+                time.time() - self.__remote_time > REMOTE_STATUS_MAX_AGE):
+            self.async_fetch_remote_status()
+
+    def async_fetch_remote_status(self):
+        """
+        Run "svn status -u" to find which files have been modified in the
+        repository, and update the NEEDS_UPDATE status of files.
+
+        This contacts the server, so is not run as part of the normal
+        status refresh, and does not prevent other commands from running
+        in the meantime.
+
+        :returntype: a promise resolved when the statuses have been updated
+        """
+        promise = self.__remote_promise
+        if promise is None:
+            def _done(_):
+                self.__remote_promise = None
+
+            self.__remote_time = time.time()
+            promise = self.__remote_promise = workflows.driver(
+                self.__remote_status())
+            promise.then(_done, _done)
+        return promise
+
+    def __remote_status(self):
+        ood = set()
+        head = ''
+        p = self._svn(['status', '-u', '-q'])
+        terminated = p.wait_until_terminate()
+        while True:
+            line = yield p.wait_line()
+            if line is None:
+                break
 
-                m = self.__re_status.search(line)
+            m = self.__re_remote_status.search(line)
+            if m is None:
+                m = self.__re_against.search(line)
                 if m:
-                    f = os.path.join(self.working_dir.path, m.group('file'))
-                    rev = m.group('rev')   # current checkout
-                    rrev = m.group('lastcommit')  # only if we use '-u'
-
-                    if line[0] == ' ':
-                        status = GPS.VCS2.Status.UNMODIFIED
-                    elif line[0] == 'A':
-                        status = GPS.VCS2.Status.STAGED_ADDED
-                    elif line[0] == 'D':
-                        status = GPS.VCS2.Status.STAGED_DELETED
-                    elif line[0] == 'M':
-                        status = GPS.VCS2.Status.MODIFIED
-                    elif line[0] == 'C':
-                        status = GPS.VCS2.Status.CONFLICT
-                    elif line[0] == 'X':
-                        status = GPS.VCS2.Status.UNTRACKED
-                    elif line[0] == 'I':
-                        status = GPS.VCS2.Status.IGNORED
-                    elif line[0] == '?':
-                        status = GPS.VCS2.Status.UNTRACKED
-                    elif line[0] == '!':
-                        status = GPS.VCS2.Status.DELETED
-                    elif line[0] == '-':
-                        status = GPS.VCS2.Status.CONFLICT
-                    else:
-                        status = 0
-
-                    # Properties
-                    if line[1] == 'M':
-                        status = status | GPS.VCS2.Status.MODIFIED
-                    elif line[1] == 'C':
-                        status = status | GPS.VCS2.Status.CONFLICT
-
-                    if line[2] == 'L':
-                        status = status | GPS.VCS2.Status.LOCAL_LOCKED
-
-                    if line[5] == 'K':
-                        status = status | GPS.VCS2.Status.LOCAL_LOCKED
-                    elif line[5] in ('O', 'T'):
-                        status = status | GPS.VCS2.Status.LOCKED_BY_OTHER
-
-                    if line[6] == 'C':
-                        status = status | GPS.VCS2.Status.CONFLICT
-
-                    if line[7] == '*':   # Only if we use -u
-                        status = status | GPS.VCS2.Status.NEEDS_UPDATE
-
-                    s.set_status(GPS.File(f), status, rev, rrev)
+                    head = m.group(1)
+            elif m.group('ood') == '*':
+                ood.add(GPS.File(
+                    os.path.join(self.working_dir.path, m.group('file'))))
+
+        status, _ = yield terminated
+        # The working copy might have been updated outside of GPS
+        self.__working_rev = None
+        if status != 0:
+            # Keep the previous statuses if the server is unreachable
+            GPS.Logger("SVN").log("svn status -u failed")
+            return
+
+        # Only the files whose NEEDS_UPDATE flag changes need updating
+        old = self.__needs_update
+        self.__needs_update = dict.fromkeys(ood, head)
+        changed = ood.symmetric_difference(old)
+        changed.update(f for f in ood if f in old and old[f] != head)
+
+        for f in changed:
+            status, version, _ = self.get_file_status(f)
+            if f in ood:
+                status |= GPS.VCS2.Status.NEEDS_UPDATE
+                repo_rev = head
+            else:
+                status &= ~GPS.VCS2.Status.NEEDS_UPDATE
+                repo_rev = ''
+            self._set_file_status([f], status, version, repo_rev)
 
     @core.run_in_background
     def async_commit_staged_files(self, visitor, message):
@@ -121,6 +276,7 @@ class SVN(core_staging.Emulate_Staging,
         yield self._internal_commit_staged_files(
             visitor,
             ['svn', 'commit', '-m', message])
+        self.__working_rev = None
 
     def _log_stream(self, args=[]):
         """
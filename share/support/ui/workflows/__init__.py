@@ -118,8 +118,10 @@ is executed.
 
 import inspect
 import sys
+import time
 import GPS
 import workflows.promises as promises
+from gs_utils import stall_profiler
 import traceback
 import types
 
@@ -183,6 +185,22 @@ def peel_traceback_to(tb, frame):
     return tb
 
 
+class _Workflow_Promise(promises.Promise):
+    """
+    The promise returned by `driver`. Cancelling it does not reject it
+    right away: the workflow may catch the Cancelled exception and go on,
+    so the promise is only settled once the workflow has exited.
+    """
+
+    def __init__(self, on_cancel):
+        super(_Workflow_Promise, self).__init__()
+        self.__on_cancel = on_cancel
+
+    def cancel(self):
+        if self._state == promises.Promise.PENDING:
+            self.__on_cancel()
+
+
 def driver(gen_inst):
     """
     This is the main driver for workflows. You can pass your worklow (which is
@@ -216,25 +234,41 @@ def driver(gen_inst):
     Generators can throw exceptions: these will be propagated to the generator
     that spawned them.
 
+    Workflows can be cancelled by calling `cancel()` on the promise returned
+    by `driver`. The promise the workflow is currently waiting for is
+    cancelled as well (which, for instance, interrupts the process of a
+    ProcessWrapper), and a `promises.Cancelled` exception is raised in the
+    innermost generator, so that `finally` blocks are executed. The promise
+    is rejected once the exception has terminated the workflow, or resolved
+    if the workflow caught it and returned normally.
+
     :return: a promise, that will be resolved when the workflow has finished
       executing. This can in general be ignored, since as described above
       `driver` will automatically chain things. In some contexts it might be
       useful to use this promise though.
     """
 
-    promise = promises.Promise()
-
     # Stack of generators, similar to a call stack. The first one is the
     # original generator and the last one is the most recently spawned one.
     gen_stack = [gen_inst]
 
-    def resume(return_val=None):
+    # What the workflow is waiting for, as a list containing the promise
+    # derived from the one it yielded, and whether the workflow was
+    # cancelled while it was running (as opposed to waiting). Only the
+    # derived promise is cancelled, so that the yielded one is only
+    # cancelled if no one else waits for it.
+    state = {'waiting': None, 'cancelled': False}
+
+    def cancelled_exc_info():
+        return (promises.Cancelled, promises.Cancelled(), None)
+
+    def resume(return_val=None, exc_info=None):
         """Resume execution for this workflow."""
         el = None
-        exc_info = None
 
         while gen_stack:
             gen = gen_stack[-1]
+            start = time.time()
             try:
                 if exc_info is not None:
                     # If the previous round raised an exception, propagate it
@@ -263,9 +297,10 @@ def driver(gen_inst):
                 # the end, the user can have a traceback that is focused on its
                 # generators.
                 exc_type, exc_value, exc_tb = sys.exc_info()
-                GPS.Logger("WORKFLOW").log(
-                    "Unexpected exception in workflow: %s %s" %
-                    (e, " ".join(traceback.format_tb(exc_tb))))
+                if not isinstance(e, promises.Cancelled):
+                    GPS.Logger("WORKFLOW").log(
+                        "Unexpected exception in workflow: %s %s" %
+                        (e, " ".join(traceback.format_tb(exc_tb))))
 
                 # Strip the traceback to only keep the user part. Be careful
                 # about currentframe: on some implementations it can return
@@ -280,16 +315,29 @@ def driver(gen_inst):
                 exc_info = (exc_type, exc_value, exc_tb)
                 continue
 
+            finally:
+                # Each step of the workflow blocks the main loop
+                stall_profiler.record('workflow', gen, time.time() - start)
+
             if isinstance(el, types.GeneratorType):
                 # The last generator performed some kind of "call": schedule to
                 # run the child generator for the next round.
                 gen_stack.append(el)
                 el = None
             elif isinstance(el, promises.Promise):
+                if state['cancelled']:
+                    # The workflow was cancelled while it was running: do not
+                    # wait, and raise Cancelled in the generator instead.
+                    state['cancelled'] = False
+                    el.then().cancel()
+                    exc_info = cancelled_exc_info()
+                    continue
+
                 # If the last generator yielded a promise, schedule to resume
                 # its execution when the promise is ready.
                 # ??? Should we connect to reject to cancel the whole workflow?
-                el.then(resume)
+                waiting = state['waiting'] = [None]
+                waiting[0] = el.then(resume_after(waiting))
                 return
 
             # Clean state for the next round.
@@ -298,7 +346,11 @@ def driver(gen_inst):
 
         # If we reach this point, there's nothing to execute anymore: just log
         # any uncaught exception.
-        if exc_info is not None:
+        if exc_info is not None and \
+                isinstance(exc_info[1], promises.Cancelled):
+            # Cancelled workflows are not an error
+            promise.reject(exc_info[1])
+        elif exc_info is not None:
             message = (
                 'Uncaught exception in workflows:\n'
                 '{}\n'.format(''.join(traceback.format_exception(*exc_info)))
@@ -313,6 +365,34 @@ def driver(gen_inst):
         else:
             promise.resolve(return_val)
 
+    def resume_after(waiting):
+        """
+        Return a function that resumes the workflow with the value of the
+        promise it waits for, unless the workflow stopped waiting for it in
+        the meantime.
+        """
+        def on_resolved(return_val):
+            if state['waiting'] is waiting:
+                state['waiting'] = None
+                resume(return_val)
+        return on_resolved
+
+    def cancel():
+        """
+        Called when the promise returned by driver is cancelled.
+        """
+        waiting = state['waiting']
+        if waiting is None:
+            # The workflow is currently running: raise Cancelled the next
+            # time it waits for a promise.
+            state['cancelled'] = bool(gen_stack)
+        else:
+            state['waiting'] = None
+            waiting[0].cancel()
+            resume(exc_info=cancelled_exc_info())
+
+    promise = _Workflow_Promise(cancel)
+
     # We just created a new execution state (gen_stack), so technically we are
     # resuming it below.
     resume()
@@ -362,6 +442,53 @@ def run_as_workflow(workflow):
     return internal_run_as_wf
 
 
+def latest_wins(key=None):
+    """
+    Decorator used to run a function as a workflow (see `run_as_workflow`),
+    where a new call cancels the previous call with the same key if it is
+    still running. This is useful when a new request makes the result of
+    the previous one obsolete, for instance refreshing a view::
+
+        @latest_wins(key=lambda view: view)
+        def refresh(view):
+            p = ProcessWrapper([...])
+            status, output = yield p.wait_until_terminate()
+            view.show(output)
+
+    The decorated function can also return a promise (for instance if it is
+    itself decorated with `run_as_workflow`), which is cancelled instead.
+
+    :param key: a function that receives the same parameters as the
+       decorated function and returns the key. By default, all calls share
+       the same key.
+    """
+    def decorator(workflow):
+        running = {}   # key -> promise
+
+        def internal_latest_wins(*args, **kwargs):
+            k = key(*args, **kwargs) if key is not None else None
+            previous = running.pop(k, None)
+            if previous is not None:
+                previous.cancel()
+
+            r = workflow(*args, **kwargs)
+            if isinstance(r, types.GeneratorType):
+                r = driver(r)
+            if not isinstance(r, promises.Promise):
+                return r
+
+            def on_done(value):
+                if running.get(k) is r:
+                    del running[k]
+
+            running[k] = r
+            r.then(on_done, on_done)
+            return r
+
+        return internal_latest_wins
+    return decorator
+
+
 def task_workflow(task_name, workflow, **kwargs):
     """Run a workflow monitored by a task.
 
@@ -7,13 +7,24 @@ import time
 from time_utils import TimeDisplay
 
 import GPS
+import Queue
 import re
+import threading
+import traceback
 import types
 from pygps import process_all_events
 from gi.repository import GLib
 import workflows
 
 
+class Cancelled(Exception):
+    """
+    The reason given when rejecting a promise that has been cancelled.
+    This is also the exception raised in a workflow that has been cancelled.
+    """
+    pass
+
+
 class Promise(object):
     """
     A promise is a wrapper object around an asynchronous computation.
@@ -61,6 +72,9 @@ class Promise(object):
         # The following call is not blocking at all
         query_from_server(...).then(when_query_is_done)
 
+    A client no longer interested in the result can call `cancel()`. The
+    creator of the promise can use `on_cancel` to stop the computation when
+    that happens (for instance, to kill a process).
     """
 
     PENDING = -1
@@ -71,6 +85,8 @@ class Promise(object):
         self.__success = []  # Called when the promise is resolved
         self.__failure = []  # Called when the promise is rejected
         self.__result = None   # The result of the promise
+        self.__cancel = []   # Called when the promise is cancelled
+        self.__consumers = 0   # Promises derived from this one by then()
         self._state = Promise.PENDING
 
     def then(self, success=None, failure=None):
@@ -109,6 +125,7 @@ class Promise(object):
            be used to resolve the result of `then`.
         """
         ret = Promise()
+        self._add_consumer(ret)
 
         def __fullfill(value):
             ret.resolve(success(value) if success else value)
@@ -146,6 +163,7 @@ class Promise(object):
                 # only called once.
                 self.__success = None
                 self.__failure = None
+                self.__cancel = None
 
     def reject(self, reason=None):
         """
@@ -160,6 +178,52 @@ class Promise(object):
 
             self.__success = None
             self.__failure = None
+            self.__cancel = None
+
+    def _add_consumer(self, derived):
+        """
+        Record that derived was created from self. Once all the promises
+        created from self have been cancelled, self is cancelled too: the
+        computation is only stopped when nobody needs its result anymore.
+        """
+        def on_derived_cancelled():
+            self.__consumers -= 1
+            if self.__consumers == 0:
+                self.cancel()
+
+        if self._state == Promise.PENDING:
+            self.__consumers += 1
+            derived.on_cancel(on_derived_cancelled)
+
+    def on_cancel(self, callback):
+        """
+        Register a function to call when the promise is cancelled while it
+        is still pending. This is used by the creator of the promise to stop
+        the asynchronous computation.
+
+        :param callback: a function with no argument
+        :return: self, for chaining
+        """
+        if self._state == Promise.PENDING:
+            self.__cancel.append(callback)
+        return self
+
+    def cancel(self):
+        """
+        Called by a client of the promise which is no longer interested in
+        its result. This stops the computation if its creator supports it
+        (see `on_cancel`), and rejects the promise with a `Cancelled`
+        exception, unless it has been resolved in the meantime.
+        Cancelling a promise returned by `then` also cancels the promise it
+        was created from, once all the promises returned by `then` for it
+        have been cancelled.
+        """
+        if self._state == Promise.PENDING:
+            callbacks = self.__cancel
+            self.__cancel = []
+            for c in callbacks:
+                c()
+            self.reject(Cancelled())
 
 
 class Stream(Promise):
@@ -218,10 +282,12 @@ class Stream(Promise):
         :returntype: a Stream
         """
         out = Stream()
-        self.subscribe(
-            onnext=lambda value: out.emit(transform(value)),
-            oncompleted=lambda value: out.resolve(value),
-            onerror=lambda reason: out.reject(reason))
+        if self._state == Promise.PENDING:
+            self._onnext.append(lambda value: out.emit(transform(value)))
+
+        # Cancelling out cancels self only if it has no other consumer
+        out.on_cancel(self.then(success=out.resolve,
+                                failure=out.reject).cancel)
         return out
 
     def flatMap(self, transform):
@@ -243,10 +309,12 @@ class Stream(Promise):
                 transform.oncompleted(out, value)
             out.resolve(value)
 
-        self.subscribe(
-            onnext=lambda value: transform(out, value),
-            oncompleted=oncompleted,
-            onerror=lambda reason: out.reject(reason))
+        if self._state == Promise.PENDING:
+            self._onnext.append(lambda value: transform(out, value))
+
+        # Cancelling out cancels self only if it has no other consumer
+        out.on_cancel(self.then(success=oncompleted,
+                                failure=out.reject).cancel)
         return out
 
 
@@ -279,6 +347,8 @@ def join(*args):
             # executed when func1 and func2 have both terminated.
             # a == (2, 4)
 
+    Cancelling the returned promise cancels all of the promises.
+
     :param List(Promise) *args: promises to wait on
     """
     p = Promise()
@@ -297,11 +367,18 @@ def join(*args):
             if _Resolver._count == len(args):
                 p.resolve(self._result)
 
+    waited = []
     for idx, a in enumerate(args):
         if isinstance(a, types.GeneratorType):
             a = workflows.driver(a)
+        waited.append(a)
         a.then(_Resolver(idx))
 
+    def _cancel():
+        for a in waited:
+            a.cancel()
+
+    p.on_cancel(_cancel)
     return p
 
 
@@ -340,6 +417,103 @@ def wait_idle():
     return p
 
 
+def wait_until(condition, hooks=(), timeout=0, poll=500, delay=0):
+    """
+    This primitive allows the writer of a workflow to wait until
+    `condition()` returns True. The condition is checked again in an idle
+    callback each time one of `hooks` is run, so the workflow resumes as
+    soon as the event it waits for occurs:
+
+        yield wait_until(lambda: GPS.MDI.get("Locations") is not None,
+                         hooks=("mdi_child_selected", ))
+
+    In case the condition changes without running any of these hooks, it
+    is also checked periodically: shortly at first, then with growing
+    delays up to `poll` milliseconds (or never if `poll` is 0).
+
+    :param condition: a function with no argument
+    :param list[str] hooks: the hooks that might change the condition
+    :param int timeout: the maximum number of milliseconds to wait, or 0
+       to wait forever
+    :param int poll: the maximal delay between two checks of the condition,
+       in milliseconds
+    :param int delay: if not 0, the condition is first checked after this
+       many milliseconds rather than immediately, to give a chance to the
+       events it depends on to start (for instance a task spawned by the
+       previous action)
+    :return: a promise resolved with the last value of `condition()`,
+       which is only false if the timeout expired
+    """
+    p = Promise()
+    sources = {}
+    connected = []
+    interval = [10]
+
+    def stop():
+        for name in connected:
+            GPS.Hook(name).remove(on_hook)
+        del connected[:]
+        for source in sources.itervalues():
+            GLib.source_remove(source)
+        sources.clear()
+
+    def check(source_name):
+        # The source that runs this check is removed when it returns False
+        sources.pop(source_name, None)
+        value = condition()
+        if value:
+            stop()
+            p.resolve(value)
+        elif source_name == 'poll':
+            interval[0] = min(interval[0] * 2, poll)
+            sources['poll'] = GLib.timeout_add(
+                interval[0], check, 'poll')
+        return False
+
+    def on_timeout():
+        sources.pop('timeout', None)
+        stop()
+        p.resolve(condition())
+        return False
+
+    def on_hook(hook, *args):
+        # Hooks are often run before the change is complete (for instance
+        # task_finished is run before the task is removed from the list).
+        if 'idle' not in sources:
+            sources['idle'] = GLib.idle_add(check, 'idle')
+
+    def start():
+        sources.pop('delay', None)
+        value = condition()
+        if value:
+            stop()
+            p.resolve(value)
+            return False
+
+        for name in hooks:
+            GPS.Hook(name).add(on_hook)
+            connected.append(name)
+        if poll:
+            sources['poll'] = GLib.timeout_add(interval[0], check, 'poll')
+        return False
+
+    if delay:
+        sources['delay'] = GLib.timeout_add(delay, start)
+    else:
+        start()
+        if p._state != Promise.PENDING:
+            return p
+
+    if timeout:
+        sources['timeout'] = GLib.timeout_add(timeout, on_timeout)
+    p.on_cancel(stop)
+    return p
+
+
+task_hooks = ("task_started", "task_finished")
+# The hooks run when the list of background tasks changes
+
+
 known_tasks = ["debugger output monitor 1", "refreshing Runtime menu"]
 # List of background tasks that are known to be running in the background
 
@@ -358,14 +532,13 @@ def wait_tasks(other_than=None):
     p = Promise()
     filt = other_than or []
 
-    def timeout_handler():
-        if not filter(lambda x: x.name() not in filt, GPS.Task.list()):
-            process_all_events()
-            GLib.idle_add(lambda: p.resolve())
-            return False
-        return True   # will try again
+    def on_no_task(value):
+        process_all_events()
+        GLib.idle_add(lambda: p.resolve())
 
-    GLib.timeout_add(200, timeout_handler)
+    wait_until(
+        lambda: not filter(lambda x: x.name() not in filt, GPS.Task.list()),
+        hooks=task_hooks, delay=200).then(on_no_task)
     return p
 
 
@@ -375,14 +548,10 @@ def wait_specific_tasks(names):
     are terminated.
     """
     p = Promise()
-
-    def timeout_handler():
-        if not filter(lambda x: x.name() in names, GPS.Task.list()):
-            GLib.idle_add(lambda: p.resolve())
-            return False
-        return True   # will try again
-
-    GLib.timeout_add(200, timeout_handler)
+    wait_until(
+        lambda: not filter(lambda x: x.name() in names, GPS.Task.list()),
+        hooks=task_hooks, delay=200).then(
+        lambda value: GLib.idle_add(lambda: p.resolve()))
     return p
 
 
@@ -458,6 +627,220 @@ def hook(hook_name, debounced=False):
     return p
 
 
+class _Job(object):
+    """
+    A function to run in a worker thread of an `Executor`.
+    """
+
+    def __init__(self, fn, args, kwargs):
+        self.fn = fn
+        self.args = args
+        self.kwargs = kwargs
+        self.promise = Promise()
+        self.promise.on_cancel(self.__cancel)
+        self.cancelled = False
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+        self.traceback = None
+        self.task = None
+
+    def run(self):
+        """
+        Called in the worker thread. This must not call any of the functions
+        exported by GPS, which are not thread safe.
+        """
+        if self.cancelled:
+            # Cancelled while waiting for a worker
+            self.done.set()
+            return
+
+        try:
+            self.result = self.fn(*self.args, **self.kwargs)
+        except Exception as e:
+            self.error = e
+            self.traceback = traceback.format_exc()
+
+        self.done.set()
+
+        # Resolve the promise in the main loop, where its callbacks can
+        # safely call GPS.
+        GLib.idle_add(self.__resolve)
+
+    def __cancel(self):
+        # The thread itself cannot be stopped: only its result is ignored
+        self.cancelled = True
+
+    def __resolve(self):
+        if self.cancelled:
+            # The promise has already been rejected
+            return False
+
+        if self.error is not None:
+            GPS.Logger("PROMISES").log(
+                "Exception in %s: %s" % (self.fn.__name__, self.traceback))
+            self.promise.reject(self.error)
+        else:
+            self.promise.resolve(self.result)
+        return False
+
+    def execute(self, task):
+        """
+        The function of the GPS.Task that shows the job in the Tasks view.
+        It waits a little for the job, which gives the worker threads a
+        chance to get the python interpreter lock.
+        """
+        if self.cancelled or self.done.wait(Executor.slice_ms / 1000.0):
+            return GPS.Task.SUCCESS
+        return GPS.Task.EXECUTE_AGAIN
+
+
+class Executor(object):
+    """
+    A bounded pool of worker threads, to run CPU-heavy python code (for
+    instance parsing a large file) without freezing GPS.
+    At most `max_workers` jobs run at the same time, the others wait for a
+    free worker. Each job is shown in the Tasks view until it terminates.
+
+    The jobs must not call any of the functions exported by GPS, which can
+    only be used from the main thread. Only pure python computation should
+    be done in the jobs, and their result used once the promise is resolved.
+    """
+
+    slice_ms = 5
+    # How long the task of a job waits for it, every time the task is
+    # executed by GPS.
+
+    def __init__(self, max_workers=2):
+        """
+        :param int max_workers: the maximum number of jobs running in
+           parallel.
+        """
+        self.max_workers = max_workers
+        self.__queue = Queue.Queue()
+        self.__workers = []
+
+    def __worker(self):
+        while True:
+            job = self.__queue.get()
+            job.run()
+
+    def submit(self, fn, *args, **kwargs):
+        """
+        Run fn(*args, **kwargs) in one of the worker threads.
+
+        :return: a promise, resolved in the main loop with the value
+           returned by `fn`, or rejected with the exception it raised.
+           Cancelling the promise prevents `fn` from running if it hasn't
+           started yet.
+        """
+        if not self.__workers:
+            for _ in range(self.max_workers):
+                t = threading.Thread(target=self.__worker)
+                t.daemon = True   # do not prevent GPS from exiting
+                t.start()
+                self.__workers.append(t)
+
+        job = _Job(fn, args, kwargs)
+        job.task = GPS.Task(fn.__name__, job.execute, active=False)
+        self.__queue.put(job)
+        return job.promise
+
+
+_executor = None
+# The executor used by run_in_executor
+
+
+def run_in_executor(fn, *args, **kwargs):
+    """
+    This primitive allows the writer of a workflow to run a CPU-heavy
+    function in a worker thread, without blocking GPS, and get its return
+    value:
+
+        def parse(filename):
+            # pure python code, which doesn't call GPS
+            ...
+            return result
+
+        def my_workflow():
+            result = yield run_in_executor(parse, filename)
+
+    :return: a promise, see `Executor.submit`
+    """
+    global _executor
+    if _executor is None:
+        _executor = Executor()
+    return _executor.submit(fn, *args, **kwargs)
+
+
+class LineSplitter(object):
+    """
+    A transform for `Stream.flatMap`, which splits the output of a stream
+    into lines. Each chunk of output is split only once, and only the last,
+    incomplete, line of a chunk is kept until the next chunk arrives, so
+    the cost is linear in the size of the output.
+    The lines do not include the trailing newline.
+    """
+
+    def __init__(self, batch=False, separator="\n"):
+        """
+        :param bool batch: if True, emit one list of lines per chunk,
+           rather than one event per line.
+        :param str separator: the string that terminates each line, for
+           instance "\\0" for the output of "git status -z".
+        """
+        self.batch = batch
+        self.separator = separator
+
+        # The pieces of the current incomplete line. These are only joined
+        # once the line is complete, to avoid copying a long line every
+        # time a chunk is received.
+        self.__partial = []
+
+    def __emit(self, out_stream, lines):
+        if self.batch:
+            out_stream.emit(lines)
+        else:
+            for line in lines:
+                out_stream.emit(line)
+
+    def __call__(self, out_stream, output):
+        if not output:
+            return
+
+        lines = output.split(self.separator)
+        last = lines.pop()
+
+        if lines:
+            if self.__partial:
+                self.__partial.append(lines[0])
+                lines[0] = "".join(self.__partial)
+                self.__partial = []
+            self.__emit(out_stream, lines)
+
+        if last:
+            self.__partial.append(last)
+
+    def oncompleted(self, out_stream, status):
+        if self.__partial:
+            self.__emit(out_stream, ["".join(self.__partial)])
+            self.__partial = []
+
+
+def split_lines(stream, batch=False, separator="\n"):
+    """
+    Return a stream that emits the lines of the output emitted by `stream`,
+    and that is resolved when `stream` is resolved.
+
+    :param Stream stream: the stream of output, for instance the `stream`
+       property of a `ProcessWrapper`.
+    :param bool batch: if True, the result emits lists of lines.
+    :param str separator: the string that terminates each line.
+    :returntype: a Stream
+    """
+    return stream.flatMap(LineSplitter(batch=batch, separator=separator))
+
+
 class ProcessWrapper(object):
     """
     ProcessWrapper is an advanced process manager
@@ -475,6 +858,9 @@ class ProcessWrapper(object):
             p = ProcessWrapper(['ls'])
             status, output = yield p.wait_until_terminate()
 
+    Cancelling any of the promises returned by a ProcessWrapper (for
+    instance because the workflow waiting on it was cancelled) interrupts
+    the process.
     """
 
     def __init__(self, cmdargs=[], spawn_console=False,
@@ -513,11 +899,23 @@ class ProcessWrapper(object):
         # the stream that includes all output from the process
         self.__stream = None
 
-        # __current_pattern = regexp that user waiting for in the output
+        # __current_pattern = regexp that user waiting for in the output,
+        # or None when waiting for the next line (see wait_line)
         self.__current_pattern = None
 
-        # __output = a buffer for current output of self.__process
+        # __output = a buffer for current output of self.__process. The
+        # text before __offset has already been consumed by a match.
         self.__output = ""
+        self.__offset = 0
+
+        # __scanned = offset up to which __output is known to contain no
+        # newline, so that wait_line doesn't search the same text again.
+        self.__scanned = 0
+
+        # Whether we are already resolving promises. This is used to
+        # resolve the waits queued while resolving in a loop rather than
+        # through recursive calls.
+        self.__resolving = False
 
         # __whether process has finished
         self.finished = False
@@ -607,8 +1005,7 @@ class ProcessWrapper(object):
         Called by GPS everytime there's output coming
         """
         if self.__current_promise is not None:
-            self.__output += unmatch
-            self.__output += match
+            self.__output += unmatch + match
             self.__check_pattern_and_resolve()
         if self.__stream is not None:
             self.__stream.emit(unmatch)
@@ -623,19 +1020,71 @@ class ProcessWrapper(object):
             self.__current_promise = None  # garbage collect
             p.resolve(value)
 
+    def __compact_output(self):
+        """
+        Discard the part of the output that has already been consumed.
+        """
+        if self.__offset:
+            self.__output = self.__output[self.__offset:]
+            self.__scanned = max(0, self.__scanned - self.__offset)
+            self.__offset = 0
+
+    def __find_match(self):
+        """
+        Search for the current pattern in the output that has not been
+        consumed yet.
+
+        :return: the matched text and the offset of its end, or None.
+        """
+        if self.__current_pattern is None:
+            # Waiting for a line: no need for a regexp
+            eol = self.__output.find(
+                "\n", max(self.__offset, self.__scanned))
+            if eol == -1:
+                self.__scanned = len(self.__output)
+                return None
+            return self.__output[self.__offset:eol + 1], eol + 1
+
+        # The regexp might use '^', which only matches at the start of the
+        # searched string or after a newline.
+        if self.__offset and self.__output[self.__offset - 1] != "\n":
+            self.__compact_output()
+
+        p = self.__current_pattern.search(self.__output, self.__offset)
+        if p:
+            return p.group(0), p.end(0)
+        return None
+
     def __check_pattern_and_resolve(self):
         """
         Check whether the current pattern matches the already known output
         of the tool, and resolve the promise if possible.
+        Resolving the promise often results in a new call to
+        wait_until_match or wait_line: these are resolved in the same loop.
         """
-        if self.__current_promise is not None:
-            p = self.__current_pattern.search(self.__output)
-            if p:
-                self.__output = self.__output[p.end(0):]
-                self.__resolve_promise(p.group(0))
-            elif self.finished:
-                # We will never be able to match anyway
-                self.__resolve_promise(None)
+        if self.__resolving:
+            return
+
+        self.__resolving = True
+        try:
+            while self.__current_promise is not None:
+                is_line = self.__current_pattern is None
+                found = self.__find_match()
+                if found:
+                    text, self.__offset = found
+                    self.__resolve_promise(text[:-1] if is_line else text)
+                elif self.finished:
+                    # We will never be able to match anyway
+                    self.__resolve_promise(None)
+                else:
+                    break
+
+            # Bound the size of the buffer
+            if self.__offset > 65536 and \
+                    self.__offset * 2 > len(self.__output):
+                self.__compact_output()
+        finally:
+            self.__resolving = False
 
     def __on_exit(self, process, status, remaining_output):
         """
@@ -662,6 +1111,13 @@ class ProcessWrapper(object):
         self.finished = not self.__relaunched
         self.__relaunched = False
 
+    def __cancel(self):
+        """
+        Called when one of the promises returned by self is cancelled.
+        """
+        if self.__process is not None:
+            self.terminate()
+
     def wait_until_match(self, pattern, timeout=0):
         """
         Called by user. Make a promise to them that:
@@ -682,19 +1138,28 @@ class ProcessWrapper(object):
             return None
 
         if isinstance(pattern, str):
-            self.__current_pattern = re.compile(pattern, re.MULTILINE)
-        else:
-            self.__current_pattern = pattern
+            pattern = re.compile(pattern, re.MULTILINE)
+
+        return self.__wait(pattern, timeout)
 
+    def __wait(self, pattern, timeout=0):
+        """
+        Create the promise for wait_until_match or wait_line.
+
+        :param re.Pattern|None pattern: the regular expression, or None
+           to wait for the next line.
+        """
+        self.__current_pattern = pattern
         p = self.__current_promise = Promise()
+        p.on_cancel(self.__cancel)
 
         # Can we resolve immediately ?
         self.__check_pattern_and_resolve()
-        if self.__current_promise:
+        if self.__current_promise is p:
             # if user defines a timeout, set up to
             # close output check after that timeout
             if timeout > 0:
-                GLib.timeout_add(timeout, self.__on_timeout)
+                GLib.timeout_add(timeout, self.__on_timeout, p)
 
         return p
 
@@ -706,15 +1171,12 @@ class ProcessWrapper(object):
 
         :return: a promise
         """
-        p = Promise()
-
-        s = self.wait_until_match("^.*\n")
-        if s is None:
+        if self.finished:
+            p = Promise()
             p.resolve(None)   # already finished
-        else:
-            s.then(lambda line: p.resolve(line[:-1] if line else None))
+            return p
 
-        return p
+        return self.__wait(None)
 
     @property
     def stream(self):
@@ -736,6 +1198,7 @@ class ProcessWrapper(object):
         """
         if self.__stream is None:
             self.__stream = Stream()
+            self.__stream.on_cancel(self.__cancel)
         return self.__stream
 
     @property
@@ -775,25 +1238,19 @@ class ProcessWrapper(object):
            the output.
         """
 
-        class map_to_line:
-            def __init__(self):
-                self.buffer = ""
-                self.__re = re.compile('^.*\n')
+        return split_lines(self.stream)
 
-            def __call__(self, out_stream, output):
-                self.buffer += output
-                while True:
-                    p = self.__re.search(self.buffer)
-                    if not p:
-                        break
-                    out_stream.emit(p.group(0)[:-1])
-                    self.buffer = self.buffer[p.end(0):]
-
-            def oncompleted(self, out_stream, status):
-                if self.buffer:
-                    out_stream.emit(self.buffer)
+    @property
+    def line_batches(self):
+        """
+        Similar to `lines`, but emits lists of lines: one list per chunk
+        of output received from the process. This is more efficient when
+        the process has a large output, since subscribers are called once
+        per chunk rather than once per line.
 
-        return self.stream.flatMap(map_to_line())
+        :returntype: a stream
+        """
+        return split_lines(self.stream, batch=True)
 
     def wait_until_terminate(self, show_if_error=False):
         """
@@ -807,6 +1264,7 @@ class ProcessWrapper(object):
            Messages window.
         """
         p = Promise()
+        p.on_cancel(self.__cancel)
         output = []
 
         def on_terminate(status):
@@ -822,12 +1280,13 @@ class ProcessWrapper(object):
             oncompleted=on_terminate)
         return p
 
-    def __on_timeout(self):
+    def __on_timeout(self, promise):
         """
         Called by GPS when it's timeout for a pattern to appear in output.
         """
-        self.__resolve_promise(None)
-        self.__current_pattern = None
+        # Ignore the timeout if the promise has already been resolved
+        if self.__current_promise is promise:
+            self.__resolve_promise(None)
         return False
 
     def terminate(self):
@@ -847,6 +1306,16 @@ class ProcessWrapper(object):
                     "\n<^C> process interrupted (elapsed time: %s)\n" %
                     TimeDisplay.get_elapsed(self.__start_time, end_time))
 
+    def send(self, text, add_lf=True):
+        """
+        Send some text on the standard input of the process.
+
+        :param str text: the text to send
+        :param bool add_lf: whether to add a newline after the text
+        """
+        if not self.finished and self.__process is not None:
+            self.__process.send(text, add_lf=add_lf)
+
     def __on_console_destroy(self, console):
         """
         Called when the console is being destroyed.
@@ -5,14 +5,22 @@ from drivers import GPSTestDriver
 import os
 import difflib
 import glob
+import json
+import queue
 import shutil
+import subprocess
 import tempfile
+import threading
 
 GPS_DEV = "GPS_DEV"
 # The name of the environment variable to position: if this is set, assume
 # that tests are being run by a GPS developer, and capture the results in
 # the directory pointed by this
 
+GNATSTUDIO_HOME = os.path.abspath(
+    os.path.join(os.path.dirname(__file__), "..", "gnatstudio_home"))
+# The initial contents of the .gnatstudio directory of the tests
+
 
 class Xvfb(object):
     def __init__(self, num):
@@ -76,6 +84,141 @@ class XvfbRegistry(object):
 Xvfbs = XvfbRegistry()
 
 
+class WarmInstance(object):
+    """A GNAT Studio that runs tests one after the other, see
+       gs_utils/internal/warm_server.py
+    """
+
+    def __init__(self, gs, env, timeout):
+        """Start GNAT Studio, and wait until it is ready to run tests.
+
+        PARAMETERS
+          gs: the gnatstudio executable
+          env: the environment variables to add
+          timeout: how long to wait for the startup, in seconds
+        """
+        self.home = tempfile.mkdtemp(prefix="gs_warm_")
+        sync_tree(GNATSTUDIO_HOME, os.path.join(self.home, ".gnatstudio"),
+                  delete=False)
+
+        full_env = dict(os.environ)
+        full_env.update(env)
+        full_env["GNATSTUDIO_HOME"] = self.home
+        self.process = subprocess.Popen(
+            [gs, "--eval=python:import gs_utils.internal.warm_server"],
+            cwd=self.home,
+            env=full_env,
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.STDOUT,
+        )
+
+        self.lines = queue.Queue()
+        reader = threading.Thread(target=self.__read)
+        reader.daemon = True
+        reader.start()
+
+        self.last_id = 0
+        self.ready = self.__read_until(["@@WARM_READY"], timeout) is not None
+
+    def __read(self):
+        for line in self.process.stdout:
+            self.lines.put(line.decode("utf-8", errors="replace"))
+        self.lines.put(None)
+
+    def __read_until(self, marker, timeout):
+        """Return the lines read until the one whose first words are
+           marker, included, or None if GNAT Studio died or the timeout
+           expired.
+        """
+        result = []
+        try:
+            while True:
+                line = self.lines.get(timeout=timeout)
+                if line is None:
+                    return None
+                result.append(line)
+                if line.split()[:len(marker)] == marker:
+                    return result
+        except queue.Empty:
+            return None
+
+    def run_test(self, working_dir, script, project, timeout):
+        """Run a test.
+
+        RETURN
+          a tuple (status, output), or None if GNAT Studio died or the
+          timeout expired
+        """
+        self.last_id += 1
+        request = {
+            "id": self.last_id,
+            "dir": os.path.abspath(working_dir),
+            "script": script,
+            "project": os.path.abspath(project),
+        }
+        try:
+            self.process.stdin.write((json.dumps(request) + "\n").encode())
+            self.process.stdin.flush()
+        except OSError:
+            return None
+
+        test_id = str(self.last_id)
+        if self.__read_until(["@@WARM_BEGIN", test_id], timeout) is None:
+            return None
+        lines = self.__read_until(["@@WARM_END", test_id], timeout)
+        if lines is None:
+            return None
+        status = int(lines.pop().split()[2])
+        return (status, "".join(lines))
+
+    def stop(self):
+        if self.process.poll() is None:
+            self.process.kill()
+        self.process.wait()
+        shutil.rmtree(self.home, ignore_errors=True)
+
+
+class WarmRegistry(object):
+    """ A class to hold the warm GNAT Studio instances, one per slot """
+
+    def __init__(self):
+        self.instances = {}
+        self.lock = threading.Lock()
+
+    def get(self, slot, gs, env, timeout):
+        """ Return the instance for the given slot, starting it if needed,
+            or None if it could not be started.
+        """
+        with self.lock:
+            instance = self.instances.get(slot)
+        if instance is None:
+            instance = WarmInstance(gs, env, timeout)
+            if not instance.ready:
+                instance.stop()
+                return None
+            with self.lock:
+                self.instances[slot] = instance
+        return instance
+
+    def discard(self, slot):
+        """ Stop the instance for the given slot, after an error """
+        with self.lock:
+            instance = self.instances.pop(slot, None)
+        if instance is not None:
+            instance.stop()
+
+    def stop_all(self):
+        with self.lock:
+            instances = list(self.instances.values())
+            self.instances = {}
+        for instance in instances:
+            instance.stop()
+
+
+WarmInstances = WarmRegistry()
+
+
 class BasicTestDriver(GPSTestDriver):
     """ Each test should have:
           - a test.yaml containing
@@ -87,6 +230,9 @@ class BasicTestDriver(GPSTestDriver):
             If the execution returns code 100, it's an XFAIL.
     """
 
+    timeout = 120
+    # The time after which the test is killed, in seconds
+
     def add_test(self, dag):
         self.add_fragment(dag, "prepare")
         self.add_fragment(dag, "run", after=["prepare"])
@@ -101,11 +247,7 @@ class BasicTestDriver(GPSTestDriver):
         mkdir(self.gps_home)
 
         # Populate the .gnatstudio dir
-        sync_tree(
-            os.path.abspath(os.path.join(testsuite_dir, "gnatstudio_home")),
-            self.gps_home,
-            delete=False,
-        )
+        sync_tree(GNATSTUDIO_HOME, self.gps_home, delete=False)
         if self.env.options.pycov:
             cp(os.path.join(testsuite_dir, "pycov_data", "pycov_startup.xml"),
                os.path.join(self.gps_home, "startup.xml"),)
@@ -134,6 +276,86 @@ class BasicTestDriver(GPSTestDriver):
                 )
         return printed
 
+    def gs_env(self, gs, slot):
+        """Return the environment variables to set when running the test.
+
+        PARAMETERS
+          gs: the gnatstudio executable
+          slot: the slot in which the test runs
+        """
+        env = {
+            "GNATSTUDIO_HOME": self.test_env["working_dir"],
+            "GNATINSPECT": shutil.which("gnatinspect") + " --exit",
+            "GNATSTUDIO": gs,
+            "GPS": gs,
+            "GPS_WRAPPER": " ".join(self.env.valgrind_cmd),
+            "GNATSTUDIO_PYTHON_COV": self.test_env["pycov"],
+        }
+
+        env.update(Xvfbs.get_env(slot))
+        return env
+
+    def check_result(self, working_dir):
+        """Additional checks, once the status of the test is known.
+
+        RETURN
+          True if the test failed these checks
+        """
+        return False
+
+    def _warm_project(self):
+        """Return the project to load when running the test in a warm
+           instance of GNAT Studio, or None if it needs to be run in a
+           GNAT Studio of its own.
+        """
+        # Only the tests marked as safe for it: a test might change state
+        # that cannot be reset before the next one
+        if (
+            not self.env.options.warm
+            or not self.test_env.get("warm")
+            or self.env.valgrind_cmd
+            or self.test_env["pycov"]
+            or "GPS_PREVENT_EXIT" in os.environ
+        ):
+            return None
+
+        # Tests run by a test.cmd might pass switches to GNAT Studio,
+        # and tests with their own .gnatstudio need their own home
+        wd = self.test_env["working_dir"]
+        if os.path.exists(os.path.join(wd, "test.cmd")) or os.path.isdir(
+            os.path.join(self.test_env["test_dir"], ".gnatstudio")
+        ):
+            return None
+
+        # Without a project, or with several ones, the project loaded at
+        # startup cannot be reproduced
+        projects = glob.glob(os.path.join(wd, "*.gpr"))
+        if len(projects) != 1:
+            return None
+        return projects[0]
+
+    def _run_warm(self, gs, env, project, slot, timeout):
+        """Run the test in the warm instance of GNAT Studio for this slot.
+
+        RETURN
+          a tuple (status, output), or None if the test should be run
+          with a cold start instead
+        """
+        instance_env = dict(env)
+        del instance_env["GNATSTUDIO_HOME"]
+        instance = WarmInstances.get(slot, gs, instance_env, timeout)
+        if instance is None:
+            return None
+
+        result = instance.run_test(
+            self.test_env["working_dir"], "test.py", project, timeout)
+        if result is None:
+            # GNAT Studio crashed or the test is stuck: the state left by
+            # the previous tests might be the cause, so start again from
+            # scratch.
+            WarmInstances.discard(slot)
+        return result
+
     def run(self, previous_values, slot):
         # Check whether the test should be skipped
         skip = self.should_skip()
@@ -175,41 +397,42 @@ class BasicTestDriver(GPSTestDriver):
                 # run the script directly
                 cmd_line = [GS, "--load=python:test.py"]
 
-        env = {
-            "GNATSTUDIO_HOME": self.test_env["working_dir"],
-            "GNATINSPECT": shutil.which("gnatinspect") + " --exit",
-            "GNATSTUDIO": GS,
-            "GPS": GS,
-            "GPS_WRAPPER": " ".join(self.env.valgrind_cmd),
-            "GNATSTUDIO_PYTHON_COV": self.test_env["pycov"],
-        }
-
-        env.update(Xvfbs.get_env(slot))
+        env = self.gs_env(GS, slot)
 
-        process = Run(
-            cmd_line,
-            cwd=wd,
-            timeout=(
-                None
-                if "GPS_PREVENT_EXIT" in os.environ
-                else (120 * self.env.wait_factor)
-            ),
-            env=env,
-            ignore_environ=False,
+        timeout = (
+            None
+            if "GPS_PREVENT_EXIT" in os.environ
+            else (self.timeout * self.env.wait_factor)
         )
-        output = process.out
+
+        result = None
+        project = self._warm_project()
+        if project is not None:
+            result = self._run_warm(GS, env, project, slot, timeout)
+
+        if result is None:
+            process = Run(
+                cmd_line,
+                cwd=wd,
+                timeout=timeout,
+                env=env,
+                ignore_environ=False,
+            )
+            result = (process.status, process.out)
+
+        status, output = result
 
         if output:
             # If there's an output, capture it
             self.result.out = output
 
         is_error = False
-        if process.status:
+        if status:
             # Nonzero status?
-            if process.status == 100:
+            if status == 100:
                 # This one is an xfail
                 self.result.set_status(TestStatus.XFAIL)
-            elif process.status == 99:
+            elif status == 99:
                 # This is intentionally deactivated in this configuration
                 self.result.set_status(TestStatus.SKIP)
             else:
@@ -245,6 +468,9 @@ class BasicTestDriver(GPSTestDriver):
                 # ... and no output: that's a PASS
                 self.result.set_status(TestStatus.PASS)
 
+        if self.check_result(wd):
+            is_error = True
+
         if is_error:
             if self.result.out is None:
                 self.result.out = self._capture_for_developers()
@@ -0,0 +1,135 @@
+from e3.testsuite.result import TestStatus
+from drivers import TESTSUITE_ROOT_DIR
+from drivers.basic import BasicTestDriver
+import json
+import os
+import threading
+
+DEFAULT_BASELINE = os.path.join(TESTSUITE_ROOT_DIR, "perf", "baseline.json")
+# The measures to compare to, for each scenario
+
+MIN_TIMING_DELTA = 0.05
+# Timings closer to the baseline than this, in seconds, are considered as
+# noise, whatever the tolerance
+
+baseline_lock = threading.Lock()
+# The baseline file is updated by several jobs
+
+
+def load_baseline(filename):
+    if not os.path.exists(filename):
+        return {}
+    with open(filename) as f:
+        return json.load(f)
+
+
+def compare(measures, baseline, tolerance):
+    """Compare the measures of a scenario to its baseline.
+
+    PARAMETERS
+      measures, baseline: dicts as written by record_perf in perf.json
+      tolerance: the accepted increase, as a fraction of the baseline
+
+    RETURN
+      the list of regressions, as strings
+    """
+    regressions = []
+    base_timings = baseline.get("timings", {})
+
+    for name, t in sorted(measures.get("timings", {}).items()):
+        base = base_timings.get(name)
+        if (
+            base is not None
+            and t > base * (1 + tolerance)
+            and t - base > MIN_TIMING_DELTA
+        ):
+            regressions.append(
+                "{}: {:.3f}s, baseline {:.3f}s (+{:.0f}%)".format(
+                    name, t, base, (t / base - 1) * 100 if base else 100
+                )
+            )
+
+    rss = measures.get("peak_rss_kb")
+    base_rss = baseline.get("peak_rss_kb")
+    if rss is not None and base_rss and rss > base_rss * (1 + tolerance):
+        regressions.append(
+            "peak RSS: {}kB, baseline {}kB (+{:.0f}%)".format(
+                rss, base_rss, (float(rss) / base_rss - 1) * 100
+            )
+        )
+    return regressions
+
+
+class PerfTestDriver(BasicTestDriver):
+    """ A scenario of the performance testsuite, in the perf directory.
+        In addition to what BasicTestDriver expects:
+
+          - test.yaml should contain
+                driver: perf
+
+          - test.py should record its timings with
+            gs_utils.internal.utils.record_perf. They are compared, along
+            with the peak memory usage of GNAT Studio, to the baseline
+            (perf/baseline.json by default), and the test fails if one of
+            them regressed by more than the tolerance. A scenario that has
+            no baseline yet is reported as XFAIL.
+
+        With --perf-update-baseline, the measures are saved as the new
+        baseline instead.
+    """
+
+    timeout = 600
+    # Some scenarios need to generate large inputs first
+
+    def gs_env(self, gs, slot):
+        env = super(PerfTestDriver, self).gs_env(gs, slot)
+        # See run_test_driver
+        env["GPS_RLIMIT_SECONDS"] = str(self.timeout * self.env.wait_factor)
+        return env
+
+    def _warm_project(self):
+        # The memory usage of a warm instance depends on the previous tests
+        return None
+
+    def check_result(self, working_dir):
+        if self.result.status != TestStatus.PASS:
+            return False
+
+        perf_json = os.path.join(working_dir, "perf.json")
+        if not os.path.exists(perf_json):
+            self.result.out = "perf.json was not written, see record_perf"
+            self.result.set_status(TestStatus.FAIL)
+            return True
+
+        with open(perf_json) as f:
+            measures = json.load(f)
+
+        name = self.test_env["test_name"]
+        options = self.env.options
+        filename = options.perf_baseline or DEFAULT_BASELINE
+
+        with baseline_lock:
+            baseline = load_baseline(filename)
+            if options.perf_update_baseline:
+                baseline[name] = measures
+                with open(filename, "w") as f:
+                    json.dump(baseline, f, indent=1, sort_keys=True)
+                    f.write("\n")
+                return False
+
+        if name not in baseline:
+            # Nothing to compare to: this must not be reported as a PASS
+            self.result.out = (
+                "no baseline for {}, run --perf-update-baseline".format(name)
+            )
+            self.result.set_status(TestStatus.XFAIL)
+            return False
+
+        regressions = compare(measures, baseline[name], options.perf_tolerance)
+        if regressions:
+            self.result.out = "Performance regressions:\n{}\n".format(
+                "\n".join(regressions)
+            )
+            self.result.set_status(TestStatus.FAIL)
+            return True
+        return False
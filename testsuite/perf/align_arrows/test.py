@@ -0,0 +1,30 @@
+"""
+Align the arrows of a 5k lines aggregate.
+"""
+import time
+from GPS import *
+from gs_utils.internal.utils import *
+
+NB_LINES = 5000
+
+
+@run_test_driver
+def driver():
+    with open("big.adb", "w") as f:
+        f.write("procedure Big is\nbegin\n   Call\n")
+        for j in range(NB_LINES):
+            f.write("     %s%s => %d%s\n" % (
+                "(" if j == 0 else " ", "P" * (1 + j % 30) + str(j), j,
+                ");" if j == NB_LINES - 1 else ","))
+        f.write("end Big;\n")
+
+    buf = EditorBuffer.get(File("big.adb"))
+    buf.select(buf.at(4, 1), buf.at(4 + NB_LINES - 1, 1).end_of_line())
+
+    start = time.time()
+    execute_action("Align arrows")
+    record_perf("align", time.time() - start)
+
+    columns = set(line.index("=>")
+                  for line in buf.get_chars().splitlines() if "=>" in line)
+    gps_assert(len(columns), 1, "all the arrows should be aligned")
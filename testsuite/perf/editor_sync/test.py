@@ -0,0 +1,48 @@
+"""
+Replay the edit storm of fuzzers/editor_sync.py with a fixed seed: random
+insertions and deletions in an Ada editor, which need to be sent to the
+language server.
+"""
+import random
+import time
+from GPS import *
+from gs_utils.internal.utils import *
+
+N_OPERATIONS = 1000
+RANDOM_SNIPPET_SIZE_RANGE = 100   # range size of random snippets
+RANDOM_TEXT = ['a', 'b', ';', ' ', '\n']
+
+
+@run_test_driver
+def driver():
+    with open("storm.adb", "w") as f:
+        f.write("procedure Storm is\nbegin\n%send Storm;\n" %
+                "   null;\n" * 2000)
+
+    buf = EditorBuffer.get(File("storm.adb"))
+    g = buf.gtk_text_buffer()
+    yield wait_tasks()
+
+    rand = random.Random(0)
+    start = time.time()
+    for j in range(N_OPERATIONS):
+        biggest_offset = g.get_end_iter().get_offset()
+        if rand.randrange(2):
+            o1 = rand.randrange(biggest_offset + 1)
+            o2 = rand.randrange(biggest_offset + 1)
+            g.delete(g.get_iter_at_offset(o1), g.get_iter_at_offset(o2))
+        else:
+            o = rand.randrange(biggest_offset + 1)
+            g.insert(g.get_iter_at_offset(o), ''.join(
+                [rand.choice(RANDOM_TEXT)
+                 for k in range(rand.randrange(RANDOM_SNIPPET_SIZE_RANGE))]))
+
+        # Let the editor and the language server process the edits from
+        # time to time, as the fuzzer does
+        if j % 10 == 0:
+            yield wait_idle()
+    record_perf("edits", time.time() - start)
+
+    yield wait_tasks()
+    record_perf("sync", time.time() - start)
+    buf.close(force=True)
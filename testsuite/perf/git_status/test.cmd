@@ -0,0 +1,26 @@
+which git > /dev/null 2>&1 || exit 99
+
+NB_DIRS=100
+NB_FILES_PER_DIR=1000
+
+init_repo() {
+  git init
+  git config user.email '<>'
+  git config user.name gps
+  echo 'project prj is for Source_Dirs use ("src/**"); end prj;' > prj.gpr
+  for d in $(seq $NB_DIRS); do
+    mkdir -p src/d$d
+    (cd src/d$d && seq -f "p%g.adb" $NB_FILES_PER_DIR | xargs touch)
+  done
+  git add -A
+  git commit -q -m init
+  # A few local changes, so that the status is not empty
+  for d in $(seq 1 10 $NB_DIRS); do
+    echo '--  modified' >> src/d$d/p1.adb
+    touch src/d$d/new.adb
+  done
+}
+
+init_repo > /dev/null 2>&1
+
+$GPS -P prj.gpr --load=python:test.py
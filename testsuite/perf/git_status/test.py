@@ -0,0 +1,25 @@
+"""
+Compute the git status of a repository of 100k files, all in the project.
+"""
+import time
+from GPS import *
+from gs_utils.internal.utils import *
+
+
+@run_test_driver
+def driver():
+    vcs = GPS.VCS2.active_vcs()
+
+    start = time.time()
+    yield vcs.async_fetch_status_for_all_files(from_user=True)
+    record_perf("status", time.time() - start)
+
+    gps_assert(vcs.get_file_status(File("src/d1/p1.adb"))[0] &
+               GPS.VCS2.Status.MODIFIED,
+               GPS.VCS2.Status.MODIFIED,
+               "p1.adb should be modified")
+
+    # Nothing changed on disk
+    start = time.time()
+    yield vcs.async_fetch_status_for_all_files(from_user=False)
+    record_perf("refresh", time.time() - start)
@@ -0,0 +1,42 @@
+"""
+Open a 50k lines python file, and wait until the python highlighter has
+processed all of it.
+"""
+import time
+from GPS import *
+from gs_utils.internal.utils import *
+from pygps import get_gtk_buffer
+
+NB_LINES = 50000
+
+SNIPPET = '''
+class Class_%(n)d(object):
+    """
+    The docstring of the class, with "quotes" and 'quotes'.
+    """
+
+    def method(self, x=%(n)d):
+        # A comment with a "string"
+        return "%%s: %%d" %% ('value', x + 0x1f)
+'''
+
+
+def is_highlighted(buf):
+    gtk_ed = get_gtk_buffer(buf)
+    return (getattr(gtk_ed, 'highlighting_initialized', False) and
+            not gtk_ed.idle_highlight_id)
+
+
+@run_test_driver
+def driver():
+    nb_lines = SNIPPET.count("\n")
+    with open("big.py", "w") as f:
+        for j in range(NB_LINES / nb_lines):
+            f.write(SNIPPET % {'n': j})
+
+    start = time.time()
+    buf = EditorBuffer.get(File("big.py"))
+    record_perf("open", time.time() - start)
+
+    yield wait_until(lambda: is_highlighted(buf), poll=20)
+    record_perf("highlight", time.time() - start)
@@ -0,0 +1,50 @@
+"""
+Parse a 200MB map file generated by ld, as the Memory Usage view does.
+"""
+import time
+from GPS import *
+from gs_utils.internal.utils import *
+from memory_usage_providers.ld import _parse_map_file
+
+MAP_SIZE = 200 * 1024 * 1024
+
+HEADER = """Memory Configuration
+
+Name             Origin             Length             Attributes
+flash            0x0000000008000000 0x0000000000100000 xr
+sram             0x0000000020000000 0x0000000000020000 xrw
+*default*        0x0000000000000000 0xffffffffffffffff
+
+Linker script and memory map
+
+"""
+
+SECTION = """
+.text.%(n)d      0x%(addr)016x     0x%(size)x
+ .text          0x%(addr)016x     0x%(half)x obj/unit_%(n)d.o
+ .text          0x%(addr2)016x     0x%(half)x lib/libgnat.a(a-%(n)d.o)
+                0x%(addr)016x                unit_%(n)d__proc
+"""
+
+
+@run_test_driver
+def driver():
+    with open("map.txt", "w") as f:
+        f.write(HEADER)
+        written = len(HEADER)
+        n = 0
+        while written < MAP_SIZE:
+            addr = 0x8000000 + (n * 0x40) % 0x100000
+            text = SECTION % {'n': n, 'addr': addr, 'addr2': addr + 0x20,
+                              'size': 0x40, 'half': 0x20}
+            f.write(text)
+            written += len(text)
+            n += 1
+
+    start = time.time()
+    regions, sections, modules = _parse_map_file("map.txt", ".")
+    record_perf("parse", time.time() - start)
+
+    gps_assert(len(regions), 2, "the memory regions should be found")
+    gps_assert(len(sections), n, "all the sections should be found")
+    gps_assert(len(modules), 2 * n, "all the modules should be found")
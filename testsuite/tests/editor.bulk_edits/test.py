@@ -0,0 +1,47 @@
+"""
+Check that the line-oriented editor commands rewrite large buffers in a
+single undoable edit, without moving the cursor or the marks.
+"""
+import time
+from gs_utils.internal.utils import *
+
+NB_LINES = 10000
+
+original = "".join(
+    "\tX%d : Integer := %d;  \n" % (j, j) if j % 2 else "   null;\n"
+    for j in range(NB_LINES))
+
+
+@run_test_driver
+def driver():
+    with open("big.adb", "w") as f:
+        f.write(original)
+
+    b = GS.EditorBuffer.get(GS.File("big.adb"))
+    yield wait_idle()
+
+    untabified = original.replace("\t", " " * b.get_lang().tab_width)
+    stripped = untabified.replace(";  \n", ";\n")
+
+    b.current_view().goto(b.at(NB_LINES / 2, 5))
+    mark = b.at(NB_LINES / 2 + 1, 3).create_mark()
+
+    start = time.time()
+    GS.execute_action("untabify")
+    GS.execute_action("strip trailing blanks")
+    elapsed = time.time() - start
+
+    gps_assert(b.get_chars(), stripped, "wrong result of the bulk edits")
+    gps_assert(elapsed < 5.0, True,
+               "bulk edits took too long: %ss" % elapsed)
+    gps_assert(b.current_view().cursor().line(), NB_LINES / 2,
+               "the cursor should stay on its line")
+    gps_assert(mark.location().line(), NB_LINES / 2 + 1,
+               "the mark should stay on its line")
+
+    b.undo()
+    gps_assert(b.get_chars(), untabified,
+               "strip trailing blanks should be undone at once")
+    b.undo()
+    gps_assert(b.get_chars(), original,
+               "untabify should be undone at once")
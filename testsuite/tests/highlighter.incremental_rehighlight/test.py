@@ -0,0 +1,31 @@
+"""
+Verify that the python highlighter rehighlights the rest of the buffer in
+the background after an edit, and not only the lines close to the edit.
+"""
+from GPS import *
+from gs_utils.internal.utils import *
+
+
+def is_string(buf, line):
+    return "strings_hl" in [o.name() for o in buf.at(line, 1).get_overlays()]
+
+
+@run_test_driver
+def run_test():
+    with open("big.py", "w") as f:
+        f.write("x = 1\n" * 2000)
+
+    buf = GPS.EditorBuffer.get(GPS.File("big.py"))
+    yield wait_idle()
+    gps_assert(is_string(buf, 1900), False,
+               "The end of the buffer should not be a string")
+
+    buf.insert(buf.at(1, 1), '"""\n')
+    yield wait_until_true(lambda: is_string(buf, 1900))
+    gps_assert(is_string(buf, 1900), True,
+               "The end of the buffer should have been rehighlighted")
+
+    buf.undo()
+    yield wait_until_true(lambda: not is_string(buf, 1900))
+    gps_assert(is_string(buf, 1900), False,
+               "The highlighting should be restored after undo")
@@ -0,0 +1,36 @@
+"""
+Verify that several background highlighters are processed by the shared
+scheduler, and that it records statistics for each of them.
+"""
+from GPS import *
+from gs_utils.internal.utils import *
+from gs_utils.highlighter import (
+    Regexp_Highlighter, Highlighter_Scheduler, OverlayStyle)
+
+
+@run_test_driver
+def run_test():
+    with open("foo.py", "w") as f:
+        f.write("a = 1  \n# TODO: b\n" * 500)
+
+    buf = GPS.EditorBuffer.get(GPS.File("foo.py"))
+    scheduler = Highlighter_Scheduler.get()
+    scheduler.reset_statistics()
+
+    Regexp_Highlighter(
+        regexp=r"\s+$", style=OverlayStyle(name="trailing", background="red"))
+    Regexp_Highlighter(
+        regexp=r"TODO.*", style=OverlayStyle(name="todo", background="blue"))
+
+    def is_todo(line):
+        return "todo" in [o.name() for o in buf.at(line, 3).get_overlays()]
+
+    yield wait_until_true(lambda: is_todo(1000))
+
+    names = sorted(s[0] for s in scheduler.statistics()
+                   if s[0].startswith("Regexp_Highlighter"))
+    gps_assert(names,
+               ["Regexp_Highlighter(todo)", "Regexp_Highlighter(trailing)"],
+               "Both highlighters should have been scheduled")
+    gps_assert(is_todo(1000), True,
+               "The end of the buffer should have been highlighted")
@@ -0,0 +1,49 @@
+"""
+Verify that the highlighters find their text after a tab, where the
+visible columns of the editor differ from the character offsets.
+"""
+from GPS import *
+from gs_utils.internal.utils import *
+from gs_utils.highlighter import (
+    Location_Highlighter, Regexp_Highlighter, OverlayStyle)
+
+
+class Ref_Highlighter(Location_Highlighter):
+    def __init__(self, column):
+        Location_Highlighter.__init__(
+            self, style=OverlayStyle(name="ref", background="green"))
+        self.column = column
+
+    def recompute_refs(self, buffer):
+        return [("foo", GPS.FileLocation(buffer.file(), 1, self.column))]
+
+
+def overlays(loc):
+    return [o.name() for o in loc.get_overlays()]
+
+
+@run_test_driver
+def run_test():
+    with open("foo.py", "w") as f:
+        f.write("\tfoo = 1\n\tbar = 2 # TODO: tab\n")
+
+    buf = GPS.EditorBuffer.get(GPS.File("foo.py"))
+    foo = buf.at(1, 1).forward_char(1)
+    gps_assert(foo.column() > 2, True, "the tab should span several columns")
+
+    Regexp_Highlighter(
+        regexp=r"TODO.*",
+        style=OverlayStyle(name="todo", background="blue"),
+        local_search=True)
+    todo = buf.at(2, 1).forward_char("\tbar = 2 # TODO".index("TODO"))
+    yield wait_until_true(lambda: "todo" in overlays(todo))
+    gps_assert("todo" in overlays(todo.forward_char(-2)), False,
+               "the highlighting should start at TODO")
+
+    h = Ref_Highlighter(foo.column())
+    h.start_highlight(buf)
+    yield wait_until_true(lambda: "ref" in overlays(foo))
+    gps_assert("ref" in overlays(foo.forward_char(2)), True,
+               "the whole reference should be highlighted")
+    gps_assert("ref" in overlays(foo.forward_char(3)), False,
+               "only the reference should be highlighted")
@@ -0,0 +1,45 @@
+"""
+Verify that the tokenizer of the highlighting engine can be used without
+an editor, that it can resume from the stack saved for a line, and that
+patterns may contain capturing groups.
+"""
+from GPS import *
+from gs_utils.internal.utils import *
+from highlighter.engine import HighlighterModule, SimpleMatcher, \
+    SubHighlighter
+from highlighter.tokenizer import tokenize
+
+text = u'x = 1\n"""doc\nstill doc\n"""\n# comment\n'
+
+
+class Tag(object):
+    def __init__(self, style_id):
+        self.style_id = style_id
+
+
+@run_test_driver
+def run_test():
+    hl = HighlighterModule.highlighters["python"]
+
+    tokens = hl.tokenize(text)
+    gps_assert(tokens.spans,
+               [("numbers_hl", 4, 5),
+                ("strings_hl", 6, 26),
+                ("comments_hl", 27, 37)],
+               "Wrong spans for the whole text")
+    gps_assert(len(tokens.line_stacks), 6, "Wrong number of line stacks")
+
+    start = text.index("still")
+    tokens = hl.tokenize(text[start:], list(tokens.line_stacks[2]))
+    gps_assert(tokens.spans,
+               [("strings_hl", 0, 13), ("comments_hl", 14, 24)],
+               "Wrong spans when resuming inside the docstring")
+
+    tokens = hl.tokenize(text, previous_stacks=hl.tokenize(text).line_stacks)
+    gps_assert(tokens.sync_line, 1, "The tokenizer should stop when synced")
+
+    hl = SubHighlighter([SimpleMatcher(Tag("pair_hl"), "(a)(b)?"),
+                         SimpleMatcher(Tag("c_hl"), "c")])
+    gps_assert(tokenize(u"ab c a", [hl]).spans,
+               [("pair_hl", 0, 2), ("c_hl", 3, 4), ("pair_hl", 5, 6)],
+               "Groups in a pattern should not shift the next ones")
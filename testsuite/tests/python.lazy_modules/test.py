@@ -0,0 +1,64 @@
+"""
+This test checks that lazy modules are only set up when one of their
+actions is executed or one of their hooks runs, that an existing action
+listed by a lazy module is kept, and that the startup timeline records the
+setup of the modules.
+"""
+
+import GPS
+from gs_utils import make_interactive, startup_timeline
+from gs_utils.internal.utils import *
+from modules import Module
+
+GPS.Hook.register("lazy_test_hook")
+calls = []
+
+
+class On_Action(Module):
+    lazy = True
+    setup_on_actions = ("lazy test action", )
+
+    def setup(self):
+        calls.append("setup action")
+        make_interactive(lambda: calls.append("action"),
+                         name="lazy test action")
+
+
+make_interactive(lambda: calls.append("existing"),
+                 name="lazy existing action")
+
+
+class On_Hook(Module):
+    lazy = True
+    setup_on_hooks = ("lazy_test_hook", )
+    setup_on_actions = ("lazy existing action", )
+
+    def setup(self):
+        calls.append("setup hook")
+
+
+@run_test_driver
+def test():
+    yield wait_idle()
+    gps_assert(calls, [], "lazy modules should not be set up yet")
+
+    GPS.execute_action("lazy test action")
+    yield wait_idle()
+    gps_assert(calls, ["setup action", "action"],
+               "the action should set up the module, then run")
+    GPS.execute_action("lazy test action")
+    gps_assert(calls[-1], "action", "the action should now run directly")
+
+    GPS.Hook("lazy_test_hook").run()
+    GPS.Hook("lazy_test_hook").run()
+    gps_assert(calls.count("setup hook"), 1,
+               "the hook should set up the module once")
+    GPS.execute_action("lazy existing action")
+    gps_assert(calls[-1], "existing",
+               "the existing action should not be removed by the setup")
+
+    kinds = set(step[0] for step in startup_timeline.steps())
+    gps_assert("setup" in kinds and "import" in kinds, True,
+               "the startup timeline should record imports and setups")
+    gps_assert(GPS.parse_xml is startup_timeline._parse_xml, True,
+               "GPS.parse_xml should be restored after the startup")
@@ -0,0 +1,53 @@
+"""
+This test checks that os_utils.locate_exec_on_path sees the executables
+added to the PATH, or to one of its directories, after its index of the
+PATH was built.
+"""
+
+import os
+import os_utils
+from GPS import *
+from gs_utils.internal.utils import *
+
+
+def create(path):
+    with open(path, "w") as f:
+        f.write("#!/bin/sh\n")
+    os.chmod(path, 0o755)
+
+
+@run_test_driver
+def test():
+    bin1 = os.path.abspath("bin1")
+    bin2 = os.path.abspath("bin2")
+    for d in (bin1, bin2):
+        if not os.path.isdir(d):
+            os.mkdir(d)
+    create(os.path.join(bin1, "tool_a"))
+    create(os.path.join(bin2, "tool_a"))
+
+    os.environ["PATH"] = os.pathsep.join([bin1, bin2, os.environ["PATH"]])
+    gps_assert(os_utils.locate_exec_on_path("tool_a"),
+               os.path.join(bin1, "tool_a"),
+               "the first directory of the PATH should win")
+    gps_assert(os_utils.locate_exec_on_path("tool_b"), "",
+               "tool_b does not exist yet")
+
+    # A new file is seen once the directory is checked again
+    create(os.path.join(bin2, "tool_b"))
+    yield timeout(int(os_utils._Exec_Index.REFRESH_DELAY * 1000) + 500)
+    gps_assert(os_utils.locate_exec_on_path("tool_b"),
+               os.path.join(bin2, "tool_b"),
+               "tool_b should be found after it was created")
+
+    # A removed file is never returned
+    os.remove(os.path.join(bin1, "tool_a"))
+    gps_assert(os_utils.locate_exec_on_path("tool_a"),
+               os.path.join(bin2, "tool_a"),
+               "the removed tool_a should not be found")
+
+    gps_assert(os_utils.locate_execs_on_path(["tool_a", "tool_b", "tool_c"]),
+               {"tool_a": os.path.join(bin2, "tool_a"),
+                "tool_b": os.path.join(bin2, "tool_b"),
+                "tool_c": ""},
+               "wrong result for the batch lookup")
@@ -0,0 +1,30 @@
+"""
+This test checks that gs_utils.parse_xml_if_changed only parses the XML
+when it differs from the last one parsed for the same key.
+"""
+
+import GPS
+import gs_utils
+from gs_utils.internal.utils import *
+
+XML = """<action name="xml cache test"><shell>echo "%s"</shell></action>"""
+
+
+def parse(text):
+    return gs_utils.parse_xml_if_changed(XML % text, key="xml cache test")
+
+
+@run_test_driver
+def test():
+    gps_assert(parse("a"), True, "the XML should be parsed the first time")
+    gps_assert(GPS.Action("xml cache test").exists(), True,
+               "the action should have been created")
+    gps_assert(parse("a"), False, "the same XML should not be parsed again")
+    gps_assert(parse("b"), True, "a different XML should be parsed")
+    gps_assert(parse("a"), True,
+               "the XML should be parsed again after it was replaced")
+
+    # By default, the key is the location of the call
+    results = [gs_utils.parse_xml_if_changed(XML % "c") for _ in range(2)]
+    gps_assert(results, [True, False],
+               "the XML should be parsed once from the same call")
@@ -0,0 +1,38 @@
+"""
+This test checks that the stall profiler records the python code that
+blocks the main loop, and saves its statistics as JSON.
+"""
+
+import json
+import time
+import workflows
+from GPS import *
+from gs_utils import stall_profiler
+from gs_utils.internal.utils import *
+
+
+def slow_step():
+    time.sleep(0.2)
+    yield 1
+
+
+@run_test_driver
+def test():
+    stall_profiler.reset()
+    workflows.driver(slow_step())
+
+    stats = [s for s in stall_profiler.statistics()
+             if s['kind'] == 'workflow' and s['name'] == 'slow_step']
+    gps_assert(len(stats), 1, "the workflow should have been recorded")
+    gps_assert(stats[0]['longest_ms'] >= 200, True,
+               "the duration of the slow step should have been measured")
+    bucket = stall_profiler.buckets_ms.index(500)
+    gps_assert(stats[0]['histogram'][bucket], 1,
+               "the slow step should be in the 500ms bucket")
+
+    with open(stall_profiler.dump()) as f:
+        data = json.load(f)
+    gps_assert([s['name'] for s in data['functions']
+                if s['kind'] == 'workflow'], ['slow_step'],
+               "the statistics should have been saved")
+    yield wait_idle()
@@ -0,0 +1,58 @@
+"""
+This test checks that the TextMate themes are converted once and then
+loaded from the cache, and that a modified theme is converted again.
+"""
+
+import json
+import os
+import shutil
+import GPS
+import textmate
+from gs_utils.internal.utils import *
+
+
+@run_test_driver
+def test():
+    files = textmate.theme_files()
+    gps_assert(len(files) > 0, True, "some themes should be installed")
+
+    names = [t.name for t in textmate.textmate_themes()]
+    with open(os.path.join(GPS.get_home_dir(), "textmate_themes.json")) as f:
+        data = json.load(f)
+    cache = data["themes"]
+    gps_assert(sorted(cache.keys()), sorted(files),
+               "all the themes should be in the cache")
+    gps_assert(data["gps_version"], GPS.version(),
+               "the cache should be tied to the version of GPS")
+    gps_assert("base_theme" in cache[files[0]]["extra"], False,
+               "the defaults of the themes should not be cached")
+
+    # A theme is found through the cache, without parsing the others
+    textmate._themes.clear()
+    theme = textmate.find_theme(names[-1])
+    gps_assert(theme.name, names[-1], "wrong theme found")
+    gps_assert(len(textmate._themes), 1, "only one theme should be loaded")
+    gps_assert(textmate.find_theme("no such theme"), None,
+               "an unknown theme should not be found")
+
+    # A user theme is converted again when it changes
+    user_dir = os.path.join(GPS.get_home_dir(), "themes")
+    if not os.path.isdir(user_dir):
+        os.mkdir(user_dir)
+    user_theme = os.path.join(user_dir, "user.tmTheme")
+    shutil.copy(files[0], user_theme)
+    textmate._themes.clear()
+    gps_assert(textmate.load_theme(user_theme).name,
+               textmate.load_theme(files[0]).name,
+               "the user theme should be loaded")
+
+    with open(user_theme) as f:
+        contents = f.read()
+    with open(user_theme, "w") as f:
+        f.write(contents.replace(
+            "<string>%s</string>" % names[0], "<string>Renamed</string>", 1))
+    mtime = os.stat(user_theme).st_mtime + 10
+    os.utime(user_theme, (mtime, mtime))
+    textmate._themes.clear()
+    gps_assert(textmate.load_theme(user_theme).name, "Renamed",
+               "the modified theme should be converted again")
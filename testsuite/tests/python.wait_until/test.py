@@ -0,0 +1,45 @@
+"""
+This test checks that wait_until resumes the workflow as soon as one of
+the hooks it monitors changes the condition, and that it gives up after
+its timeout, and that a delay postpones the first check.
+"""
+
+import time
+from GPS import *
+from gi.repository import GLib
+from gs_utils.internal.utils import *
+
+state = {'ready': False}
+
+
+def make_ready():
+    state['ready'] = True
+    Hook("test_ready").run()
+    return False
+
+
+@run_test_driver
+def test():
+    Hook.register("test_ready")
+    GLib.timeout_add(100, make_ready)
+
+    start = time.time()
+    value = yield wait_until(lambda: state['ready'],
+                             hooks=("test_ready", ), poll=0)
+    gps_assert(value, True, "the condition should be true")
+    gps_assert(time.time() - start < 1.0, True,
+               "the workflow should resume as soon as the hook is run")
+
+    value = yield wait_until(lambda: False, timeout=200)
+    gps_assert(value, False, "wait_until should give up after its timeout")
+
+    checks = []
+    start = time.time()
+    value = yield wait_until(lambda: checks.append(time.time()) or True,
+                             delay=200)
+    gps_assert(value, True, "the condition should be true")
+    gps_assert(checks[0] - start >= 0.15, True,
+               "the first check should wait for the delay")
+
+    yield wait_tasks()
+    gps_assert(Task.list(), [], "no task should be running")
@@ -0,0 +1,10 @@
+mkdir -p bin
+cat > bin/fake_tool <<'EOT'
+#!/bin/sh
+echo "$@" >> runs.txt
+echo "fake tool 1.0"
+test "$1" != "--fail"
+EOT
+chmod +x bin/fake_tool
+
+PATH=`pwd`/bin:$PATH $GPS --load=python:test.py
@@ -0,0 +1,55 @@
+"""
+This test checks that the output of the tools probed by plug-ins is cached
+until the executable changes, that failures are not cached, and that the
+registered probes are run in the background.
+"""
+
+import json
+import os
+from GPS import *
+from gs_utils import tool_probes
+from gs_utils.internal.utils import *
+
+
+def runs():
+    with open("runs.txt") as f:
+        return f.read().splitlines()
+
+
+@run_test_driver
+def test():
+    cmd = ["fake_tool", "--version"]
+    gps_assert(tool_probes.output(cmd).strip(), "fake tool 1.0",
+               "wrong output for the tool")
+    gps_assert(tool_probes.output(cmd).strip(), "fake tool 1.0",
+               "wrong cached output for the tool")
+    gps_assert(runs(), ["--version"], "the tool should have run once")
+    gps_assert(tool_probes.output(["no_such_tool", "-h"]), None,
+               "a missing tool has no output")
+
+    # The output of a failing tool is not cached
+    tool_probes.output(["fake_tool", "--fail"])
+    tool_probes.output(["fake_tool", "--fail"])
+    gps_assert(runs(), ["--version", "--fail", "--fail"],
+               "a failing tool should run each time")
+
+    # A registered probe runs in the background
+    tool_probes.register(["fake_tool", "-h"])
+    tool_probes.probe_all()
+    yield wait_until(lambda: not tool_probes._running, timeout=10000)
+    gps_assert(runs()[-1], "-h", "the probe should have run")
+    gps_assert(tool_probes.output(["fake_tool", "-h"]).strip(),
+               "fake tool 1.0", "the probe should be cached")
+    gps_assert(len(runs()), 4, "the cached probe should not run again")
+
+    with open(os.path.join(GPS.get_home_dir(), "tool_probes.json")) as f:
+        gps_assert(len(json.load(f)["probes"]), 2,
+                   "the probes should be saved")
+
+    # Changing the executable invalidates the cache
+    exe = os.path.join("bin", "fake_tool")
+    mtime = os.stat(exe).st_mtime + 10
+    os.utime(exe, (mtime, mtime))
+    tool_probes.output(cmd)
+    gps_assert(runs()[-2:], ["-h", "--version"],
+               "the tool should run again once modified")
@@ -0,0 +1,15 @@
+ROOT=`pwd`
+echo "$ROOT" > $ROOT/root.txt
+export FAKE_CLEARTOOL_ROOT=$ROOT/root.txt
+export PATH=$ROOT/bin:$PATH
+
+mkdir -p view/src
+cd view
+echo 'project prj is for Source_Dirs use ("src"); package IDE is for VCS_Kind use "clearcase native"; end IDE; end prj;' > prj.gpr
+echo 'procedure Main is begin null; end Main;' > src/main.adb
+echo 'procedure Unit is begin null; end Unit;' > src/unit.adb
+echo 'procedure New_File is begin null; end New_File;' > src/new_file.new
+echo "src/unit.adb" > $ROOT/checkedout
+: > $ROOT/commands
+
+$GPS -P prj.gpr --load=python:../test.py --traceon=CLEARCASE
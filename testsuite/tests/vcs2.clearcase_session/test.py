@@ -0,0 +1,62 @@
+"""
+This test checks that the clearcase engine reuses a single cleartool
+session, caches the status per directory until a file is saved in it, and
+toggles the read-only state of the open editors.
+"""
+
+import os
+from GPS import *
+from gs_utils.internal.utils import *
+
+ROOT = os.path.dirname(os.getcwd())
+
+
+def status(vcs, name):
+    return vcs.get_file_status(GPS.File(name))[0]
+
+
+def commands():
+    with open(os.path.join(ROOT, "commands")) as f:
+        return f.read().splitlines()
+
+
+@run_test_driver
+def test():
+    main = GPS.EditorBuffer.get(GPS.File("src/main.adb"))
+    unit = GPS.EditorBuffer.get(GPS.File("src/unit.adb"))
+    vcs = GPS.VCS2.active_vcs()
+    yield vcs.async_fetch_status_for_all_files(from_user=True)
+
+    gps_assert(status(vcs, "src/main.adb"), GPS.VCS2.Status.UNMODIFIED,
+               "main.adb should be unmodified")
+    gps_assert(status(vcs, "src/unit.adb"), GPS.VCS2.Status.MODIFIED,
+               "unit.adb should be checked out")
+    gps_assert(status(vcs, "src/new_file.new"), GPS.VCS2.Status.UNTRACKED,
+               "new_file.new should be view private")
+    gps_assert(main.is_read_only(), True, "main.adb should be read-only")
+    gps_assert(unit.is_read_only(), False, "unit.adb should be writable")
+
+    # Checked out outside of GPS: the cached status is kept until a file
+    # is saved in the same directory.
+    with open(os.path.join(ROOT, "checkedout"), "a") as f:
+        f.write("src/main.adb\n")
+    yield vcs.async_fetch_status_for_all_files(from_user=False)
+    gps_assert(status(vcs, "src/main.adb"), GPS.VCS2.Status.UNMODIFIED,
+               "the cached status should be used")
+    yield vcs.async_fetch_status_for_files([GPS.File("src/main.adb")])
+    gps_assert(status(vcs, "src/main.adb"), GPS.VCS2.Status.UNMODIFIED,
+               "the status of a single file should come from the cache")
+
+    unit.insert(unit.at(1, 1), "--  changed\n")
+    unit.save(interactive=False)
+    yield vcs.async_fetch_status_for_all_files(from_user=False)
+    gps_assert(status(vcs, "src/main.adb"), GPS.VCS2.Status.MODIFIED,
+               "the directory of the saved file should be listed again")
+    gps_assert(main.is_read_only(), False, "main.adb should be writable")
+
+    gps_assert(commands().count("session"), 1,
+               "all commands should run in the same session")
+    gps_assert([c for c in commands() if c.startswith("ls ")],
+               ["ls -recurse -short .",
+                "ls -short %s" % os.path.join(os.getcwd(), "src")],
+               "only the saved directory should be listed again")
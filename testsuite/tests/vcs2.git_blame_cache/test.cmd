@@ -0,0 +1,19 @@
+which git > /dev/null 2>&1 || exit 99
+
+init_repo() {
+  git init
+  git config user.email '<>'
+  git config user.name gps
+  echo 'project prj is end prj;' > prj.gpr
+  echo 'procedure Main is' > main.adb
+  echo 'begin' >> main.adb
+  echo '   null;' >> main.adb
+  git add prj.gpr main.adb
+  git commit -m init
+  echo 'end Main;' >> main.adb
+  git commit -a -m second
+}
+
+init_repo > /dev/null 2>&1
+
+$GPS -P prj.gpr --load=python:test.py --traceon=GIT
@@ -0,0 +1,63 @@
+"""
+This test checks the annotations computed by the git engine, and that they
+are cached as long as neither the file nor HEAD change, and that the least
+recently used annotations files are removed.
+"""
+
+import os
+from GPS import *
+from gs_utils.internal.utils import *
+from vcs2 import git
+
+
+class Visitor(object):
+
+    def __init__(self):
+        self.calls = []
+
+    def annotations(self, file, first_line, ids, annotations):
+        self.calls.append((first_line, ids, annotations))
+
+
+@run_test_driver
+def test():
+    vcs = GPS.VCS2.active_vcs()
+    f = GPS.File("main.adb")
+
+    v = Visitor()
+    yield vcs.async_annotations(v, f)
+    first_line, ids, annotations = v.calls[-1]
+    gps_assert(first_line, 1, "the last call should be for the whole file")
+    gps_assert(len(ids), 4, "all lines should be annotated")
+    gps_assert(ids[0] == ids[2] and ids[2] != ids[3], True,
+               "the last line comes from the second commit")
+    gps_assert(annotations[0].split()[1], "gps",
+               "the author should be displayed")
+
+    cache_dir = os.path.join(GPS.get_home_dir(), "vcs_cache")
+    gps_assert(any(n.startswith("git_blame_") for n in os.listdir(cache_dir)),
+               True, "the annotations should be saved")
+
+    # Nothing changed: no need to run git blame
+    v = Visitor()
+    yield vcs.async_annotations(v, f)
+    gps_assert(v.calls, [(1, ids, annotations)],
+               "the cached annotations should be reused")
+
+    # Only the most recently used annotations are kept on disk
+    old = os.path.join(cache_dir, "git_blame_old.json")
+    with open(old, "w") as fd:
+        fd.write("{}")
+    os.utime(old, (0, 0))
+    git.BLAME_CACHE_FILES = 1
+
+    # A local change invalidates the cache
+    with open("main.adb", "a") as fd:
+        fd.write("--  local change\n")
+    v = Visitor()
+    yield vcs.async_annotations(v, f)
+    gps_assert(len(v.calls[-1][1]), 5, "the new line should be annotated")
+    gps_assert(v.calls[-1][1][4], "0" * 40,
+               "the new line is not committed yet")
+    gps_assert(os.path.exists(old), False,
+               "the oldest annotations file should be removed")
@@ -0,0 +1,18 @@
+which git > /dev/null 2>&1 || exit 99
+
+init_repo() {
+  git init
+  git symbolic-ref HEAD refs/heads/master
+  git config user.email '<>'
+  git config user.name gps
+  echo 'project prj is end prj;' > prj.gpr
+  git add prj.gpr
+  for n in 1 2 3 4; do
+    git commit --allow-empty -m "commit $n"
+  done
+  git tag v1 HEAD~2
+}
+
+init_repo > /dev/null 2>&1
+
+$GPS -P prj.gpr --load=python:test.py --traceon=GIT
@@ -0,0 +1,61 @@
+"""
+This test checks that the git history is read one page at a time, and
+that only the new commits are read after a commit. The cache is saved
+in the background.
+"""
+
+import glob
+import os
+from GPS import *
+from gs_utils.internal.utils import *
+from workflows.promises import ProcessWrapper
+
+
+class Visitor(object):
+    def __init__(self):
+        self.commits = []
+
+    def history_line(self, commit):
+        self.commits.append(commit)
+
+
+def history(vcs, lines):
+    """Return the subjects and names of the first lines of the history"""
+    v = Visitor()
+    yield vcs.async_fetch_history(v, [lines, None, '', False, False])
+    yield [(c[3], c[5]) for c in v.commits]
+
+
+@run_test_driver
+def test():
+    vcs = GPS.VCS2.active_vcs()
+    Kind = GPS.VCS2.Commit.Kind
+
+    page = yield history(vcs, 2)
+    gps_assert(page,
+               [('commit 4', [('HEAD -> master', Kind.HEAD)]),
+                ('commit 3', None)],
+               "wrong first page of history")
+
+    full = yield history(vcs, 100)
+    gps_assert(full[:2], page, "the first page should be unchanged")
+    gps_assert(full[2:],
+               [('commit 2', [('v1', Kind.TAG)]),
+                ('commit 1', None)],
+               "wrong second page of history")
+
+    # The cache is saved in the background
+    pattern = os.path.join(GPS.get_home_dir(), 'vcs_cache', 'git_history_*')
+    saved = yield wait_until(lambda: glob.glob(pattern), timeout=5000)
+    gps_assert(bool(saved), True, "the history cache should be saved")
+
+    yield ProcessWrapper(
+        ['git', 'commit', '--allow-empty', '-m', 'commit 5'],
+        directory=GPS.pwd()).wait_until_terminate()
+
+    new = yield history(vcs, 100)
+    gps_assert(new[0], ('commit 5', [('HEAD -> master', Kind.HEAD)]),
+               "the new commit should be first")
+    gps_assert([s for s, _ in new[1:]],
+               ['commit 4', 'commit 3', 'commit 2', 'commit 1'],
+               "the older commits should follow")
@@ -0,0 +1,19 @@
+which git > /dev/null 2>&1 || exit 99
+
+init_repo() {
+  git init
+  git config user.email '<>'
+  git config user.name gps
+  mkdir src obj
+  echo 'project prj is for Source_Dirs use ("src"); for Object_Dir use "obj"; end prj;' > prj.gpr
+  echo 'procedure Main is begin null; end Main;' > src/main.adb
+  git add prj.gpr src/main.adb
+  git commit -m init
+  echo '--  modified' >> src/main.adb
+  echo 'procedure New_File is begin null; end New_File;' > src/new_file.adb
+  echo 'junk' > obj/junk.txt
+}
+
+init_repo > /dev/null 2>&1
+
+$GPS -P prj.gpr --load=python:test.py --traceon=GIT
@@ -0,0 +1,66 @@
+"""
+This test checks the statuses computed by the git engine, that nothing is
+reported in the object directory, and that a refresh with no change on disk
+does not run "git status" while a refresh after adding a file does.
+"""
+
+import os
+from GPS import *
+from gs_utils.internal.utils import *
+
+
+def status(vcs, name):
+    return vcs.get_file_status(GPS.File(name))[0]
+
+
+def count_status_runs(vcs):
+    """
+    Record the "git status" commands spawned by vcs.
+    :return: the list of the arguments of these commands
+    """
+    runs = []
+    git = vcs._git
+
+    def _git(args, *rest, **kwargs):
+        if 'status' in args:
+            runs.append(args)
+        return git(args, *rest, **kwargs)
+
+    vcs._git = _git
+    return runs
+
+
+@run_test_driver
+def test():
+    vcs = GPS.VCS2.active_vcs()
+    runs = count_status_runs(vcs)
+    yield vcs.async_fetch_status_for_all_files(from_user=True)
+    gps_assert(len(runs), 1, "git status should run once")
+
+    gps_assert(status(vcs, "src/main.adb") & GPS.VCS2.Status.MODIFIED,
+               GPS.VCS2.Status.MODIFIED,
+               "main.adb should be modified")
+    gps_assert(status(vcs, "src/new_file.adb") & GPS.VCS2.Status.UNTRACKED,
+               GPS.VCS2.Status.UNTRACKED,
+               "new_file.adb should be untracked")
+    obj = GPS.File("obj").path
+    gps_assert([f.path for f in vcs._non_default_files
+                if f.path.startswith(obj)],
+               [],
+               "no status should be reported in the object directory")
+
+    # Nothing changed on disk: git status is not run again
+    yield vcs.async_fetch_status_for_all_files(from_user=False)
+    gps_assert(len(runs), 1, "git status should have been skipped")
+    gps_assert(status(vcs, "src/main.adb") & GPS.VCS2.Status.MODIFIED,
+               GPS.VCS2.Status.MODIFIED,
+               "main.adb should still be modified")
+
+    # Adding a file changes the timestamp of the source directory
+    with open(os.path.join("src", "other.adb"), "w") as f:
+        f.write("procedure Other is begin null; end Other;\n")
+    yield vcs.async_fetch_status_for_all_files(from_user=False)
+    gps_assert(len(runs), 2, "git status should run after a change")
+    gps_assert(status(vcs, "src/other.adb") & GPS.VCS2.Status.UNTRACKED,
+               GPS.VCS2.Status.UNTRACKED,
+               "other.adb should be untracked after the refresh")
@@ -0,0 +1,27 @@
+which svn > /dev/null 2>&1 || exit 99
+which svnadmin > /dev/null 2>&1 || exit 99
+
+init_repo() {
+  svnadmin create repo
+  url="file://`pwd`/repo"
+  svn checkout "$url" other
+  mkdir other/src
+  echo 'project prj is for Source_Dirs use ("src"); end prj;' > other/prj.gpr
+  echo 'procedure Main is begin null; end Main;' > other/src/main.adb
+  echo 'procedure Unit is begin null; end Unit;' > other/src/unit.adb
+  svn add other/prj.gpr other/src
+  svn commit -m init other
+
+  svn checkout "$url" wc
+  echo '--  modified' >> wc/src/main.adb
+  echo 'procedure New_File is begin null; end New_File;' > wc/src/new_file.adb
+
+  # Make unit.adb out of date in wc
+  echo '--  remote change' >> other/src/unit.adb
+  svn commit -m remote other
+}
+
+init_repo > /dev/null 2>&1
+
+cd wc
+$GPS -P prj.gpr --load=python:../test.py --traceon=SVN
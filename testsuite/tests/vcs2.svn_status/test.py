@@ -0,0 +1,52 @@
+"""
+This test checks that the local status of the subversion engine does not
+list unmodified files but reports the working revision, and that the
+files modified in the repository are reported by the separate remote pass.
+"""
+
+import os
+from GPS import *
+from gs_utils.internal.utils import *
+
+
+def status(vcs, name):
+    return vcs.get_file_status(GPS.File(name))[0]
+
+
+@run_test_driver
+def test():
+    vcs = GPS.VCS2.active_vcs()
+    yield vcs.async_fetch_status_for_all_files(from_user=False)
+
+    gps_assert(status(vcs, "src/main.adb") & GPS.VCS2.Status.MODIFIED,
+               GPS.VCS2.Status.MODIFIED,
+               "main.adb should be modified")
+    gps_assert(status(vcs, "src/new_file.adb") & GPS.VCS2.Status.UNTRACKED,
+               GPS.VCS2.Status.UNTRACKED,
+               "new_file.adb should be untracked")
+    gps_assert(status(vcs, "src/unit.adb"),
+               GPS.VCS2.Status.UNMODIFIED,
+               "unit.adb should have the default status")
+    gps_assert(vcs.get_file_status(GPS.File("src/main.adb"))[1], "1",
+               "the working revision should be reported")
+
+    yield vcs.async_fetch_remote_status()
+    gps_assert(status(vcs, "src/unit.adb") & GPS.VCS2.Status.NEEDS_UPDATE,
+               GPS.VCS2.Status.NEEDS_UPDATE,
+               "unit.adb should need an update")
+    gps_assert(status(vcs, "src/main.adb"),
+               GPS.VCS2.Status.MODIFIED,
+               "the local status of main.adb should be kept")
+
+    # The local pass keeps the result of the remote pass
+    yield vcs.async_fetch_status_for_all_files(from_user=False)
+    gps_assert(status(vcs, "src/unit.adb") & GPS.VCS2.Status.NEEDS_UPDATE,
+               GPS.VCS2.Status.NEEDS_UPDATE,
+               "unit.adb should still need an update")
+
+    # Reverting a file resets its status
+    os.system("svn revert src/main.adb")
+    yield vcs.async_fetch_status_for_all_files(from_user=False)
+    gps_assert(status(vcs, "src/main.adb"),
+               GPS.VCS2.Status.UNMODIFIED,
+               "main.adb should be unmodified after the revert")
@@ -0,0 +1,109 @@
+"""
+This test checks that cancelling a workflow raises Cancelled in it and
+interrupts the process it waits for, and that latest_wins cancels the
+previous call with the same key.
+Cancelling one of the promises derived from a shared promise does not
+cancel it for the others, even when workflows wait for it, and a workflow
+that catches Cancelled is only settled when it exits.
+"""
+
+import time
+import workflows
+from GPS import *
+from gs_utils.internal.utils import *
+from workflows.promises import Cancelled, ProcessWrapper, Promise, timeout
+
+log = []
+processes = []
+
+
+def sleeper(name):
+    p = ProcessWrapper(['sleep', '30'], block_exit=False)
+    processes.append(p)
+    try:
+        yield p.wait_until_terminate()
+        log.append((name, 'terminated'))
+    except Cancelled:
+        log.append((name, 'cancelled'))
+        raise
+
+
+def waiter(name, promise):
+    try:
+        status, output = yield promise
+        log.append((name, output.strip()))
+    except Cancelled:
+        log.append((name, 'cancelled'))
+        raise
+
+
+def stubborn():
+    try:
+        yield timeout(10000)
+    except Cancelled:
+        log.append(('stubborn', 'cancelled'))
+    yield timeout(100)
+    log.append(('stubborn', 'done'))
+
+
+@workflows.latest_wins(key=lambda name: 'refresh')
+def refresh(name):
+    yield sleeper(name)
+
+
+@run_test_driver
+def test():
+    start = time.time()
+    w = workflows.driver(sleeper('direct'))
+    w.cancel()
+    gps_assert(log, [('direct', 'cancelled')],
+               "the workflow should have seen the cancellation")
+
+    yield wait_until_true(lambda: processes[0].finished)
+    gps_assert(time.time() - start < 20, True,
+               "the process should have been interrupted")
+
+    del log[:]
+    refresh('first')
+    refresh('second')
+    gps_assert(log, [('first', 'cancelled')],
+               "the first refresh should have been superseded")
+    processes[-1].terminate()
+    yield wait_until_true(lambda: len(log) == 2)
+    gps_assert(log[1], ('second', 'terminated'),
+               "the second refresh should run to completion")
+
+    # A shared source is only cancelled with its last consumer
+    source = Promise()
+    first = source.then()
+    second = source.then()
+    first.cancel()
+    gps_assert(source._state, Promise.PENDING,
+               "the source should still be pending")
+    second.cancel()
+    gps_assert(source._state, Promise.REJECTED,
+               "the source should be cancelled with its last consumer")
+
+    # Cancelling one of two workflows waiting for the same process does not
+    # interrupt it
+    del log[:]
+    shared = ProcessWrapper(['sh', '-c', 'sleep 1; echo shared'],
+                            block_exit=False).wait_until_terminate()
+    w1 = workflows.driver(waiter('w1', shared))
+    w2 = workflows.driver(waiter('w2', shared))
+    w1.cancel()
+    gps_assert(shared._state, Promise.PENDING,
+               "the process is still needed by the second workflow")
+    yield w2
+    gps_assert(log, [('w1', 'cancelled'), ('w2', 'shared')],
+               "the second workflow should get the output of the process")
+
+    # A workflow that catches Cancelled keeps running
+    del log[:]
+    w = workflows.driver(stubborn())
+    w.cancel()
+    gps_assert(w._state, Promise.PENDING,
+               "the workflow is still running after catching Cancelled")
+    yield w
+    gps_assert(log, [('stubborn', 'cancelled'), ('stubborn', 'done')],
+               "the workflow should go on after catching Cancelled")
@@ -0,0 +1,78 @@
+"""
+This test checks how ProcessWrapper matches the output of a process:
+lines split across several chunks of output, many lines read by calling
+wait_line from the callbacks, a regexp anchored with '^' once more than
+64K of output has been consumed, and the timeout of wait_until_match.
+"""
+
+import time
+from GPS import *
+from gs_utils.internal.utils import *
+from workflows.promises import ProcessWrapper, Promise
+
+LINE = "0123456789" * 4
+COUNT = 2000   # more than 64K of output
+
+
+def read_lines(p, count):
+    """
+    Read `count` lines from `p`, calling wait_line from the callback of
+    the previous line.
+    :return: a promise resolved with the list of lines
+    """
+    result = Promise()
+    lines = []
+
+    def on_line(line):
+        lines.append(line)
+        if line is None or len(lines) == count:
+            result.resolve(lines)
+        else:
+            p.wait_line().then(on_line)
+
+    p.wait_line().then(on_line)
+    return result
+
+
+@run_test_driver
+def test():
+    # Lines split across chunks
+    p = ProcessWrapper(
+        ['sh', '-c', 'printf ab; sleep 0.2; printf "c\\nde"; sleep 0.2; '
+         'printf "f\\n"'],
+        block_exit=False)
+    first = yield p.wait_line()
+    second = yield p.wait_line()
+    gps_assert([first, second], ["abc", "def"],
+               "lines should be rebuilt from the chunks of output")
+    yield p.wait_until_terminate()
+
+    # The lines are requested before the output arrives, and all come in
+    # a few chunks.
+    p = ProcessWrapper(
+        ['sh', '-c', 'sleep 0.2; i=0; while [ $i -lt %d ]; do echo %s; '
+         'i=$((i+1)); done; echo xmarker' % (COUNT, LINE)],
+        block_exit=False)
+    lines = yield read_lines(p, COUNT)
+    gps_assert(lines == [LINE] * COUNT, True,
+               "all the lines should be read, in order")
+
+    # The consumed output has been discarded: '^' matches at the start of
+    # the text not consumed yet.
+    x = yield p.wait_until_match("x")
+    gps_assert(x, "x", "wait_until_match should return the matched text")
+    marker = yield p.wait_until_match("^marker$")
+    gps_assert(marker, "marker", "'^' should match after the last match")
+    yield p.wait_until_terminate()
+
+    # Timeouts only apply to the wait they were set for
+    p = ProcessWrapper(['sh', '-c', 'echo ready; sleep 30'],
+                       block_exit=False)
+    ready = yield p.wait_until_match("ready", timeout=300)
+    gps_assert(ready, "ready", "the output should match before the timeout")
+    start = time.time()
+    never = yield p.wait_until_match("never", timeout=1000)
+    gps_assert(never, None, "the wait should be resolved by its timeout")
+    gps_assert(time.time() - start >= 0.9, True,
+               "the previous timeout should not resolve this wait")
+    p.terminate()
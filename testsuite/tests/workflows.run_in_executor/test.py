@@ -0,0 +1,54 @@
+"""
+This test checks that run_in_executor runs functions in worker threads,
+shows them in the Tasks view, and returns their value to the workflow.
+A job cancelled while it is queued is not run.
+"""
+
+import time
+import threading
+from GPS import *
+from gs_utils.internal.utils import *
+from workflows.promises import Executor, join, run_in_executor
+
+
+ran = []
+
+
+def record(name):
+    ran.append(name)
+    return name
+
+
+def slow_sum(n):
+    time.sleep(0.5)
+    return (sum(range(n)), threading.current_thread().name)
+
+
+@run_test_driver
+def test():
+    main_thread = threading.current_thread().name
+    p = run_in_executor(slow_sum, 1000)
+
+    gps_assert("slow_sum" in [t.name() for t in GPS.Task.list()], True,
+               "the job should be visible in the Tasks view")
+
+    total, thread = yield p
+    gps_assert(total, 499500, "wrong result from the worker thread")
+    gps_assert(thread != main_thread, True,
+               "the function should not run in the main thread")
+
+    results = yield join(*[run_in_executor(slow_sum, n) for n in range(5)])
+    gps_assert([r[0] for r in results], [0, 0, 1, 3, 6],
+               "wrong results for parallel jobs")
+
+    # With a single worker, the second job waits for the first one
+    executor = Executor(max_workers=1)
+    first = executor.submit(slow_sum, 10)
+    queued = executor.submit(record, "queued")
+    queued.cancel()
+    last = executor.submit(record, "last")
+    yield join(first, last)
+    yield wait_idle()
+    gps_assert(ran, ["last"], "the cancelled job should not have run")
+    gps_assert(queued._state, queued.REJECTED,
+               "the cancelled job should be rejected")
@@ -0,0 +1,42 @@
+"""
+Micro-benchmark for the splitting of a process output into lines: feed
+several megabytes of synthetic output, in chunks, to split_lines, check
+the lines and record the time it took.
+"""
+import time
+from GPS import *
+from gs_utils.internal.utils import *
+from workflows.promises import Stream, split_lines
+
+NB_LINES = 200000
+CHUNK_SIZE = 4096
+
+
+@run_test_driver
+def run_test():
+    output = "".join("%d %s\n" % (j, "x" * (j % 150))
+                     for j in range(NB_LINES)) + "last"
+    chunks = [output[j:j + CHUNK_SIZE]
+              for j in range(0, len(output), CHUNK_SIZE)]
+
+    for batch in (False, True):
+        stream = Stream()
+        lines = []
+        if batch:
+            split_lines(stream, batch=True).subscribe(lines.extend)
+        else:
+            split_lines(stream).subscribe(lines.append)
+
+        start = time.time()
+        for c in chunks:
+            stream.emit(c)
+        stream.resolve(0)
+        elapsed = time.time() - start
+
+        gps_assert(lines == output.split("\n"), True,
+                   "Wrong lines, batch=%s" % batch)
+
+        if not batch:
+            record_time(elapsed)
+
+    yield wait_idle()
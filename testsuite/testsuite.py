@@ -1,5 +1,6 @@
 #!/usr/bin/env python
-from drivers.basic import BasicTestDriver, Xvfbs
+from drivers.basic import BasicTestDriver, Xvfbs, WarmInstances
+from drivers.perf import PerfTestDriver
 from distutils.spawn import find_executable
 from e3.testsuite import Testsuite
 from e3.testsuite.testcase_finder import YAMLTestFinder
@@ -52,6 +53,37 @@ class GSPublicTestsuite(Testsuite):
             default=False,
             action="store_true",
             help="Generate a python coverage report.")
+        parser.add_argument(
+            "--warm",
+            default=False,
+            action="store_true",
+            help="Run the tests marked 'warm: true' in their test.yaml in"
+                 " a GNAT Studio that is started once per job, instead of"
+                 " starting it for each test. The other tests still use"
+                 " their own GNAT Studio.")
+        parser.add_argument(
+            "--perf",
+            default=False,
+            action="store_true",
+            help="Also run the scenarios of the performance testsuite, in"
+                 " the perf directory.")
+        parser.add_argument(
+            "--perf-baseline",
+            default=None,
+            help="The JSON file containing the reference measures of the"
+                 " performance scenarios (perf/baseline.json by default).")
+        parser.add_argument(
+            "--perf-tolerance",
+            default=0.25,
+            type=float,
+            help="The accepted increase of the measures of the performance"
+                 " scenarios, as a fraction of the baseline.")
+        parser.add_argument(
+            "--perf-update-baseline",
+            default=False,
+            action="store_true",
+            help="Save the measures of the performance scenarios as the"
+                 " new baseline, instead of comparing them.")
 
     def set_up(self):
 
@@ -97,11 +129,13 @@ class GSPublicTestsuite(Testsuite):
 
     def tear_down(self):
         super(GSPublicTestsuite, self).tear_down()
+        WarmInstances.stop_all()
         Xvfbs.stop_displays()
 
     @property
     def test_driver_map(self):
-        return {'default': BasicTestDriver}
+        return {'default': BasicTestDriver,
+                'perf': PerfTestDriver}
 
     @property
     def default_driver(self):
@@ -110,8 +144,11 @@ class GSPublicTestsuite(Testsuite):
     @property
     def test_finders(self):
         base = os.path.dirname(__file__)
-        return [GSTestFinder([os.path.join(base, 'tests'),
-                              os.path.join(base, 'internal', 'tests')])]
+        dirs = [os.path.join(base, 'tests'),
+                os.path.join(base, 'internal', 'tests')]
+        if self.main.args.perf:
+            dirs.append(os.path.join(base, 'perf'))
+        return [GSTestFinder(dirs)]
 
     def test_name(self, test_dir):
         relative = os.path.relpath(test_dir, os.path.dirname(__file__))